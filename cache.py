@@ -0,0 +1,293 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+from connect_four import Board, Geometry, get_geometry, zobrist_key, result, action_str_to_tuple, action_tuple_to_str
+from heuristics import is_winning_heuristic
+from search import SearchResult, iterative_dfs_negamax_search, finite_value
+
+LRU = 'lru'  # Evicts the least recently used entry
+LFU = 'lfu'  # Evicts the least frequently used entry (the least recently used one among equally frequent entries)
+POLICIES = (LRU, LFU)
+MOVE_CACHE_SIZE = 100000
+EVALUATION_CACHE_SIZE = 1000000
+
+
+class Cache(object):
+    """
+    Bounded cache evicting its entries with the LRU or LFU policy in constant time, which counts its hits, misses and
+    evictions. With LFU, the keys of each frequency are kept in their own OrderedDict in the order of their last use.
+    """
+
+    def __init__(self, max_size, policy=LRU):
+        """
+        :param max_size: the maximum number of entries
+        :param policy: the eviction policy (LRU or LFU)
+        """
+        if policy not in POLICIES:
+            raise ValueError('Unknown eviction policy: {}'.format(policy))
+        self.max_size = max_size
+        self.policy = policy
+        self.entries = OrderedDict() if policy == LRU else {}
+        self.frequencies = {}
+        self.buckets = {}  # Frequency to the OrderedDict of the keys with this frequency (LFU only)
+        self.min_frequency = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def peek(self, key, default=None):
+        """
+        :return: the value of the given key, or the default value if it is not cached, without counting a hit or miss
+        nor updating the recency or frequency of the entry
+        """
+        return self.entries.get(key, default)
+
+    def get(self, key, default=None):
+        """
+        :return: the value of the given key, or the default value if it is not cached
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.touch(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        """
+        Caches the given value, evicting an entry if the cache is full.
+        """
+        if key in self.entries:
+            self.entries[key] = value
+            self.touch(key)
+            return
+        if len(self.entries) >= self.max_size:
+            self.evict()
+        self.entries[key] = value
+        if self.policy == LFU:
+            self.frequencies[key] = 1
+            self.buckets.setdefault(1, OrderedDict())[key] = None
+            self.min_frequency = 1
+
+    def touch(self, key):
+        """
+        Records a use of the given cached key.
+        """
+        if self.policy == LRU:
+            self.entries.move_to_end(key)
+            return
+        frequency = self.frequencies[key]
+        bucket = self.buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[frequency]
+            if self.min_frequency == frequency:
+                self.min_frequency = frequency + 1
+        self.frequencies[key] = frequency + 1
+        self.buckets.setdefault(frequency + 1, OrderedDict())[key] = None
+
+    def evict(self):
+        """
+        Evicts the entry chosen by the eviction policy.
+        """
+        if self.policy == LRU:
+            self.entries.popitem(last=False)
+        else:
+            bucket = self.buckets[self.min_frequency]
+            key, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[self.min_frequency]
+            del self.frequencies[key]
+            del self.entries[key]
+        self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all the entries, but keeps the statistics.
+        """
+        self.entries.clear()
+        self.frequencies.clear()
+        self.buckets.clear()
+        self.min_frequency = 0
+
+    def stats(self):
+        """
+        :return: a dictionary with the number of entries, hits, misses and evictions, and the hit rate (None before any
+        lookup)
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'policy': self.policy,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else None,
+        }
+
+
+class BestMoveCache(Cache):
+    """
+    Cache of the results of iterative deepening negamax searches, keyed by the Zobrist key of the state and the player
+    to move, which answers immediately when a position is searched again with a cached result at least as deep as
+    requested. A cached result is used when it was searched with at least the requested time limit, when it reached the
+    requested depth limit, or when it found a win for either player.
+    """
+
+    def __init__(self, max_size=MOVE_CACHE_SIZE, policy=LRU):
+        """
+        :param max_size: the maximum number of positions
+        :param policy: the eviction policy (LRU or LFU)
+        """
+        super(BestMoveCache, self).__init__(max_size, policy)
+
+    def lookup(self, state, white_player, time_limit, depth_limit, history=None):
+        """
+        Looks up the cached result of the given state, which is only counted as a hit if it can answer the request.
+
+        :param state: the current state
+        :param white_player: True if the current player is white, False otherwise
+        :param time_limit: the time limit of the request, or None for no time limit
+        :param depth_limit: the depth limit of the request
+        :param history: the Zobrist keys of the positions of the game (see search.iterative_dfs_negamax_search), or
+        None. A cached best action leading to one of these positions is not used, so that cached moves do not repeat
+        positions.
+        :return: the cached SearchResult, or None if there is no cached result answering the request
+        """
+        key = (zobrist_key(state), white_player)
+        entry = self.peek(key)
+        if entry is not None:
+            search_result, searched_time_limit = entry
+            longer = searched_time_limit is None or time_limit is not None and searched_time_limit >= time_limit
+            deep_enough = longer or search_result.depth >= depth_limit - 1 or is_winning_heuristic(search_result.value)
+            repeating = history is not None and search_result.best_action is not None and \
+                zobrist_key(result(state, search_result.best_action, white_player)) in history
+            if deep_enough and not repeating:
+                return self.get(key)[0]
+        self.misses += 1
+        return None
+
+    def store(self, state, white_player, time_limit, search_result):
+        """
+        Caches the result of a completed search of the given state, unless its value depends on the history of the
+        game (see search.SearchHistory), since it would be replayed under another history.
+        """
+        if search_result.best_action is not None and not search_result.path_dependent:
+            key = (zobrist_key(state), white_player)
+            previous = self.peek(key)
+            if previous is None or previous[0].depth <= search_result.depth:
+                self.put(key, (search_result, time_limit))
+
+    def search(self, state, time_limit, depth_limit, white_player, verbose=True, history=None, **options):
+        """
+        Searches the given state with iterative deepening negamax, unless a cached result answers the request.
+
+        :param state: the current state
+        :param time_limit: the time limit for the search, or None for no time limit
+        :param depth_limit: the maximum depth to search to
+        :param white_player: True if the current player is white, False otherwise
+        :param verbose: True to print the progress of the search, False otherwise
+        :param history: the Zobrist keys of the positions of the game, or None
+        :param options: the other keyword arguments of search.iterative_dfs_negamax_search
+        :return: the SearchResult of the search, or the cached SearchResult (with no states visited) on a hit
+        """
+        start_time = time.time()
+        search_result = self.lookup(state, white_player, time_limit, depth_limit, history)
+        if search_result is not None:
+            if verbose:
+                print('[{} AI] Cached move: {}, value: {}, depth: {}'.format(
+                    'White' if white_player else 'Black', action_tuple_to_str(search_result.best_action),
+                    search_result.value, search_result.depth))
+            return search_result._replace(nodes=0, elapsed_time=time.time() - start_time)
+        search_result = iterative_dfs_negamax_search(state, time_limit, depth_limit, white_player, verbose=verbose,
+                                                     history=history, **options)
+        self.store(state, white_player, time_limit, search_result)
+        return search_result
+
+    def save(self, file_name):
+        """
+        Writes the cached results to a JSON lines file, from the least to the most recently used for LRU, after a
+        first line holding the geometry of the board (number of rows and columns, and win length), since Zobrist keys
+        and moves are only valid for one geometry.
+        """
+        geometry = get_geometry()
+        with open(file_name, 'w') as cache_file:
+            cache_file.write(json.dumps({'geometry': [geometry.num_rows, geometry.num_cols, geometry.win_length]}) +
+                             '\n')
+            for (key, white_player), (search_result, time_limit) in self.entries.items():
+                cache_file.write(json.dumps({
+                    'key': key,
+                    'side': 'white' if white_player else 'black',
+                    'time_limit': time_limit,
+                    'best_move': action_tuple_to_str(search_result.best_action),
+                    'value': finite_value(search_result.value),
+                    'depth': search_result.depth,
+                    'nodes': search_result.nodes,
+                    'elapsed_time': search_result.elapsed_time,
+                    'pv': [action_tuple_to_str(a) for a in search_result.principal_variation],
+                }) + '\n')
+
+    def load(self, file_name):
+        """
+        Adds the results of a file written by the save method to the cache, if the file exists. Files without a
+        geometry line were written for the default geometry.
+
+        :raises ValueError: if the file was written for another geometry than the one in use
+        """
+        if not os.path.isfile(file_name):
+            return
+        with open(file_name, 'r') as cache_file:
+            entries = [json.loads(line) for line in cache_file if line.strip()]
+        default = Geometry()
+        file_geometry = [default.num_rows, default.num_cols, default.win_length]
+        if entries and 'geometry' in entries[0]:
+            file_geometry = entries.pop(0)['geometry']
+        geometry = get_geometry()
+        if file_geometry != [geometry.num_rows, geometry.num_cols, geometry.win_length]:
+            raise ValueError('{} holds moves of a {}x{} board with a win length of {}'.format(
+                file_name, *file_geometry))
+        for entry in entries:
+            search_result = SearchResult(action_str_to_tuple(entry['best_move']), entry['value'], entry['depth'],
+                                         entry['nodes'], entry['elapsed_time'],
+                                         [action_str_to_tuple(a) for a in entry['pv']])
+            self.put((entry['key'], entry['side'] == 'white'), (search_result, entry['time_limit']))
+
+
+class EvaluationCache(Cache):
+    """
+    Cache of the values of a heuristic, keyed by the Zobrist key of the evaluated state (or the key of the board, for
+    boards), which can be passed as the heuristic of any search in place of the heuristic itself, e.g.
+    negamax(..., heuristic=EvaluationCache(default_heuristic)). It is the second level of the evaluation cache of the
+    search: the value cached on a State object (see search.evaluate) is lost with the object, whereas the successors
+    are new objects at every iteration of iterative deepening, and equal states reached by different paths are
+    different objects. Note that the cached heuristic must only depend on the position.
+    """
+
+    def __init__(self, heuristic, max_size=EVALUATION_CACHE_SIZE, policy=LRU):
+        """
+        :param heuristic: the heuristic whose values are cached
+        :param max_size: the maximum number of values
+        :param policy: the eviction policy (LRU or LFU)
+        """
+        super(EvaluationCache, self).__init__(max_size, policy)
+        self.heuristic = heuristic
+
+    def __call__(self, state):
+        """
+        :return: the heuristic value of the given state or board
+        """
+        key = state.key if isinstance(state, Board) else zobrist_key(state)
+        value = self.get(key)
+        if value is None:
+            value = self.heuristic(state)
+            self.put(key, value)
+        return value
@@ -0,0 +1,233 @@
+import asyncio
+import time
+
+from connect_four import action_str_to_tuple, action_tuple_to_str, actions, result
+from search import iterative_dfs_negamax, iterative_dfs_negamax_search
+
+CONNECT_TIMEOUT = 10  # Seconds to wait for the connection to the server
+MAX_RECONNECTS = 5  # Number of times to try to reconnect before giving up
+RECONNECT_DELAY = 1  # Seconds to wait before the first reconnection attempt, doubled after each attempt
+PONDER_SLICE = 0.5  # Seconds of pondering between checks for the move of the remote player
+DRAW_LINE = 'draw'  # Line sent by the server to both players before closing the connections of a drawn game
+
+
+class GameOver(Exception):
+    """
+    Raised when the server ends the game without a winning move, i.e. when it declares a draw (by repetition or after
+    its maximum number of moves).
+    """
+
+
+class GameClient(object):
+    """
+    Asyncio client for the game server protocol. The client joins a game by sending its game ID and colour, waits for
+    the server to echo the game ID once the opponent has joined, and then exchanges moves as lines such as '13E'. The
+    server sends DRAW_LINE when it declares a draw.
+    """
+
+    def __init__(self, host, port, game_id, colour, connect_timeout=CONNECT_TIMEOUT, max_reconnects=MAX_RECONNECTS):
+        """
+        :param host: the server host address
+        :param port: the server port number
+        :param game_id: the game ID
+        :param colour: the colour of the local player ('white' or 'black')
+        :param connect_timeout: the number of seconds to wait for the connection to the server
+        :param max_reconnects: the number of times to try to reconnect to the server before giving up
+        """
+        self.host = host
+        self.port = port
+        self.game_id = game_id
+        self.colour = colour
+        self.connect_timeout = connect_timeout
+        self.max_reconnects = max_reconnects
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, timeout=None):
+        """
+        Connects to the server and waits for the opponent to join the game.
+
+        :param timeout: the number of seconds to wait for the opponent to join, or None to wait indefinitely
+        """
+        print('Establishing connection to host {}, port {}...'.format(self.host, self.port))
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port),
+                                                          self.connect_timeout)
+
+        print('Sending game information (game ID: {}, colour: {})...'.format(self.game_id, self.colour))
+        await self.write_line('{} {}'.format(self.game_id, self.colour))
+
+        print('Waiting for opponent to join game with ID {}...'.format(self.game_id))
+        await asyncio.wait_for(self.reader.readuntil(self.game_id.encode()), timeout)
+
+        print("Starting game with ID '{}'!".format(self.game_id))
+
+    async def reconnect(self):
+        """
+        Reconnects to the server after the connection was lost, with an exponential backoff between attempts.
+        """
+        self.close()
+        delay = RECONNECT_DELAY
+        for attempt in range(1, self.max_reconnects + 1):
+            print('Connection lost, reconnecting (attempt {} of {})...'.format(attempt, self.max_reconnects))
+            await asyncio.sleep(delay)
+            try:
+                await self.connect(self.connect_timeout)
+                return
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                delay *= 2
+        raise ConnectionError('Could not reconnect to host {}, port {}'.format(self.host, self.port))
+
+    async def write_line(self, line):
+        """
+        Sends the given line to the server.
+
+        :param line: the line to send, without the trailing newline
+        """
+        self.writer.write((line + '\n').encode())
+        await self.writer.drain()
+
+    async def send_move(self, action):
+        """
+        Sends the given action to the server, reconnecting if the connection was lost.
+
+        :param action: the action to send
+        """
+        while True:
+            try:
+                await self.write_line(action_tuple_to_str(action))
+                return
+            except (OSError, asyncio.IncompleteReadError):
+                await self.reconnect()
+
+    async def receive_move(self, state, white_player, timeout=None):
+        """
+        Waits for a valid move from the remote player, ignoring any other line sent by the server and reconnecting if
+        the connection was lost.
+
+        :param state: the current state
+        :param white_player: True if it is white's turn to make a move, False otherwise
+        :param timeout: the number of seconds to wait for the move, or None to wait indefinitely
+        :return: the action of the remote player
+        :raises asyncio.TimeoutError: if no valid move was received within the timeout
+        :raises GameOver: if the server declared a draw
+        :raises ConnectionError: if the connection was lost and could not be re-established
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        valid_actions = actions(state, white_player)
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), remaining)
+            except asyncio.TimeoutError:
+                raise  # Not a lost connection, although TimeoutError is a subclass of OSError since Python 3.11
+            except (OSError, asyncio.IncompleteReadError):
+                await self.reconnect()
+                continue
+            if not line:  # Connection closed by the server
+                await self.reconnect()
+                continue
+            line = line.decode().strip()
+            if line == DRAW_LINE:
+                raise GameOver('draw declared by the server')
+            action = action_str_to_tuple(line)
+            if action in valid_actions:
+                return action
+
+    def close(self):
+        """
+        Closes the connection to the server.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.reader = None
+
+
+async def search_move(state, white_player, time_limit, depth_limit, executor, transposition_table, engine=None,
+                      history=None, move_cache=None):
+    """
+    Searches for the best action of the local AI in the given executor, without blocking the event loop.
+
+    :param state: the current state
+    :param white_player: True if it is white's turn to make a move, False otherwise
+    :param time_limit: the time limit for the search
+    :param depth_limit: the maximum depth to search to
+    :param executor: the executor in which to run the search
+    :param transposition_table: the transposition table shared by the searches of the game
+    :param engine: the MonteCarloTreeSearch of the game, or None to search with iterative deepening negamax
+    :param history: the Zobrist keys of the positions of the game, which the negamax search scores as draws, or None
+    :param move_cache: the BestMoveCache of the negamax search, or None
+    :return: the SearchResult of the search, whose best action is always set
+    """
+    loop = asyncio.get_running_loop()
+    if engine is None:
+        search = iterative_dfs_negamax_search if move_cache is None else move_cache.search
+        search_result = await loop.run_in_executor(executor, lambda: search(
+            state, time_limit, depth_limit, white_player, transposition_table=transposition_table, history=history))
+    else:
+        search_result = await loop.run_in_executor(executor, engine.search, state, time_limit, white_player)
+    if search_result.best_action is None:  # Not even depth 1 could be completed in time
+        search_result = search_result._replace(best_action=actions(state, white_player)[0])
+    return search_result
+
+
+async def receive_move_pondering(client, state, white_player, depth_limit, executor, transposition_table,
+                                 timeout=None):
+    """
+    Waits for a move from the remote player while pondering, i.e. searching the current state from the point of view of
+    the remote player in slices of PONDER_SLICE seconds. The results of the pondering are kept in the shared
+    transposition table, so that the next search of the local AI starts with the successors already explored.
+
+    :param client: the game client
+    :param state: the current state
+    :param white_player: True if it is white's turn to make a move (i.e. the remote player is white), False otherwise
+    :param depth_limit: the maximum depth to ponder to
+    :param executor: the executor in which to run the pondering
+    :param transposition_table: the transposition table shared by the searches of the game
+    :param timeout: the number of seconds to wait for the move, or None to wait indefinitely
+    :return: an (action, ponder time) tuple, where action is the action of the remote player and ponder time is the
+    number of seconds spent waiting for the last pondering slice to finish after the move was received
+    :raises asyncio.TimeoutError: if no valid move was received within the timeout (once the pondering slice finished)
+    :raises GameOver: if the server declared a draw (once the pondering slice finished)
+    """
+    loop = asyncio.get_running_loop()
+    move = asyncio.ensure_future(client.receive_move(state, white_player, timeout))
+    ponder = None
+    while not move.done():
+        if ponder is None or ponder.done():
+            ponder = loop.run_in_executor(executor, lambda: iterative_dfs_negamax(
+                state, PONDER_SLICE, depth_limit, white_player, transposition_table=transposition_table,
+                verbose=False))
+        await asyncio.wait([move, ponder], return_when=asyncio.FIRST_COMPLETED)
+    received_time = time.time()
+    await ponder
+    return move.result(), time.time() - received_time
+
+
+async def apply_remote_move(client, state, white_player, timeout=None, pondering=None, recorder=None):
+    """
+    Waits for a move from the remote player and applies it.
+
+    :param client: the game client
+    :param state: the current state
+    :param white_player: True if it is white's turn to make a move, False otherwise
+    :param timeout: the number of seconds to wait for the move, or None to wait indefinitely
+    :param pondering: a (depth limit, executor, transposition table) tuple to ponder while waiting, or None
+    :param recorder: the GameRecorder of the game, or None
+    :return: a (resulting state, ponder time) tuple, where ponder time is the number of seconds spent waiting for the
+    pondering to stop after the move was received
+    :raises asyncio.TimeoutError: if no valid move was received within the timeout
+    :raises GameOver: if the server declared a draw
+    """
+    print('Waiting for move from remote player...')
+    if pondering is None:
+        action = await client.receive_move(state, white_player, timeout)
+        ponder_time = 0
+    else:
+        depth_limit, executor, transposition_table = pondering
+        action, ponder_time = await receive_move_pondering(client, state, white_player, depth_limit, executor,
+                                                           transposition_table, timeout)
+    print('{} (server) move: {}'.format('White' if white_player else 'Black', action_tuple_to_str(action)))
+    if recorder is not None:
+        recorder.record(action)
+    return result(state, action, white_player), ponder_time
@@ -1,5 +1,10 @@
 from __future__ import print_function
 
+import glob
+import os
+import random
+from collections import OrderedDict
+
 NUM_ROWS = 7
 NUM_COLS = 7
 DIRECTIONS = ('E', 'W', 'N', 'S')
@@ -21,6 +26,311 @@ Y_MOVEMENT_DIFFS = {
     'E': 0,
     'W': 0
 }
+WIN_LENGTH = 4
+LINE_DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1))
+ZOBRIST_SEED = 526
+REPETITION_LIMIT = 3  # Number of occurrences of a position after which the game is a draw
+MAX_BOARD_SIZE = 9  # Actions name the squares with one digit per coordinate
+GEOMETRY_LISTENERS = []  # Functions called with the new geometry by the set_geometry method
+FRONTIER_CHUNK = 65536  # Number of states expanded at once by the expand_frontier method, which bounds its memory
+
+
+def zobrist_key(state):
+    """
+    Returns the Zobrist key of the given state, i.e. the XOR of the random keys of the squares occupied by each player.
+    Contrary to the hash of a state, it does not depend on the order of the pieces.
+
+    :param state: the state
+    :return: the Zobrist key of the given state
+    """
+    key = 0
+    for player in (0, 1):
+        for square in state[player]:
+            key ^= ZOBRIST_KEYS[player][square]
+    return key
+
+
+class Geometry(object):
+    """
+    The geometry of a board, i.e. its number of rows and columns and the number of pieces in a row needed to win, with
+    the tables of the game precomputed for that geometry: the squares, the lines of each square, the moves out of and
+    into each square and the Zobrist keys. Since the action generators and heuristics only look squares up in these
+    tables, bigger boards cost the same per visited state. The tables of the geometry in use are the module-level
+    constants (see the set_geometry method).
+    """
+
+    def __init__(self, num_rows=7, num_cols=7, win_length=4):
+        """
+        :param num_rows: the number of rows of the board, at most MAX_BOARD_SIZE
+        :param num_cols: the number of columns of the board, at most MAX_BOARD_SIZE
+        :param win_length: the number of pieces in a row needed to win
+        """
+        if not (0 < num_rows <= MAX_BOARD_SIZE and 0 < num_cols <= MAX_BOARD_SIZE):
+            raise ValueError('Boards have between 1 and {} rows and columns'.format(MAX_BOARD_SIZE))
+        if not 3 <= win_length <= max(num_rows, num_cols):
+            raise ValueError('The win length must be at least 3 and fit on the board')
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.win_length = win_length
+        self.squares = [(i % num_cols + 1, i // num_cols + 1) for i in range(num_rows * num_cols)]
+        self.lines = self.compute_lines()
+        self.square_lines = self.compute_square_lines()
+        self.zobrist_keys = self.compute_zobrist_keys()
+        self.moves_into = self.compute_moves_into()
+        self.move_targets = self.compute_move_targets()
+        # Occupancy masks (see the square_bit method) of the squares whose pieces can move in each direction of
+        # DIRECTIONS, and of the squares of each line of lines
+        self.move_masks = tuple(sum(1 << self.square_bit(x, y) for x, y in self.squares
+                                    if any(d == direction for d, _ in self.move_targets[(x, y)]))
+                                for direction in DIRECTIONS)
+        self.line_masks = tuple(sum(1 << self.square_bit(x, y) for x, y in line) for line in self.lines)
+
+    def __repr__(self):
+        return 'Geometry({}, {}, {})'.format(self.num_rows, self.num_cols, self.win_length)
+
+    def is_within_bounds(self, x, y):
+        """
+        :return: True if the given x, y coordinates are within the bounds of the board
+        """
+        return 0 < x <= self.num_cols and 0 < y <= self.num_rows
+
+    def square_bit(self, x, y):
+        """
+        :return: the index of the bit of the square at the given x, y coordinates in an occupancy mask
+        """
+        return (y - 1) * self.num_cols + x - 1
+
+    def compute_lines(self):
+        """
+        Computes the lines of win_length squares of the board along which a win can be completed.
+
+        :return: a tuple of lines, each line being a tuple of x, y coordinates
+        """
+        lines = []
+        for x in range(1, self.num_cols + 1):
+            for y in range(1, self.num_rows + 1):
+                for i, j in LINE_DIRECTIONS:
+                    line = tuple((x + k * i, y + k * j) for k in range(self.win_length))
+                    if all(self.is_within_bounds(line_x, line_y) for line_x, line_y in line):
+                        lines.append(line)
+        return tuple(lines)
+
+    def compute_square_lines(self):
+        """
+        Computes, for each square of the board, the lines containing that square.
+
+        :return: a dictionary mapping x, y coordinates to the lines containing the corresponding square
+        """
+        return dict(((x, y), tuple(line for line in self.lines if (x, y) in line))
+                    for x in range(1, self.num_cols + 1) for y in range(1, self.num_rows + 1))
+
+    def compute_zobrist_keys(self):
+        """
+        Computes the random keys of each square of the board for each player, used to compute Zobrist keys.
+
+        :return: a (white keys, black keys) tuple, where each element maps x, y coordinates to a random 64-bit key
+        """
+        rng = random.Random(ZOBRIST_SEED)
+        return tuple(dict(((x, y), rng.getrandbits(64)) for y in range(1, self.num_rows + 1)
+                          for x in range(1, self.num_cols + 1))
+                     for _ in range(2))
+
+    def compute_moves_into(self):
+        """
+        Computes, for each square of the board, the actions moving a piece into that square.
+
+        :return: a dictionary mapping x, y coordinates to the actions moving a piece into the corresponding square
+        """
+        moves_into = {}
+        for x in range(1, self.num_cols + 1):
+            for y in range(1, self.num_rows + 1):
+                moves_into[(x, y)] = tuple((x - X_MOVEMENT_DIFFS[d], y - Y_MOVEMENT_DIFFS[d], d) for d in DIRECTIONS
+                                           if self.is_within_bounds(x - X_MOVEMENT_DIFFS[d], y - Y_MOVEMENT_DIFFS[d]))
+        return moves_into
+
+    def compute_move_targets(self):
+        """
+        Computes, for each square of the board, the directions in which a piece can move out of that square.
+
+        :return: a dictionary mapping x, y coordinates to (direction, x, y coordinates of the destination) tuples, in
+        the order of DIRECTIONS
+        """
+        move_targets = {}
+        for x in range(1, self.num_cols + 1):
+            for y in range(1, self.num_rows + 1):
+                move_targets[(x, y)] = tuple((d, (x + X_MOVEMENT_DIFFS[d], y + Y_MOVEMENT_DIFFS[d])) for d in DIRECTIONS
+                                             if self.is_within_bounds(x + X_MOVEMENT_DIFFS[d], y + Y_MOVEMENT_DIFFS[d]))
+        return move_targets
+
+
+def str_to_geometry(board, win_length=WIN_LENGTH):
+    """
+    Returns the geometry of the given board size and win length.
+
+    :param board: the size of the board, as 'ROWSxCOLUMNS' (e.g. '9x9')
+    :param win_length: the number of pieces in a row needed to win
+    :return: the geometry
+    """
+    try:
+        num_rows, num_cols = (int(n) for n in board.lower().split('x'))
+    except ValueError:
+        raise ValueError('Invalid board size: {} (expected ROWSxCOLUMNS, e.g. 9x9)'.format(board))
+    return Geometry(num_rows, num_cols, win_length)
+
+
+def get_geometry():
+    """
+    :return: the geometry in use (see the set_geometry method)
+    """
+    return GEOMETRY
+
+
+def set_geometry(geometry):
+    """
+    Makes the given geometry the geometry in use, by rebinding the module-level constants (NUM_ROWS, NUM_COLS,
+    WIN_LENGTH and the tables) to those of the geometry, and by notifying the modules with tables of their own (see
+    GEOMETRY_LISTENERS). It must be called before any game is played or any search is started, since states, boards,
+    transposition tables and caches are only valid for one geometry. Worker processes do not necessarily inherit it
+    (processes started with the spawn method import the modules afresh, with the default geometry), so process pools
+    pass it to this method as their initializer, e.g. ProcessPoolExecutor(initializer=set_geometry,
+    initargs=(get_geometry(),)).
+
+    :param geometry: the geometry
+    """
+    global GEOMETRY, NUM_ROWS, NUM_COLS, WIN_LENGTH, SQUARES, LINES, SQUARE_LINES, ZOBRIST_KEYS, MOVES_INTO, \
+        MOVE_TARGETS
+    GEOMETRY = geometry
+    NUM_ROWS = geometry.num_rows
+    NUM_COLS = geometry.num_cols
+    WIN_LENGTH = geometry.win_length
+    SQUARES = geometry.squares
+    LINES = geometry.lines
+    SQUARE_LINES = geometry.square_lines
+    ZOBRIST_KEYS = geometry.zobrist_keys
+    MOVES_INTO = geometry.moves_into
+    MOVE_TARGETS = geometry.move_targets
+    for listener in GEOMETRY_LISTENERS:
+        listener(geometry)
+
+
+class State(object):
+    """
+    A game state, holding the x, y coordinates of the white and black pieces. States behave like the
+    (white_squares, black_squares) tuples used throughout the program (they can be indexed, unpacked and compared to
+    such tuples), but their hash is computed once and their win status and heuristic value are cached the first time
+    they are evaluated. States should be treated as immutable.
+    """
+    __slots__ = ('white', 'black', '_hash', 'win_value', 'heuristic', 'heuristic_value')
+
+    def __init__(self, white, black):
+        """
+        :param white: the x, y coordinates of the white pieces
+        :param black: the x, y coordinates of the black pieces
+        """
+        self.white = tuple(white)
+        self.black = tuple(black)
+        self._hash = hash((self.white, self.black))
+        self.win_value = None
+        self.heuristic = None
+        self.heuristic_value = None
+
+    def __getitem__(self, index):
+        if index == 0:
+            return self.white
+        if index == 1:
+            return self.black
+        raise IndexError('State index out of range')
+
+    def __len__(self):
+        return 2
+
+    def __iter__(self):
+        yield self.white
+        yield self.black
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, State):
+            return self._hash == other._hash and self.white == other.white and self.black == other.black
+        return isinstance(other, tuple) and len(other) == 2 and self.white == other[0] and self.black == other[1]
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'State({!r}, {!r})'.format(self.white, self.black)
+
+    def __reduce__(self):
+        return State, (self.white, self.black)
+
+
+class Board(object):
+    """
+    A mutable board, on which actions are applied in place with make and reverted with unmake, so that the search can
+    explore successors without constructing new states. Boards can be indexed like states (index 0 holds the x, y
+    coordinates of the white pieces, index 1 those of the black pieces), so they can be passed to the heuristics and to
+    the action generators. The Zobrist key of the board is updated incrementally and can be used as a hash key.
+    """
+    __slots__ = ('pieces', 'key')
+
+    def __init__(self, state):
+        """
+        :param state: the state to initialize the board with
+        """
+        self.pieces = (list(state[0]), list(state[1]))
+        self.key = zobrist_key(state)
+
+    def __getitem__(self, index):
+        return self.pieces[index]
+
+    def __len__(self):
+        return 2
+
+    def __iter__(self):
+        return iter(self.pieces)
+
+    def make(self, action, white_player=True):
+        """
+        Applies the given action to the board.
+
+        :param action: the action to apply
+        :param white_player: True if the current player is white, False otherwise
+        """
+        old_square = (action[0], action[1])
+        new_square = (action[0] + X_MOVEMENT_DIFFS[action[2]], action[1] + Y_MOVEMENT_DIFFS[action[2]])
+        self.move_piece(old_square, new_square, 0 if white_player else 1)
+
+    def unmake(self, action, white_player=True):
+        """
+        Reverts the given action, which must be the last action applied to the board.
+
+        :param action: the action to revert
+        :param white_player: True if the player who made the action is white, False otherwise
+        """
+        old_square = (action[0], action[1])
+        new_square = (action[0] + X_MOVEMENT_DIFFS[action[2]], action[1] + Y_MOVEMENT_DIFFS[action[2]])
+        self.move_piece(new_square, old_square, 0 if white_player else 1)
+
+    def move_piece(self, from_square, to_square, player):
+        """
+        Moves a piece of the given player, keeping its index in the list of pieces so that actions are generated in the
+        same order as for the corresponding state.
+
+        :param from_square: the x, y coordinates of the piece to move
+        :param to_square: the x, y coordinates to move the piece to
+        :param player: 0 for white, 1 for black
+        """
+        pieces = self.pieces[player]
+        pieces[pieces.index(from_square)] = to_square
+        self.key ^= ZOBRIST_KEYS[player][from_square] ^ ZOBRIST_KEYS[player][to_square]
+
+    def to_state(self):
+        """
+        :return: the state corresponding to the current board
+        """
+        return State(self.pieces[0], self.pieces[1])
 
 
 def actions_and_successors(state, white_player=True):
@@ -59,6 +369,27 @@ def print_state(state):
         print()
 
 
+def state_to_str(state):
+    """
+    Returns the string representation of the given state, in the format read by the str_to_state method.
+
+    :param state: the state
+    :return: the string representation of the board
+    """
+    rows = []
+    for y in range(1, NUM_ROWS + 1):
+        squares = []
+        for x in range(1, NUM_COLS + 1):
+            if (x, y) in state[0]:
+                squares.append('O')
+            elif (x, y) in state[1]:
+                squares.append('X')
+            else:
+                squares.append(' ')
+        rows.append(','.join(squares))
+    return '\n'.join(rows)
+
+
 def str_to_state(str_state):
     """
     Returns a state corresponding to the provided string representation. Here is an example of a valid state:
@@ -87,7 +418,7 @@ def str_to_state(str_state):
                 black_squares.append((x, y))
             x += 1
         y += 1
-    return tuple(white_squares), tuple(black_squares)
+    return State(white_squares, black_squares)
 
 
 def is_within_bounds(x, y):
@@ -138,10 +469,97 @@ def actions(state, white_player=True):
     :param white_player: True if the current player is white, False otherwise
     :return: the actions available to the given player in the given state
     """
+    white_squares = state[0]
+    black_squares = state[1]
     return [(x, y, direction)
-            for (x, y) in occupied_squares_by_player(state, white_player)
-            for direction in DIRECTIONS
-            if is_valid_action(state, x, y, direction)]
+            for (x, y) in (white_squares if white_player else black_squares)
+            for direction, target in MOVE_TARGETS[(x, y)]
+            if target not in white_squares and target not in black_squares]
+
+
+def winning_actions(state, white_player=True):
+    """
+    Returns the actions with which the given player completes WIN_LENGTH in a row.
+
+    :param state: the current state
+    :param white_player: True if the current player is white, False otherwise
+    :return: the actions with which the given player completes WIN_LENGTH in a row
+    """
+    return actions_onto_lines(state, white_player, WIN_LENGTH - 1)
+
+
+def blocking_actions(state, white_player=True):
+    """
+    Returns the actions moving a piece of the given player into a square where the opponent would complete four in a
+    row with its next move. Note that blocking one square does not guarantee that all the wins of the opponent are
+    blocked.
+
+    :param state: the current state
+    :param white_player: True if the current player is white, False otherwise
+    :return: the actions moving a piece of the given player into a winning square of the opponent
+    """
+    pieces = occupied_squares_by_player(state, white_player)
+    targets = set((x + X_MOVEMENT_DIFFS[d], y + Y_MOVEMENT_DIFFS[d])
+                  for (x, y, d) in winning_actions(state, not white_player))
+    return [(x, y, d) for target in targets for (x, y, d) in MOVES_INTO[target] if (x, y) in pieces]
+
+
+def threat_actions(state, white_player=True):
+    """
+    Returns the tactical actions available to the given player, i.e. the actions completing WIN_LENGTH in a row,
+    followed by the actions blocking an immediate win of the opponent, followed by the actions creating WIN_LENGTH - 1
+    in a row with an open last square. The full list of actions is never generated: only the moves into the squares
+    of the relevant lines are considered.
+
+    :param state: the current state
+    :param white_player: True if the current player is white, False otherwise
+    :return: the tactical actions available to the given player, without duplicates
+    """
+    tactical_actions = winning_actions(state, white_player)
+    tactical_actions += blocking_actions(state, white_player)
+    tactical_actions += actions_onto_lines(state, white_player, WIN_LENGTH - 2)
+    return list(OrderedDict.fromkeys(tactical_actions))
+
+
+def actions_onto_lines(state, white_player, num_pieces):
+    """
+    Returns the actions moving a piece of the given player from outside a line into an empty square of that line, for
+    the lines containing exactly num_pieces pieces of the given player and no pieces of the opponent.
+
+    :param state: the current state
+    :param white_player: True if the current player is white, False otherwise
+    :param num_pieces: the number of pieces of the given player that the lines must contain
+    :return: the actions moving a piece of the given player into the selected lines
+    """
+    pieces = occupied_squares_by_player(state, white_player)
+    enemy_pieces = occupied_squares_by_player(state, not white_player)
+    counts = {}
+    for square in pieces:
+        for line in SQUARE_LINES[square]:
+            counts[line] = counts.get(line, 0) + 1
+    line_actions = []
+    for line, count in counts.items():
+        if count == num_pieces and not any(square in enemy_pieces for square in line):
+            for square in line:
+                if square not in pieces:
+                    line_actions.extend((x, y, d) for (x, y, d) in MOVES_INTO[square]
+                                        if (x, y) in pieces and (x, y) not in line)
+    return line_actions
+
+
+def side_parity(state, white_player):
+    """
+    Returns the side parity of the given state, i.e. the parity of the sum of the coordinates of all the pieces, plus
+    one if black is to move. It is invariant under the actions of the game, since every action changes the sum by one
+    and passes the turn. Hence, a transposition table keyed by states without the side to move is consistent for all
+    the searches of the same side parity.
+
+    :param state: the state
+    :param white_player: True if white is to move, False otherwise
+    :return: the side parity (0 or 1) of the given state
+    """
+    total = sum(x + y for x, y in state[0]) + sum(x + y for x, y in state[1])
+    return (total + (0 if white_player else 1)) % 2
 
 
 def action_str_to_tuple(a):
@@ -151,7 +569,8 @@ def action_str_to_tuple(a):
     :param a: the action, in string form. For example: '13E'.
     :return: the action in tuple form
     """
-    if a is not None and '1' <= a[0] <= '7' and '1' <= a[1] <= '7' and a[2] in DIRECTIONS:
+    if a is not None and len(a) >= 3 and '1' <= a[0] <= '9' and '1' <= a[1] <= '9' and a[2] in DIRECTIONS \
+            and is_within_bounds(int(a[0]), int(a[1])):
         return int(a[0]), int(a[1]), a[2]
     else:
         return None
@@ -179,9 +598,9 @@ def result(state, action, white_player=True):
     :return: the resulting state when the given action is applied to the given state
     """
     if white_player:
-        return result_tuple(state, action, white_player), state[1]
+        return State(result_tuple(state, action, white_player), state[1])
     else:
-        return state[0], result_tuple(state, action, white_player)
+        return State(state[0], result_tuple(state, action, white_player))
 
 
 def result_tuple(s, a, white_player):
@@ -220,3 +639,177 @@ def file_to_state(file_name):
         string_state = state_file.read()
         state = str_to_state(string_state)
         return state
+
+
+def file_to_states(file_name):
+    """
+    Converts the boards given by the provided file to states. The file contains any number of boards in the format of
+    the file_to_state method, separated by blank lines.
+
+    :param file_name: the name of the file containing the states
+    :return: the list of states corresponding to the boards, in order
+    """
+    with open(file_name, 'r') as state_file:
+        string_states = state_file.read().split('\n\n')
+        return [str_to_state(string_state) for string_state in string_states if string_state.strip()]
+
+
+def state_files(paths):
+    """
+    Returns the state files given by the provided paths, where a path is either a file, a directory (all of its .txt
+    files) or a glob pattern such as 'states/*.txt'.
+
+    :param paths: the list of paths
+    :return: the sorted list of state file names, without duplicates
+    """
+    file_names = set()
+    for path in paths:
+        if os.path.isdir(path):
+            file_names.update(glob.glob(os.path.join(path, '*.txt')))
+        elif os.path.isfile(path):
+            file_names.add(path)
+        else:
+            file_names.update(glob.glob(path))
+    return sorted(file_names)
+
+
+def check_frontier_size():
+    """
+    Raises a ValueError if the board of the geometry in use has too many squares for the 64-bit occupancy masks of the
+    frontiers (see the expand_frontier method).
+    """
+    if NUM_ROWS * NUM_COLS > 64:
+        raise ValueError('Frontiers are only expanded for boards of at most 64 squares')
+
+
+def expand_frontier(frontier, white_player=True):
+    """
+    Generates the successors of a whole frontier of states at once, with NumPy shifts and masks on the occupancy masks
+    of the states instead of one call to the actions method per state. The pieces which can move in a direction are
+    those of the player to move on the squares of the move mask of the direction (see Geometry.move_masks) whose
+    destination is empty, i.e. whose bit is set in the empty squares shifted back by the direction.
+
+    :param frontier: an array of shape (N, 2) of states packed as (white mask, black mask) rows of 64-bit occupancy
+    masks (see the state_to_masks method), which limits the board to 64 squares
+    :param white_player: True if white moves in all the states of the frontier, False if black does
+    :return: a (successors, parents) tuple, where successors is an array of shape (M, 2) of the packed successors,
+    ordered by parent, by the square of the moved piece and then in the order of DIRECTIONS (the order of the actions
+    method for states ordered by square, as returned by the str_to_state method), and parents is an array of M values
+    holding the index in the frontier of the parent of each successor
+    """
+    import numpy as np
+
+    check_frontier_size()
+    num_squares = NUM_ROWS * NUM_COLS
+    frontier = np.asarray(frontier, dtype=np.uint64).reshape(-1, 2)
+    player = 0 if white_player else 1
+    squares = np.arange(num_squares, dtype=np.uint64)
+    offsets = [X_MOVEMENT_DIFFS[d] + Y_MOVEMENT_DIFFS[d] * NUM_COLS for d in DIRECTIONS]
+    move_masks = np.array(GEOMETRY.move_masks, dtype=np.uint64)
+    # Bits of the origin and destination of the move out of each square in each direction
+    move_bits = np.array([[(1 << s | 1 << s + offset) if GEOMETRY.move_masks[d] >> s & 1 else 0
+                           for d, offset in enumerate(offsets)] for s in range(num_squares)], dtype=np.uint64)
+    board_mask = np.uint64((1 << num_squares) - 1)
+    successors = []
+    parents = []
+    for start in range(0, len(frontier), FRONTIER_CHUNK):
+        chunk = frontier[start:start + FRONTIER_CHUNK]
+        own = chunk[:, player]
+        empty = ~(chunk[:, 0] | chunk[:, 1]) & board_mask
+        movers = np.empty((len(chunk), len(DIRECTIONS)), dtype=np.uint64)
+        for d, offset in enumerate(offsets):
+            destinations = empty >> np.uint64(offset) if offset > 0 else empty << np.uint64(-offset)
+            movers[:, d] = own & move_masks[d] & destinations
+        parent, square, direction = np.nonzero((movers[:, None, :] >> squares[None, :, None]) & np.uint64(1))
+        chunk_successors = chunk[parent]
+        chunk_successors[:, player] ^= move_bits[square, direction]
+        successors.append(chunk_successors)
+        parents.append(parent + start)
+    if not successors:
+        return np.empty((0, 2), dtype=np.uint64), np.empty(0, dtype=np.intp)
+    return np.concatenate(successors), np.concatenate(parents)
+
+
+def frontier_wins(frontier):
+    """
+    :param frontier: an array of shape (N, 2) of packed states (see the expand_frontier method)
+    :return: a boolean array of N values, which are True for the states where a player has WIN_LENGTH in a row
+    """
+    import numpy as np
+
+    check_frontier_size()
+    frontier = np.asarray(frontier, dtype=np.uint64).reshape(-1, 2)
+    line_masks = np.array(GEOMETRY.line_masks, dtype=np.uint64)
+    wins = np.zeros(len(frontier), dtype=bool)
+    for start in range(0, len(frontier), FRONTIER_CHUNK):
+        chunk = frontier[start:start + FRONTIER_CHUNK]
+        for player in (0, 1):
+            masks = chunk[:, player, None] & line_masks[None, :]
+            wins[start:start + len(chunk)] |= (masks == line_masks[None, :]).any(axis=1)
+    return wins
+
+
+def perft(state, depth, white_player=True, unique=False):
+    """
+    Counts the states reachable from the given state with each number of moves, expanding a whole ply at a time with
+    the expand_frontier method. States where a player has won are counted but not expanded.
+
+    :param state: the start state
+    :param depth: the number of moves
+    :param white_player: True if white moves first, False otherwise
+    :param unique: True to count each distinct position once per ply (and expand it once), False to count every path
+    :return: the list of depth + 1 counts, the first one being the start state
+    """
+    import numpy as np
+
+    check_frontier_size()
+    frontier = np.array([state_to_masks(state)], dtype=np.uint64)
+    counts = [1]
+    for _ in range(depth):
+        frontier = frontier[~frontier_wins(frontier)]
+        frontier, _ = expand_frontier(frontier, white_player)
+        if unique:
+            frontier = np.unique(frontier, axis=0)
+        counts.append(len(frontier))
+        white_player = not white_player
+    return counts
+
+
+def square_bit(x, y):
+    """
+    :return: the index of the bit of the square at the given x, y coordinates in an occupancy mask
+    """
+    return (y - 1) * NUM_COLS + x - 1
+
+
+def state_to_masks(state):
+    """
+    Converts the given state to occupancy masks, where the bit of each square (see the square_bit method) is set if the
+    square holds a piece.
+
+    :param state: the state
+    :return: a (white mask, black mask) tuple
+    """
+    white_mask = 0
+    for x, y in state[0]:
+        white_mask |= 1 << square_bit(x, y)
+    black_mask = 0
+    for x, y in state[1]:
+        black_mask |= 1 << square_bit(x, y)
+    return white_mask, black_mask
+
+
+def masks_to_state(white_mask, black_mask):
+    """
+    Converts the given occupancy masks (see the state_to_masks method) to a state. The pieces of the state are ordered
+    by row and then by column, like the states returned by the str_to_state method.
+
+    :param white_mask: the occupancy mask of the white pieces
+    :param black_mask: the occupancy mask of the black pieces
+    :return: the corresponding state
+    """
+    return State([SQUARES[i] for i in range(NUM_ROWS * NUM_COLS) if white_mask >> i & 1],
+                 [SQUARES[i] for i in range(NUM_ROWS * NUM_COLS) if black_mask >> i & 1])
+
+
+set_geometry(Geometry(NUM_ROWS, NUM_COLS, WIN_LENGTH))
@@ -0,0 +1,267 @@
+import math
+import os
+import random
+import time
+from argparse import ArgumentParser
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from connect_four import get_geometry, set_geometry, file_to_states, state_files, state_to_masks, state_to_str, \
+    str_to_state, str_to_geometry, actions, result, zobrist_key, expand_frontier, frontier_wins, FRONTIER_CHUNK, \
+    REPETITION_LIMIT, WIN_LENGTH
+from heuristics import is_winning_state, WIN_HEURISTIC
+from positions import PositionWriter, SIDE_BIT, pack_position, unpack_position
+from search import iterative_dfs_negamax_search
+
+EXPLORE_DEPTH = 3  # Number of moves explored from each start state
+LABEL_DEPTH = 4  # Depth of the searches labelling the positions
+GAME_DEPTH = 2  # Depth of the searches choosing the moves of the self-play games
+MAX_MOVES = 100
+RANDOM_MOVES = 4
+BATCH_SIZE = 256  # Number of positions labelled by each task of the process pool
+PROGRESS_INTERVAL = 10000  # Number of positions written between progress reports
+SIDE_KEY = 0x5851f42d4c957f2d  # XORed with the Zobrist key of the positions with black to move
+
+
+def position_keys(records):
+    """
+    Computes the canonical hashes of packed positions, i.e. the Zobrist keys of their states (which do not depend on the
+    order of the pieces, see connect_four.zobrist_key), XORed with SIDE_KEY if black is to move.
+
+    :param records: an array of shape (N, 2) of positions packed as (white word with the side bit, black word) (see
+    positions.pack_position)
+    :return: an array of N 64-bit keys
+    """
+    geometry = get_geometry()
+    records = np.asarray(records, dtype=np.uint64).reshape(-1, 2)
+    shifts = np.arange(len(geometry.squares), dtype=np.uint64)
+    square_keys = [np.array([geometry.zobrist_keys[player][square] for square in geometry.squares], dtype=np.uint64)
+                   for player in (0, 1)]
+    keys = np.where(records[:, 0] & np.uint64(SIDE_BIT), np.uint64(0), np.uint64(SIDE_KEY))
+    for start in range(0, len(records), FRONTIER_CHUNK):
+        chunk = records[start:start + FRONTIER_CHUNK]
+        for player in (0, 1):
+            occupied = (chunk[:, player, None] >> shifts[None, :]) & np.uint64(1)
+            keys[start:start + len(chunk)] ^= np.bitwise_xor.reduce(occupied * square_keys[player][None, :], axis=1)
+    return keys
+
+
+def explore_positions(state, depth):
+    """
+    Explores the positions reachable from the given state with up to depth moves, with either player moving first, a
+    whole ply at a time (see connect_four.expand_frontier). Won positions are neither returned nor expanded.
+
+    :param state: the start state
+    :param depth: the number of moves
+    :return: an iterator over arrays of packed positions (see the position_keys method), one array without duplicates
+    per ply and player moving first
+    """
+    for first_player in (True, False):
+        white_player = first_player
+        frontier = np.array([state_to_masks(state)], dtype=np.uint64)
+        for ply in range(depth + 1):
+            frontier = frontier[~frontier_wins(frontier)]
+            records = frontier.copy()
+            if white_player:
+                records[:, 0] |= np.uint64(SIDE_BIT)
+            yield records
+            if ply < depth:
+                frontier = np.unique(expand_frontier(frontier, white_player)[0], axis=0)
+            white_player = not white_player
+
+
+def self_play_positions(string_state, white_player, depth, max_moves, random_moves, seed):
+    """
+    Plays a self-play game with fixed-depth iterative deepening negamax, after random opening moves, until a player
+    wins, a position repeats REPETITION_LIMIT times or max_moves moves are played. Runs in a worker process.
+
+    :param string_state: the start state, as a string (see connect_four.state_to_str)
+    :param white_player: True if white moves first, False otherwise
+    :param depth: the depth of the searches
+    :param max_moves: the maximum number of moves
+    :param random_moves: the number of random opening moves
+    :param seed: the seed of the random opening moves
+    :return: the list of the positions of the game before each move, packed as (white word, black word) tuples
+    """
+    state = str_to_state(string_state)
+    rng = random.Random(seed)
+    history = Counter([zobrist_key(state)])
+    positions = []
+    for move_number in range(max_moves):
+        state_actions = actions(state, white_player)
+        if not state_actions:
+            break
+        positions.append(pack_position(state, white_player))
+        if move_number < random_moves:
+            action = rng.choice(state_actions)
+        else:
+            action = iterative_dfs_negamax_search(state, None, depth + 1, white_player, verbose=False,
+                                                  history=history).best_action or state_actions[0]
+        state = result(state, action, white_player)
+        if is_winning_state(state):
+            break
+        history[zobrist_key(state)] += 1
+        if history[zobrist_key(state)] >= REPETITION_LIMIT:
+            break
+        white_player = not white_player
+    return positions
+
+
+def label_positions(batch, depth):
+    """
+    Labels packed positions with the value of a fixed-depth iterative deepening negamax search (see
+    search.iterative_dfs_negamax_search), from the point of view of white. The infinite values of the searches which
+    reach a position where the player to move has no action are labelled as wins or losses (+/- WIN_HEURISTIC). Runs
+    in a worker process.
+
+    :param batch: a list of (white word, black word) tuples
+    :param depth: the depth of the searches
+    :return: the list of (white word, black word, label) tuples, where the label is None if the player to move has no
+    action
+    """
+    labelled = []
+    for white_word, black_word in batch:
+        state, white_player = unpack_position(white_word, black_word)
+        label = None
+        if actions(state, white_player):
+            label = iterative_dfs_negamax_search(state, None, depth + 1, white_player, verbose=False).value
+            if math.isinf(label):
+                label = math.copysign(WIN_HEURISTIC, label)
+        labelled.append((white_word, black_word, label))
+    return labelled
+
+
+def bounded_map(executor, function, arguments, window):
+    """
+    Maps the given function over the given arguments in the given executor like executor.map, but only submits the
+    calls as their results are consumed, with at most window calls in flight, so that the number of arguments and
+    results held in memory stays bounded whatever the number of calls.
+
+    :param executor: the executor
+    :param function: the function
+    :param arguments: an iterable over the tuples of the arguments of each call
+    :param window: the maximum number of calls in flight
+    :return: an iterator over the results, in the order of the arguments
+    """
+    futures = deque()
+    for call_arguments in arguments:
+        futures.append(executor.submit(function, *call_arguments))
+        if len(futures) >= window:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+def generate_dataset(file_name, start_states, explore_depth=EXPLORE_DEPTH, games=0, game_depth=GAME_DEPTH,
+                     label_depth=LABEL_DEPTH, max_positions=None, processes=None, max_moves=MAX_MOVES,
+                     random_moves=RANDOM_MOVES, scale=None, seed=0, verbose=True):
+    """
+    Generates a labelled position file (see positions.PositionWriter) from the positions explored from the given start
+    states and the positions of self-play games. Positions are deduplicated by canonical hash (see the position_keys
+    method) and labelled across a pool of processes, in batches which are written as soon as they are labelled, so that
+    only the set of the hashes seen grows with the number of positions (about 100 bytes per position).
+
+    :param file_name: the name of the position file to create
+    :param start_states: the start states of the exploration and of the self-play games
+    :param explore_depth: the number of moves explored from each start state, with either player moving first
+    :param games: the number of self-play games, which start from the start states in turn and alternate the player
+    moving first
+    :param game_depth: the depth of the searches choosing the moves of the self-play games
+    :param label_depth: the depth of the searches labelling the positions
+    :param max_positions: the maximum number of distinct positions, or None for no maximum
+    :param processes: the number of processes, or None for the number of CPUs
+    :param max_moves: the maximum number of moves of the self-play games
+    :param random_moves: the number of random opening moves of the self-play games
+    :param scale: if not None, the labels are the expected results sigmoid(scale * value) (see tuning.py) instead of
+    the search values
+    :param seed: the seed of the random opening moves of the self-play games
+    :param verbose: True to print the progress of the generation, False otherwise
+    :return: the number of positions written
+    """
+    start_time = time.time()
+    seen = set()
+    window = 2 * (processes or os.cpu_count() or 1)
+    skipped = 0
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=set_geometry, initargs=(get_geometry(),)) as executor, \
+            PositionWriter(file_name, labelled=True) as writer:
+        def candidates():
+            for state in start_states:
+                for records in explore_positions(state, explore_depth):
+                    yield records
+            game_arguments = ((state_to_str(start_states[i % len(start_states)]), i // len(start_states) % 2 == 0,
+                               game_depth, max_moves, random_moves, seed + i) for i in range(games))
+            for positions in bounded_map(executor, self_play_positions, game_arguments, window):
+                if positions:
+                    yield np.array(positions, dtype=np.uint64)
+
+        def batches():
+            batch = []
+            for records in candidates():
+                for record, key in zip(records.tolist(), position_keys(records).tolist()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    batch.append(record)
+                    if len(batch) == BATCH_SIZE:
+                        yield batch, label_depth
+                        batch = []
+                    if max_positions is not None and len(seen) >= max_positions:
+                        break
+                if max_positions is not None and len(seen) >= max_positions:
+                    break
+            if batch:
+                yield batch, label_depth
+
+        for labelled in bounded_map(executor, label_positions, batches(), window):
+            for white_word, black_word, label in labelled:
+                if label is None:
+                    skipped += 1
+                    continue
+                if scale is not None:
+                    label = 1 / (1 + math.exp(-max(-500.0, min(500.0, scale * label))))
+                writer.write_record(white_word, black_word, label)
+                if verbose and writer.count % PROGRESS_INTERVAL == 0:
+                    print('{} positions written, {} distinct positions found, {:.0f} positions/s'.format(
+                        writer.count, len(seen), writer.count / (time.time() - start_time)))
+    if verbose:
+        print('Wrote {} positions to {} ({} without actions skipped) in {:.1f} s'.format(
+            writer.count, file_name, skipped, time.time() - start_time))
+    return writer.count
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Generates a labelled position file from the positions explored from start '
+                                        'states and the positions of self-play games, labelled with fixed-depth '
+                                        'negamax searches.')
+    parser.add_argument('-b', '--board', default='7x7', help='The size of the board, as ROWSxCOLUMNS (at most 63 '
+                                                             'squares).')
+    parser.add_argument('-w', '--win_length', type=int, default=WIN_LENGTH, help='The number of pieces in a row '
+                                                                                 'needed to win.')
+    parser.add_argument('output', help='The position file to create.')
+    parser.add_argument('-s', '--states', nargs='+', default=['states'], help='The start states: state files, '
+                                                                              'directories or glob patterns.')
+    parser.add_argument('-d', '--explore_depth', type=int, default=EXPLORE_DEPTH, help='The number of moves explored '
+                                                                                       'from each start state.')
+    parser.add_argument('-g', '--games', type=int, default=0, help='The number of self-play games.')
+    parser.add_argument('-G', '--game_depth', type=int, default=GAME_DEPTH, help='The search depth of the self-play '
+                                                                                 'games.')
+    parser.add_argument('-l', '--label_depth', type=int, default=LABEL_DEPTH, help='The search depth of the labels.')
+    parser.add_argument('-n', '--max_positions', type=int, default=None, help='The maximum number of positions.')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='The number of processes.')
+    parser.add_argument('-m', '--max_moves', type=int, default=MAX_MOVES, help='The maximum number of moves of the '
+                                                                               'self-play games.')
+    parser.add_argument('-r', '--random_moves', type=int, default=RANDOM_MOVES, help='The number of random opening '
+                                                                                     'moves of the self-play games.')
+    parser.add_argument('--scale', type=float, default=None, help='Label with the expected results sigmoid(scale * '
+                                                                  'value) instead of the search values.')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the random opening moves.')
+    args = parser.parse_args()
+    set_geometry(str_to_geometry(args.board, args.win_length))
+
+    generate_dataset(args.output, [state for file_name in state_files(args.states)
+                                   for state in file_to_states(file_name)],
+                     args.explore_depth, args.games, args.game_depth, args.label_depth, args.max_positions,
+                     args.processes, args.max_moves, args.random_moves, args.scale, args.seed)
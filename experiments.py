@@ -0,0 +1,122 @@
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from connect_four import str_to_state, state_to_str, get_geometry, set_geometry
+from heuristics import default_heuristic, random_heuristic, win_loss_heuristic
+from search import minimax, negamax, iterative_dfs_negamax_search, INF
+
+CACHE_FILE = 'experiments/results.jsonl'
+HEURISTICS = {
+    'default': default_heuristic,
+    'random': random_heuristic,
+    'win_loss': win_loss_heuristic,
+}
+
+Job = namedtuple('Job', ('state', 'algorithm', 'params'))
+
+
+def job(state, algorithm, **params):
+    """
+    Creates an experiment job. The algorithms are:
+    - 'minimax': minimax search to the given 'depth'
+    - 'negamax': negamax search to the given 'depth', with the given successor 'order' (see search.NO_ORDER)
+    - 'iterative_negamax': iterative deepening negamax search with the given 'time_limit' and 'heuristic' (a key of
+      HEURISTICS)
+    The search is always from the point of view of white, and with a new transposition table.
+
+    :param state: the state to search from
+    :param algorithm: the search algorithm
+    :param params: the parameters of the search algorithm
+    :return: the job, which is hashable and identifies its result in the cache
+    """
+    return Job(state_to_str(state), algorithm, tuple(sorted(params.items())))
+
+
+def job_key(experiment_job):
+    """
+    :return: the key of the given job in the cache file
+    """
+    return json.dumps([experiment_job.state, experiment_job.algorithm, experiment_job.params])
+
+
+def run_job(experiment_job):
+    """
+    Runs the given job. Runs in a worker process.
+
+    :param experiment_job: the job
+    :return: a dictionary with the number of states explored ('nodes'), the value ('value'), the maximum depth reached
+    ('depth') and the elapsed time ('elapsed_time')
+    """
+    state = str_to_state(experiment_job.state)
+    params = dict(experiment_job.params)
+    start_time = time.time()
+    if experiment_job.algorithm == 'minimax':
+        minimax.counter = 0
+        value = minimax(state, params['depth'], {}, white_player=True, count=True)
+        nodes, depth = minimax.counter, params['depth']
+    elif experiment_job.algorithm == 'negamax':
+        negamax.counter = 0
+        _, value = negamax(state, params['depth'], -INF, INF, {}, INF, start_time, 1, count=True, order=params['order'])
+        nodes, depth = negamax.counter, params['depth']
+    elif experiment_job.algorithm == 'iterative_negamax':
+        search_result = iterative_dfs_negamax_search(state, params['time_limit'], params.get('depth_limit', 20), True,
+                                                     heuristic=HEURISTICS[params['heuristic']], verbose=False)
+        value, nodes, depth = search_result.value, search_result.nodes, search_result.depth
+    else:
+        raise ValueError('Unknown algorithm: {}'.format(experiment_job.algorithm))
+    return {'nodes': nodes, 'value': value, 'depth': depth, 'elapsed_time': time.time() - start_time}
+
+
+def load_results(cache_file=CACHE_FILE):
+    """
+    Loads the cached results of the jobs.
+
+    :param cache_file: the name of the cache file
+    :return: a dictionary of job key (see the job_key method) to result
+    """
+    results = {}
+    if os.path.isfile(cache_file):
+        with open(cache_file, 'r') as results_file:
+            for line in results_file:
+                if line.strip():
+                    entry = json.loads(line)
+                    results[entry['key']] = entry['result']
+    return results
+
+
+def run_jobs(jobs, processes=None, cache_file=CACHE_FILE):
+    """
+    Runs the given jobs across a pool of processes, skipping the jobs whose result is already in the cache file. Each
+    new result is appended to the cache file as soon as its job is done, so an interrupted run only loses the jobs in
+    progress. Note that the jobs with a time limit should not use more processes than there are CPUs, since the
+    processes would then share the CPUs and explore fewer states in the same time.
+
+    :param jobs: the jobs to run
+    :param processes: the number of processes, or None for the number of CPUs
+    :param cache_file: the name of the cache file
+    :return: a dictionary of job to result, for all the given jobs
+    """
+    cached_results = load_results(cache_file)
+    results = {j: cached_results[job_key(j)] for j in jobs if job_key(j) in cached_results}
+    new_jobs = [j for j in set(jobs) if j not in results]
+    print('{} jobs cached, {} jobs to run'.format(len(results), len(new_jobs)))
+    if not new_jobs:
+        return results
+    if os.path.dirname(cache_file) and not os.path.isdir(os.path.dirname(cache_file)):
+        os.makedirs(os.path.dirname(cache_file))
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=processes, initializer=set_geometry, initargs=(get_geometry(),)) as executor, \
+            open(cache_file, 'a') as results_file:
+        futures = {executor.submit(run_job, j): j for j in new_jobs}
+        for i, future in enumerate(as_completed(futures), 1):
+            experiment_job = futures[future]
+            results[experiment_job] = future.result()
+            results_file.write(json.dumps({'key': job_key(experiment_job), 'result': results[experiment_job]}) + '\n')
+            results_file.flush()
+            print('[{}/{}] {} {}: {}'.format(i, len(new_jobs), experiment_job.algorithm, dict(experiment_job.params),
+                                             results[experiment_job]))
+    print('Ran {} jobs in {} s'.format(len(new_jobs), time.time() - start_time))
+    return results
@@ -0,0 +1,270 @@
+import numpy as np
+
+from connect_four import GEOMETRY, GEOMETRY_LISTENERS, DIRECTIONS, X_MOVEMENT_DIFFS, Y_MOVEMENT_DIFFS, \
+    is_within_bounds, square_bit, state_to_masks
+from heuristics import ADJACENT_DIRECTIONS, WIN_HEURISTIC, THREE_IN_A_ROW_HEURISTIC, FOUR_IN_A_ROW_HEURISTIC
+
+MAX_SQUARES = 64  # The occupancy masks are 64-bit integers
+FEATURES = ('weighted_distance_to_center', 'manhattan_distance_to_center', 'close_to_the_edge', 'cluster',
+            'num_actions', 'distance_between_pieces', 'pairwise_distance', 'in_a_row', 'three_in_a_row',
+            'four_in_a_row', 'win')
+
+
+def compute_square_values():
+    """
+    :return: the per-square values of the weighted distance to the center, the Manhattan distance to the center and
+    the closeness to the edge, as three arrays of NUM_SQUARES values
+    """
+    center_x = (NUM_COLS + 1) / 2
+    center_y = (NUM_ROWS + 1) / 2
+    squared = np.array([(x - center_x) ** 2 + (y - center_y) ** 2 for x, y in SQUARES])
+    manhattan = np.array([abs(x - center_x) + abs(y - center_y) for x, y in SQUARES])
+    edge = np.array([min(x, NUM_COLS + 1 - x) + min(y, NUM_ROWS + 1 - y) for x, y in SQUARES], dtype=np.float64)
+    return squared, manhattan, edge
+
+
+def compute_neighbours(directions):
+    """
+    :return: an array of shape (NUM_SQUARES, number of directions) holding the index of the square next to each square
+    in each of the given (x, y) directions, or OFF_BOARD
+    """
+    neighbours = np.full((NUM_SQUARES, len(directions)), OFF_BOARD, dtype=np.intp)
+    for square, (x, y) in enumerate(SQUARES):
+        for d, (i, j) in enumerate(directions):
+            if is_within_bounds(x + i, y + j):
+                neighbours[square, d] = square_bit(x + i, y + j)
+    return neighbours
+
+
+def compute_rays():
+    """
+    :return: an array of shape (NUM_SQUARES, len(ADJACENT_DIRECTIONS), max(NUM_ROWS, NUM_COLS) + 1) holding the
+    indices of the squares following each square in each adjacent direction, padded with OFF_BOARD
+    """
+    length = max(NUM_ROWS, NUM_COLS) + 1
+    rays = np.full((NUM_SQUARES, len(ADJACENT_DIRECTIONS), length), OFF_BOARD, dtype=np.intp)
+    for square, (x, y) in enumerate(SQUARES):
+        for d, (i, j) in enumerate(ADJACENT_DIRECTIONS):
+            for k in range(length):
+                if not is_within_bounds(x + (k + 1) * i, y + (k + 1) * j):
+                    break
+                rays[square, d, k] = square_bit(x + (k + 1) * i, y + (k + 1) * j)
+    return rays
+
+
+def compute_distances():
+    """
+    :return: the (NUM_SQUARES, NUM_SQUARES) matrices of the Manhattan distances between squares, and of the distances
+    considered by heuristics.distance_between_pieces_heuristic (i.e. only between squares in different rows and
+    columns, max(NUM_ROWS, NUM_COLS) otherwise)
+    """
+    distances = np.array([[abs(x - x2) + abs(y - y2) for x2, y2 in SQUARES] for x, y in SQUARES], dtype=np.int16)
+    different = np.array([[x != x2 and y != y2 for x2, y2 in SQUARES] for x, y in SQUARES])
+    return distances, np.where(different, distances, max(NUM_ROWS, NUM_COLS)).astype(np.int8)
+
+
+def check_board_size():
+    """
+    Raises a ValueError if the board of the geometry in use has too many squares for 64-bit occupancy masks.
+    """
+    if NUM_SQUARES > MAX_SQUARES:
+        raise ValueError('Features are only computed for boards of at most {} squares'.format(MAX_SQUARES))
+
+
+def occupancy(masks):
+    """
+    Converts occupancy masks (see connect_four.state_to_masks) to occupancy arrays.
+
+    :param masks: an array of N occupancy masks
+    :return: an array of shape (N, NUM_SQUARES + 1) holding 1 for the occupied squares, where the last column is the
+    OFF_BOARD square (16-bit integers are enough for all the features, and much faster than 64-bit integers)
+    """
+    masks = np.asarray(masks, dtype=np.uint64)
+    bits = (masks[:, None] >> np.arange(NUM_SQUARES, dtype=np.uint64)) & np.uint64(1)
+    return np.concatenate([bits.astype(np.int16), np.zeros((len(masks), 1), dtype=np.int16)], axis=1)
+
+
+def line_counts(pieces, enemy_pieces):
+    """
+    Computes, for each square and adjacent direction, the number of pieces in the line starting at the square, with
+    and without a blank connector (see heuristics.in_a_row_features and heuristics.win_loss_heuristic).
+
+    :param pieces: the occupancy array of the pieces of the player to consider
+    :param enemy_pieces: the occupancy array of the pieces of the other player
+    :return: a (count with connector, count without connector) tuple of arrays of shape
+    (N, NUM_SQUARES, len(ADJACENT_DIRECTIONS)), which are 0 for the squares without pieces of the player
+    """
+    squares = np.arange(NUM_SQUARES)
+    own = pieces[:, :NUM_SQUARES]
+    count = np.empty((len(pieces), NUM_SQUARES, len(ADJACENT_DIRECTIONS)), dtype=np.int16)
+    count_without_connector = np.empty_like(count)
+    for d in range(len(ADJACENT_DIRECTIONS)):
+        neighbours = ADJACENT_NEIGHBOURS[:, d]
+        run = np.zeros_like(pieces)  # Number of pieces in a row following each square
+        for _ in range(RAYS.shape[2] - 1):
+            run[:, :NUM_SQUARES] = pieces[:, neighbours] * (1 + run[:, neighbours])
+        square_run = run[:, :NUM_SQUARES]
+        connector = RAYS[squares, d, square_run]
+        after_connector = RAYS[squares, d, square_run + 1]
+        blank_connector = np.take_along_axis(enemy_pieces, connector, axis=1) == 0
+        run_after_connector = np.take_along_axis(pieces * (1 + run), after_connector, axis=1)
+        count[:, :, d] = own * (1 + square_run + blank_connector * run_after_connector)
+        count_without_connector[:, :, d] = own * (1 + square_run)
+    return count, count_without_connector
+
+
+def in_a_row_features(pieces, enemy_pieces):
+    """
+    Vectorized version of heuristics.in_a_row_features, where the pieces are considered in the order of their squares
+    (i.e. by row and then by column, as in the states returned by connect_four.str_to_state).
+
+    :return: a (four in a row, three in a row, sum of squared counts, win) tuple of arrays of N values
+    """
+    count, count_without_connector = line_counts(pieces, enemy_pieces)
+    flat_count = count.reshape(len(pieces), -1)
+    hits = flat_count >= WIN_LENGTH - 1
+    has_hit = hits.any(axis=1)
+    first_hit = np.take_along_axis(flat_count, hits.argmax(axis=1)[:, None], axis=1)[:, 0]
+    four = has_hit & (first_hit >= WIN_LENGTH)
+    three = has_hit & ~four
+    total_count = np.where(has_hit, 0, (flat_count * flat_count).sum(axis=1))
+    win = (count_without_connector >= WIN_LENGTH).reshape(len(pieces), -1).any(axis=1)
+    return four.astype(np.int16), three.astype(np.int16), total_count, win
+
+
+def batch_features(white_masks, black_masks):
+    """
+    Computes the features of FEATURES for a batch of states in a single pass. Each feature is the difference between
+    the values of white and black, so that bigger values are better for white.
+
+    :param white_masks: an array of N occupancy masks of the white pieces (without the side bit of position files)
+    :param black_masks: an array of N occupancy masks of the black pieces
+    :return: an array of shape (N, len(FEATURES))
+    """
+    check_board_size()
+    white = occupancy(white_masks)
+    black = occupancy(black_masks)
+    empty = 1 - white - black
+    empty[:, OFF_BOARD] = 0
+    white_squares = white[:, :NUM_SQUARES]
+    black_squares = black[:, :NUM_SQUARES]
+    difference = white_squares - black_squares
+
+    def cluster(pieces):
+        return (pieces[:, :NUM_SQUARES, None] * pieces[:, ADJACENT_NEIGHBOURS]).sum(axis=(1, 2))
+
+    def num_actions(pieces):
+        return (pieces[:, :NUM_SQUARES, None] * empty[:, MOVE_NEIGHBOURS]).sum(axis=(1, 2))
+
+    def distance_between_pieces(pieces):
+        nearest = np.where(pieces[:, None, :NUM_SQUARES] == 1, SPREAD_DISTANCES[None],
+                           np.int8(max(NUM_ROWS, NUM_COLS))).min(axis=2)
+        return (pieces[:, :NUM_SQUARES] * nearest).sum(axis=1)
+
+    def pairwise_distance(pieces):
+        return np.einsum('ni,ij,nj->n', pieces[:, :NUM_SQUARES], DISTANCES, pieces[:, :NUM_SQUARES])
+
+    white_four, white_three, white_count, white_win = in_a_row_features(white, black)
+    black_four, black_three, black_count, black_win = in_a_row_features(black, white)
+    features = np.empty((len(white), len(FEATURES)), dtype=np.float64)
+    features[:, 0] = -difference.dot(SQUARED_DISTANCES_TO_CENTER)
+    features[:, 1] = -difference.dot(DISTANCES_TO_CENTER)
+    features[:, 2] = difference.dot(CLOSENESS_TO_EDGE)
+    features[:, 3] = cluster(white) - cluster(black)
+    features[:, 4] = num_actions(white) - num_actions(black)
+    features[:, 5] = distance_between_pieces(black) - distance_between_pieces(white)
+    features[:, 6] = pairwise_distance(black) - pairwise_distance(white)
+    features[:, 7] = white_count - black_count
+    features[:, 8] = white_three - black_three
+    features[:, 9] = white_four - black_four
+    features[:, 10] = np.where(black_win, -1, white_win.astype(np.int16))
+    return features
+
+
+def states_features(states):
+    """
+    Computes the features of FEATURES for the given states (see the batch_features method).
+
+    :param states: a list of states
+    :return: an array of shape (len(states), len(FEATURES))
+    """
+    check_board_size()
+    masks = np.array([state_to_masks(state) for state in states], dtype=np.uint64).reshape(-1, 2)
+    return batch_features(masks[:, 0], masks[:, 1])
+
+
+def state_features(state):
+    """
+    Computes the features of FEATURES for a single state (see the batch_features method).
+
+    :param state: the state
+    :return: an array of len(FEATURES) values
+    """
+    return states_features([state])[0]
+
+
+def heuristic_weights(**weights):
+    """
+    :return: the weight vector over FEATURES with the given weights, e.g. heuristic_weights(cluster=1)
+    """
+    vector = np.zeros(len(FEATURES))
+    for feature, weight in weights.items():
+        vector[FEATURES.index(feature)] = weight
+    return vector
+
+
+def heuristic_values(features, heuristic):
+    """
+    Computes the values of a heuristic of HEURISTIC_WEIGHTS from the given features, as a dot product.
+
+    :param features: the features of one state, or of a batch of states
+    :param heuristic: the name of the heuristic function, e.g. 'default_heuristic'
+    :return: the heuristic value(s)
+    """
+    return features.dot(HEURISTIC_WEIGHTS[heuristic])
+
+
+def update_geometry(geometry):
+    """
+    Recomputes the tables of the features for the given geometry of the board (see connect_four.set_geometry).
+
+    :param geometry: the new geometry
+    """
+    global NUM_ROWS, NUM_COLS, NUM_SQUARES, OFF_BOARD, WIN_LENGTH, SQUARES, SQUARED_DISTANCES_TO_CENTER, \
+        DISTANCES_TO_CENTER, CLOSENESS_TO_EDGE, ADJACENT_NEIGHBOURS, MOVE_NEIGHBOURS, RAYS, DISTANCES, SPREAD_DISTANCES
+    NUM_ROWS = geometry.num_rows
+    NUM_COLS = geometry.num_cols
+    NUM_SQUARES = NUM_ROWS * NUM_COLS
+    OFF_BOARD = NUM_SQUARES  # Index of the off-board square, which is always empty
+    WIN_LENGTH = geometry.win_length
+    SQUARES = geometry.squares
+    SQUARED_DISTANCES_TO_CENTER, DISTANCES_TO_CENTER, CLOSENESS_TO_EDGE = compute_square_values()
+    ADJACENT_NEIGHBOURS = compute_neighbours(ADJACENT_DIRECTIONS)
+    MOVE_NEIGHBOURS = compute_neighbours([(X_MOVEMENT_DIFFS[d], Y_MOVEMENT_DIFFS[d]) for d in DIRECTIONS])
+    RAYS = compute_rays()
+    DISTANCES, SPREAD_DISTANCES = compute_distances()
+
+
+update_geometry(GEOMETRY)
+GEOMETRY_LISTENERS.append(update_geometry)
+
+# Weights over FEATURES of the heuristics of heuristics.py, whose values are the dot products of the features and
+# these weights. The in a row features assume that the pieces are ordered by square (see in_a_row_features).
+HEURISTIC_WEIGHTS = {
+    'default_heuristic': heuristic_weights(weighted_distance_to_center=1, in_a_row=1,
+                                           three_in_a_row=THREE_IN_A_ROW_HEURISTIC,
+                                           four_in_a_row=FOUR_IN_A_ROW_HEURISTIC),
+    'count_num_in_a_row_heuristic': heuristic_weights(in_a_row=1, three_in_a_row=THREE_IN_A_ROW_HEURISTIC,
+                                                      four_in_a_row=FOUR_IN_A_ROW_HEURISTIC),
+    'weighted_distance_to_center_heuristic': heuristic_weights(weighted_distance_to_center=1),
+    'has_three_in_a_row_heuristic': heuristic_weights(three_in_a_row=1, four_in_a_row=1),
+    'close_to_the_edge_heuristic': heuristic_weights(close_to_the_edge=1),
+    'win_loss_heuristic': heuristic_weights(win=WIN_HEURISTIC),
+    'manhattan_distance_to_center_heuristic': heuristic_weights(manhattan_distance_to_center=1),
+    'distance_between_pieces_heuristic': heuristic_weights(distance_between_pieces=1),
+    'num_actions_heuristic': heuristic_weights(num_actions=1),
+    'distance_from_center_and_other_pieces_heuristic': heuristic_weights(manhattan_distance_to_center=1,
+                                                                         pairwise_distance=1),
+    'cluster_heuristic': heuristic_weights(cluster=1),
+    'distance_between_pieces': heuristic_weights(cluster=1),
+}
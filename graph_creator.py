@@ -4,9 +4,9 @@ import pygal as pygal
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MaxNLocator
 
-from heuristics import default_heuristic, random_heuristic, win_loss_heuristic, WIN_HEURISTIC
-from search import minimax, alphabeta, INF, negamax, SORTED_BY_HEURISTIC_ORDER, NO_ORDER, RANDOM_ORDER
+from search import alphabeta, INF, SORTED_BY_HEURISTIC_ORDER, NO_ORDER, RANDOM_ORDER
 from connect_four import *
+from experiments import job, run_jobs, CACHE_FILE
 
 MIN_DEPTH = 3
 MAX_DEPTH = 6
@@ -17,136 +17,52 @@ DEFAULT_TIME = 10000
 
 DEFAULT_DEPTH = 20
 
+PROCESSES = None  # Number of processes running the experiments, or None for the number of CPUs
 
-def get_searched_states_starting_at(state, label):
-    minimax_points = []
-    negamax_points = []
-    print('Initial state {}'.format(label))
-    print_state(state)
-    for d in range(MIN_DEPTH, MAX_DEPTH + 1):
-        start_time = time.time()
-        num_nodes, val = get_minimax_number_states_explored(state, d)
-        minimax_points.append(num_nodes)
-        print('Minimax explored {} nodes to return {} for a depth cutoff of {} in {} seconds.'.format(
-            num_nodes,
-            val,
-            d,
-            time.time() - start_time))
-
-        start_time = time.time()
-        num_nodes, val = get_negamax_number_states_explored(state, d)
-        negamax_points.append(num_nodes)
-        print('Negamax explored {} nodes to return {} for a depth cutoff of {} in {} seconds.'.format(
-            num_nodes,
-            val,
-            d,
-            time.time() - start_time))
-    return minimax_points, negamax_points
-
-
-def get_searched_states_with_ordering(state, label):
-    no_sorting_points = []
-    sorting_points = []
-    random_points = []
-    print('Initial state {}'.format(label))
-    print_state(state)
-    for d in range(MIN_DEPTH, MAX_DEPTH + 1):
-        start_time = time.time()
-        num_nodes, val = get_negamax_number_states_explored(state, d, order=NO_ORDER)
-        no_sorting_points.append(num_nodes)
-        print('Negamax explored {} nodes to return {} for a depth cutoff of {} in {} seconds with ordering {}.'.format(
-            num_nodes,
-            val,
-            d,
-            time.time() - start_time,
-            'NO_ORDER'))
-
-        start_time = time.time()
-        num_nodes, val = get_negamax_number_states_explored(state, d, order=SORTED_BY_HEURISTIC_ORDER)
-        sorting_points.append(num_nodes)
-        print('Negamax explored {} nodes to return {} for a depth cutoff of {} in {} seconds with ordering {}.'.format(
-            num_nodes,
-            val,
-            d,
-            time.time() - start_time,
-            'SORTED_ORDER'))
-
-        start_time = time.time()
-        num_nodes, val = get_negamax_number_states_explored(state, d, order=RANDOM_ORDER)
-        random_points.append(num_nodes)
-        print('Negamax explored {} nodes to return {} for a depth cutoff of {} in {} seconds with ordering {}.'.format(
-            num_nodes,
-            val,
-            d,
-            time.time() - start_time,
-            'RANDOM_ORDER'))
-    return no_sorting_points, sorting_points, random_points
-
-
-def get_searched_states_with_heuristics(state, label):
-    default_heur_points = []
-    random_heur_points = []
-    win_heur_points = []
-    print('Initial state {}'.format(label))
-    print_state(state)
-    for t in range(MIN_TIME, MAX_TIME + 1):
-        start_time = time.time()
-        num_nodes = get_iterative_dfs_negamax_number_states_explored(state, t=t, heuristic=default_heuristic)
-        default_heur_points.append(num_nodes)
-        print('Negamax explored {} nodes in {} seconds with {} heuristic.'.format(
-            num_nodes,
-            time.time() - start_time,
-            'DEFAULT'))
-
-        start_time = time.time()
-        num_nodes = get_iterative_dfs_negamax_number_states_explored(state, t=t, heuristic=random_heuristic)
-        random_heur_points.append(num_nodes)
-        print('Negamax explored {} nodes in {} seconds with {} heuristic.'.format(
-            num_nodes,
-            time.time() - start_time,
-            'RANDOM'))
-
-        start_time = time.time()
-        num_nodes = get_iterative_dfs_negamax_number_states_explored(state, t=t, heuristic=win_loss_heuristic)
-        win_heur_points.append(num_nodes)
-        print('Negamax explored {} nodes in {} seconds with {} heuristic.'.format(
-            num_nodes,
-            time.time() - start_time,
-            'WIN_LOSS'))
-    return default_heur_points, random_heur_points, win_heur_points
-
-
-def get_searched_states_with_heuristics_and_return_depth(state, label):
-    default_heur_points = []
-    random_heur_points = []
-    win_heur_points = []
-    print('Initial state {}'.format(label))
-    print_state(state)
-    start_time = time.time()
-    for t in range(MIN_TIME, MAX_TIME + 1):
-        depth = get_iterative_dfs_negamax_depth(state, t=t, heuristic=default_heuristic)
-        default_heur_points.append(depth)
-        print('Negamax explored {} nodes in {} seconds with {} heuristic.'.format(
-            depth,
-            time.time() - start_time,
-            'DEFAULT'))
-
-        start_time = time.time()
-        depth = get_iterative_dfs_negamax_depth(state, t=t, heuristic=random_heuristic)
-        random_heur_points.append(depth)
-        print('Negamax explored {} nodes in {} seconds with {} heuristic.'.format(
-            depth,
-            time.time() - start_time,
-            'RANDOM'))
-
-        start_time = time.time()
-        depth = get_iterative_dfs_negamax_depth(state, t=t, heuristic=win_loss_heuristic)
-        win_heur_points.append(depth)
-        print('Negamax explored {} nodes in {} seconds with {} heuristic.'.format(
-            depth,
-            time.time() - start_time,
-            'WIN_LOSS'))
-    return default_heur_points, random_heur_points, win_heur_points
+
+def searched_states_starting_at_jobs(state):
+    """
+    :return: the jobs of question 1 for the given state, as a list of series (minimax, alpha-beta) of jobs per depth
+    """
+    depths = range(MIN_DEPTH, MAX_DEPTH + 1)
+    return [[job(state, 'minimax', depth=d) for d in depths],
+            [job(state, 'negamax', depth=d, order=SORTED_BY_HEURISTIC_ORDER) for d in depths]]
+
+
+def searched_states_with_ordering_jobs(state):
+    """
+    :return: the jobs of question 3 for the given state, as a list of series (no order, sorted, random order) of jobs
+    per depth
+    """
+    depths = range(MIN_DEPTH, MAX_DEPTH + 1)
+    return [[job(state, 'negamax', depth=d, order=order) for d in depths]
+            for order in (NO_ORDER, SORTED_BY_HEURISTIC_ORDER, RANDOM_ORDER)]
+
+
+def searched_states_with_heuristics_jobs(state):
+    """
+    :return: the jobs of question 5 for the given state, as a list of series (default, random, win/loss heuristic) of
+    jobs per time limit
+    """
+    times = range(MIN_TIME, MAX_TIME + 1)
+    return [[job(state, 'iterative_negamax', time_limit=t, depth_limit=DEFAULT_DEPTH, heuristic=heuristic)
+             for t in times]
+            for heuristic in ('default', 'random', 'win_loss')]
+
+
+def run_experiment(states, experiment_jobs, metric='nodes'):
+    """
+    Runs the jobs of the given experiment for all the given states across a pool of processes, only computing the jobs
+    which are not already in the cache file (see experiments.run_jobs).
+
+    :param states: the list of (state, label) tuples
+    :param experiment_jobs: the function returning the series of jobs of a state
+    :param metric: the result of the jobs to use as points ('nodes' or 'depth')
+    :return: the list of (label, series) tuples, where series is the list of points of each series
+    """
+    experiment = [(label, experiment_jobs(state)) for state, label in states]
+    results = run_jobs([j for _, series in experiment for jobs in series for j in jobs], PROCESSES, CACHE_FILE)
+    return [(label, [[results[j][metric] for j in jobs] for jobs in series]) for label, series in experiment]
 
 
 def plot_with_plotly(minimax_points, alphabeta_points, negamax_points, label):
@@ -275,8 +191,7 @@ def question1():
         (file_to_state('states/state_q1a.txt'), 'A'),
         (file_to_state('states/state_q1b.txt'), 'B'),
         (file_to_state('states/state_q1c.txt'), 'C')]
-    for state, label in states:
-        minimax_points, negamax_points = get_searched_states_starting_at(state, label)
+    for label, (minimax_points, negamax_points) in run_experiment(states, searched_states_starting_at_jobs):
         plot_with_pyplot_q1(minimax_points, negamax_points, label)
 
 
@@ -290,8 +205,8 @@ def question3():
         (file_to_state('states/state_q1a.txt'), 'A'),
         (file_to_state('states/state_q1b.txt'), 'B'),
         (file_to_state('states/state_q1c.txt'), 'C')]
-    for state, label in states:
-        no_sorting_points, sorting_points, random_points = get_searched_states_with_ordering(state, label)
+    for label, (no_sorting_points, sorting_points, random_points) in run_experiment(
+            states, searched_states_with_ordering_jobs):
         plot_with_pyplot_q3(no_sorting_points, sorting_points, random_points, label)
 
 
@@ -306,8 +221,8 @@ def question5():
         (file_to_state('states/state_q1a.txt'), 'A'),
         (file_to_state('states/state_q1b.txt'), 'B'),
         (file_to_state('states/state_q1c.txt'), 'C')]
-    for state, label in states:
-        default_heur_points, random_heur_points, win_heur_points = get_searched_states_with_heuristics(state, label)
+    for label, (default_heur_points, random_heur_points, win_heur_points) in run_experiment(
+            states, searched_states_with_heuristics_jobs):
         # plot_with_plotly(minimax_points, alphabeta_points, negamax_points, label).
         plot_with_pyplot_q5(default_heur_points, random_heur_points, win_heur_points, label)
 
@@ -323,20 +238,12 @@ def question5b():
         (file_to_state('states/state_q1b.txt'), 'B'),
         # (file_to_state('states/state_q1c.txt'), 'C')
     ]
-    for state, label in states:
-        default_heur_points, random_heur_points, win_heur_points = get_searched_states_with_heuristics_and_return_depth(
-            state, label)
+    for label, (default_heur_points, random_heur_points, win_heur_points) in run_experiment(
+            states, searched_states_with_heuristics_jobs, metric='depth'):
         # plot_with_plotly(minimax_points, alphabeta_points, negamax_points, label).
         plot_with_pyplot_q5b(default_heur_points, random_heur_points, win_heur_points, label)
 
 
-def get_minimax_number_states_explored(initial_state, depth):
-    transposition_table = {}
-    minimax.counter = 0
-    val = minimax(initial_state, depth, transposition_table, white_player=True, count=True)
-    return minimax.counter, val
-
-
 def get_alphabeta_number_states_explored(initial_state, depth):
     transposition_table = {}
     alphabeta.counter = 0
@@ -345,77 +252,6 @@ def get_alphabeta_number_states_explored(initial_state, depth):
     return alphabeta.counter, val
 
 
-def iterative_dfs_negamax_states(state, time_limit, depth_limit, white_player, heuristic=default_heuristic):
-    start_time = time.time()
-    transposition_table = {}
-    num_states = 0
-    for d in range(depth_limit):
-        t = time.time()
-        negamax.counter = 0
-        best_action, v = negamax(state, d, -INF, INF, transposition_table, time_limit, start_time, 1, True,
-                                 heuristic=heuristic)
-        num_states += negamax.counter
-        if v is None:  # Incomplete search
-            return num_states
-        elapsed_time = time.time() - t
-        print('Depth {}, value: {}, best action: {}, elapsed time: {}, states visited: {}'
-              .format(d, v, action_tuple_to_str(best_action), elapsed_time, negamax.counter))
-        if white_player and v >= WIN_HEURISTIC or not white_player and v <= -WIN_HEURISTIC:
-            print('Win found for {} player with move {}'.format(
-                'white' if white_player else 'black',
-                action_tuple_to_str(best_action)))
-            return num_states
-        if time.time() - start_time >= time_limit:
-            return num_states
-    return num_states
-
-
-def iterative_dfs_negamax_depth(state, time_limit, depth_limit, white_player, heuristic=default_heuristic):
-    start_time = time.time()
-    transposition_table = {}
-    num_states = 0
-    for d in range(depth_limit):
-        t = time.time()
-        negamax.counter = 0
-        best_action, v = negamax(state, d, -INF, INF, transposition_table, time_limit, start_time, 1, True,
-                                 heuristic=heuristic)
-        num_states += negamax.counter
-        if v is None:  # Incomplete search
-            return d - 1
-        elapsed_time = time.time() - t
-        print('Depth {}, value: {}, best action: {}, elapsed time: {}, states visited: {}'
-              .format(d, v, action_tuple_to_str(best_action), elapsed_time, negamax.counter))
-        if white_player and v >= WIN_HEURISTIC or not white_player and v <= -WIN_HEURISTIC:
-            print('Win found for {} player with move {}'.format(
-                'white' if white_player else 'black',
-                action_tuple_to_str(best_action)))
-            return d
-        if time.time() - start_time >= time_limit:
-            return d
-    return depth_limit - 1
-
-
-def get_iterative_dfs_negamax_number_states_explored(initial_state, depth=DEFAULT_DEPTH, t=DEFAULT_TIME,
-                                                     heuristic=default_heuristic):
-    num_states = iterative_dfs_negamax_states(initial_state, t, depth, True, heuristic=heuristic)
-    return num_states
-
-
-def get_iterative_dfs_negamax_depth(initial_state, depth=DEFAULT_DEPTH, t=DEFAULT_TIME,
-                                    heuristic=default_heuristic):
-    depth = iterative_dfs_negamax_depth(initial_state, t, depth, True, heuristic=heuristic)
-    return depth
-
-
-def get_negamax_number_states_explored(initial_state, depth, order=SORTED_BY_HEURISTIC_ORDER,
-                                       heuristic=default_heuristic):
-    transposition_table = {}
-    negamax.counter = 0
-    _, val = negamax(initial_state, depth, -INF, INF, transposition_table, 10000, time.time(), 1, count=True,
-                     order=order, heuristic=heuristic)
-    return negamax.counter, val
-
-
 def plot_state(state, label):
     f = plt.figure()
     ax = f.gca()
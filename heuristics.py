@@ -1,14 +1,35 @@
 import random
 
-from connect_four import NUM_COLS, NUM_ROWS, actions
+from connect_four import GEOMETRY, GEOMETRY_LISTENERS, State, actions
 
 WIN_HEURISTIC = 10000
 FOUR_IN_A_ROW_HEURISTIC = 3000
 THREE_IN_A_ROW_HEURISTIC = 1000
 ADJACENT_DIRECTIONS = ((0, 1), (1, -1), (1, 0), (1, 1))  # Only need to consider half, since all x,y tuples explored
 
-CENTER_X = (NUM_COLS + 1) / 2
-CENTER_Y = (NUM_ROWS + 1) / 2
+DEFAULT_HEURISTIC_FEATURES = ('distance_to_center', 'in_a_row', 'three_in_a_row', 'four_in_a_row')
+DEFAULT_HEURISTIC_WEIGHTS = (1, 1, THREE_IN_A_ROW_HEURISTIC, FOUR_IN_A_ROW_HEURISTIC)
+
+
+def update_geometry(geometry):
+    """
+    Updates the constants of the heuristics which depend on the geometry of the board (see connect_four.set_geometry).
+    The "four in a row" and "three in a row" of the heuristics are lines of WIN_LENGTH and WIN_LENGTH - 1 pieces.
+
+    :param geometry: the new geometry
+    """
+    global WIN_LENGTH, CENTER_X, CENTER_Y, BOARD_SIZE, EDGE_CLOSENESS
+    WIN_LENGTH = geometry.win_length
+    CENTER_X = (geometry.num_cols + 1) / 2
+    CENTER_Y = (geometry.num_rows + 1) / 2
+    BOARD_SIZE = max(geometry.num_rows, geometry.num_cols)
+    # Closeness of each square to the edge, i.e. the sum of its coordinates counted from the nearest edges
+    EDGE_CLOSENESS = dict(((x, y), min(x, geometry.num_cols + 1 - x) + min(y, geometry.num_rows + 1 - y))
+                          for x, y in geometry.squares)
+
+
+update_geometry(GEOMETRY)
+GEOMETRY_LISTENERS.append(update_geometry)
 
 
 def default_heuristic(state):
@@ -30,35 +51,80 @@ def count_num_in_a_row_heuristic(state):
     :return: the heuristic value of the given state, where bigger values are better for the maximizing player
     """
     def count_pieces_in_a_row(pieces, enemy_pieces):
-        total_count = 0
-        for (x, y) in pieces:
-            for (i, j) in ADJACENT_DIRECTIONS:
-                new_x = x + i
-                new_y = y + j
-                count = 1
-                while (new_x, new_y) in pieces:
-                    count += 1
-                    new_x += i
-                    new_y += j
-                if (new_x, new_y) not in enemy_pieces:  # Blank connector
-                    new_x += i
-                    new_y += j
-                while (new_x, new_y) in pieces:
-                    count += 1
-                    new_x += i
-                    new_y += j
-                if count >= 4:
-                    return FOUR_IN_A_ROW_HEURISTIC
-                if count >= 3:
-                    return THREE_IN_A_ROW_HEURISTIC
-                total_count += count * count  # Bigger counts better...
-        return total_count
+        four, three, total_count = in_a_row_features(pieces, enemy_pieces)
+        return four * FOUR_IN_A_ROW_HEURISTIC + three * THREE_IN_A_ROW_HEURISTIC + total_count
 
     white_squares = state[0]
     black_squares = state[1]
     return count_pieces_in_a_row(white_squares, black_squares) - count_pieces_in_a_row(black_squares, white_squares)
 
 
+def in_a_row_features(pieces, enemy_pieces):
+    """
+    Computes the features of the count_num_in_a_row_heuristic method for the given pieces: whether the first line of
+    WIN_LENGTH - 1 or more pieces found (possibly with a blank connector) has WIN_LENGTH pieces (4 on the standard
+    board) or WIN_LENGTH - 1 pieces, and otherwise the sum of the squared number of pieces in each line.
+
+    :param pieces: the x, y coordinates of the pieces of the player to consider
+    :param enemy_pieces: the x, y coordinates of the pieces of the other player
+    :return: a (four in a row, three in a row, sum of squared counts) tuple, where at most one of the values is nonzero
+    """
+    total_count = 0
+    for (x, y) in pieces:
+        for (i, j) in ADJACENT_DIRECTIONS:
+            new_x = x + i
+            new_y = y + j
+            count = 1
+            while (new_x, new_y) in pieces:
+                count += 1
+                new_x += i
+                new_y += j
+            if (new_x, new_y) not in enemy_pieces:  # Blank connector
+                new_x += i
+                new_y += j
+            while (new_x, new_y) in pieces:
+                count += 1
+                new_x += i
+                new_y += j
+            if count >= WIN_LENGTH:
+                return 1, 0, 0
+            if count >= WIN_LENGTH - 1:
+                return 0, 1, 0
+            total_count += count * count  # Bigger counts better...
+    return 0, 0, total_count
+
+
+def default_heuristic_features(state):
+    """
+    Computes the features of the default heuristic, which is the dot product of these features with
+    DEFAULT_HEURISTIC_WEIGHTS (see the weighted_default_heuristic method).
+
+    :param state: the state to compute the features of
+    :return: the tuple of the features named by DEFAULT_HEURISTIC_FEATURES, where bigger values are better for the
+    maximizing player
+    """
+    white_four, white_three, white_count = in_a_row_features(state[0], state[1])
+    black_four, black_three, black_count = in_a_row_features(state[1], state[0])
+    return (weighted_distance_to_center_heuristic(state), white_count - black_count, white_three - black_three,
+            white_four - black_four)
+
+
+def weighted_default_heuristic(weights):
+    """
+    Returns a heuristic combining the features of the default heuristic with the given weights, e.g. weights tuned by
+    tuning.py. With DEFAULT_HEURISTIC_WEIGHTS, it is equal to the default heuristic.
+
+    :param weights: the weights of the features named by DEFAULT_HEURISTIC_FEATURES
+    :return: the heuristic function
+    """
+    weights = tuple(weights)
+
+    def heuristic(state):
+        return sum(w * f for w, f in zip(weights, default_heuristic_features(state)))
+
+    return heuristic
+
+
 def weighted_distance_to_center_heuristic(state):
     """
     Heuristic which computes a sum of weighted distances between the pieces and the center of the board, where the
@@ -101,32 +167,50 @@ def has_three_in_a_row_heuristic(state):
     white_squares = state[0]
     black_squares = state[1]
 
-    def has_three_pieces_in_a_row(pieces, enemy_pieces):
-        for (x, y) in pieces:
-            for (i, j) in ADJACENT_DIRECTIONS:
-                new_x = x + i
-                new_y = y + j
-                count = 1
-                while (new_x, new_y) in pieces:
-                    count += 1
-                    new_x += i
-                    new_y += j
-                if (new_x, new_y) not in enemy_pieces:  # Blank connector
-                    new_x += i
-                    new_y += j
-                while (new_x, new_y) in pieces:
-                    count += 1
-                    new_x += i
-                    new_y += j
-                if count >= 3:  # Bigger counts better...
-                    return 1
-        return 0
-
     white_three_in_a_row = has_three_pieces_in_a_row(white_squares, black_squares)
     black_three_in_a_row = has_three_pieces_in_a_row(black_squares, white_squares)
     return white_three_in_a_row - black_three_in_a_row
 
 
+def has_three_pieces_in_a_row(pieces, enemy_pieces):
+    """
+    Checks whether the given pieces contain three pieces in a line, possibly with a blank connector.
+
+    :param pieces: the x, y coordinates of the pieces of the player to consider
+    :param enemy_pieces: the x, y coordinates of the pieces of the other player
+    :return: 1 if the given pieces contain three pieces in a line, 0 otherwise
+    """
+    for (x, y) in pieces:
+        for (i, j) in ADJACENT_DIRECTIONS:
+            new_x = x + i
+            new_y = y + j
+            count = 1
+            while (new_x, new_y) in pieces:
+                count += 1
+                new_x += i
+                new_y += j
+            if (new_x, new_y) not in enemy_pieces:  # Blank connector
+                new_x += i
+                new_y += j
+            while (new_x, new_y) in pieces:
+                count += 1
+                new_x += i
+                new_y += j
+            if count >= WIN_LENGTH - 1:  # Bigger counts better...
+                return 1
+    return 0
+
+
+def is_threatening_state(state):
+    """
+    Returns True if any player has three pieces in a line in the given state, False otherwise.
+
+    :param state: the state to consider
+    :return: True if any player has three pieces in a line in the given state, False otherwise.
+    """
+    return bool(has_three_pieces_in_a_row(state[0], state[1]) or has_three_pieces_in_a_row(state[1], state[0]))
+
+
 def close_to_the_edge_heuristic(state):
     """
     Heuristic which computes how close to the edge the pieces are.
@@ -137,14 +221,10 @@ def close_to_the_edge_heuristic(state):
     white_squares = state[0]
     black_squares = state[1]
 
-    def cnt(x):
-        return x if x < 4 else 7 - x + 1
-
     def count_squares_on_edge(squares):
         count = 0
-        for (x, y) in squares:
-            count += cnt(x)
-            count += cnt(y)
+        for square in squares:
+            count += EDGE_CLOSENESS[square]
         return count
 
     white_count = count_squares_on_edge(white_squares)
@@ -155,11 +235,16 @@ def close_to_the_edge_heuristic(state):
 
 def win_loss_heuristic(state):
     """
-    Heuristic which simply computes if the given state is a win or loss for any player.
+    Heuristic which simply computes if the given state is a win or loss for any player. The result is cached on State
+    objects, since the win status of a node is checked both when it is searched and when its parent is evaluated.
 
     :param state: the state to compute the heuristic of
     :return: the heuristic value of the given state, where bigger values are better for the maximizing player
     """
+    win_value = getattr(state, 'win_value', None)
+    if win_value is not None:
+        return win_value
+
     white_squares = state[0]
     black_squares = state[1]
 
@@ -173,16 +258,19 @@ def win_loss_heuristic(state):
                     count += 1
                     new_x += i
                     new_y += j
-                if count >= 4:
+                if count >= WIN_LENGTH:
                     return True
         return False
 
     if is_win(black_squares):
-        return -WIN_HEURISTIC
+        win_value = -WIN_HEURISTIC
     elif is_win(white_squares):
-        return WIN_HEURISTIC
+        win_value = WIN_HEURISTIC
     else:
-        return 0
+        win_value = 0
+    if isinstance(state, State):
+        state.win_value = win_value
+    return win_value
 
 
 def manhattan_distance_to_center_heuristic(state):
@@ -218,7 +306,7 @@ def distance_between_pieces_heuristic(state):
     def distance_pieces(pieces):
         distance = 0
         for (x, y) in pieces:
-            min_dist = 7
+            min_dist = BOARD_SIZE
             for (x2, y2) in pieces:
                 if x != x2 and y != y2:
                     min_dist = min(min_dist, abs(x - x2) + abs(y - y2))
@@ -252,20 +340,17 @@ def distance_from_center_and_other_pieces_heuristic(state):
     white_pieces = state[0]
     black_pieces = state[1]
 
-    center_x = (NUM_COLS + 1) / 2
-    center_y = (NUM_ROWS + 1) / 2
-
     total_distance = 0
 
     for (x, y) in white_pieces:
         for (x2, y2) in white_pieces:
             total_distance -= abs(x - x2) + abs(y - y2)
-        total_distance -= abs(x - center_x) + abs(y - center_y)
+        total_distance -= abs(x - CENTER_X) + abs(y - CENTER_Y)
 
     for (x, y) in black_pieces:
         for (x2, y2) in black_pieces:
             total_distance += abs(x - x2) + abs(y - y2)
-        total_distance += abs(x - center_x) + abs(y - center_y)
+        total_distance += abs(x - CENTER_X) + abs(y - CENTER_Y)
 
     return total_distance
 
@@ -0,0 +1,218 @@
+import csv
+import json
+import re
+import sys
+from argparse import ArgumentParser
+
+DEPTH_LINE = re.compile(r'^(?:\[(White|Black) AI\] )?Depth (\d+), value: ([^,]+), best action: ([^,]+), '
+                        r'elapsed time: ([0-9.eE+-]+)(?: s)?, states visited: (\d+)')
+SEARCH_LINE = re.compile(r'^(Minimax|Negamax) explored (\d+) nodes to return (\S+) for a depth cutoff of (\d+) in '
+                         r'([0-9.eE+-]+) seconds')
+MOVE_LINE = re.compile(r'^(White|Black) \((AI|human|server)\) move: (\S+)')
+MOVE_NUMBER_LINE = re.compile(r'^Move number: (\d+)')
+MOVE_TIME_LINE = re.compile(r'^Move time: ([0-9.eE+-]+) s')
+COLUMNS = ('source', 'move_number', 'player', 'move', 'depth', 'value', 'nodes', 'search_time', 'move_time', 'nps',
+           'ebf', 'overrun')
+
+
+def parse_log(file_name):
+    """
+    Parses a text log of the program (e.g. logs/sample_log.txt), where each search prints one line per completed depth
+    of iterative deepening, such as 'Depth 3, value: 6, best action: 74W, elapsed time: 0.03 s, states visited: 135'.
+    The depth lines of a search are grouped until the move is played (or the next search starts), and the move time is
+    attached to the search if it is printed. The fixed-depth searches of the question logs (e.g. logs/q1.txt) print a
+    single line such as 'Negamax explored 429 nodes to return 10000 for a depth cutoff of 3 in 0.05 seconds', which is
+    parsed as a search of its own.
+
+    :param file_name: the name of the log file
+    :return: a list of searches, i.e. dictionaries with the keys 'move_number', 'player', 'move', 'move_time' (None if
+    unknown) and 'depths', the list of (depth, value, elapsed time, states visited) tuples of the search
+    """
+    searches = []
+    search = None
+    last_played = None
+    move_number = None
+    with open(file_name, 'r') as log_file:
+        for line in log_file:
+            line = line.strip()
+            match = DEPTH_LINE.match(line)
+            if match:
+                depth = int(match.group(2))
+                if search is None or search['move'] is not None or depth <= search['depths'][-1][0]:
+                    search = {'move_number': move_number, 'player': match.group(1), 'move': None, 'move_time': None,
+                              'depths': []}
+                    searches.append(search)
+                search['depths'].append((depth, parse_value(match.group(3)), float(match.group(5)),
+                                         int(match.group(6))))
+                continue
+            match = SEARCH_LINE.match(line)
+            if match:
+                search = {'move_number': move_number, 'player': None, 'move': None, 'move_time': None,
+                          'depths': [(int(match.group(4)), parse_value(match.group(3)), float(match.group(5)),
+                                      int(match.group(2)))]}
+                searches.append(search)
+                continue
+            match = MOVE_LINE.match(line)
+            if match:
+                last_played = None
+                if match.group(2) == 'AI' and search is not None and search['move'] is None:
+                    search['player'] = search['player'] or match.group(1)
+                    search['move'] = match.group(3)
+                    last_played = search
+                continue
+            match = MOVE_TIME_LINE.match(line)
+            if match:
+                if last_played is not None:
+                    last_played['move_time'] = float(match.group(1))
+                last_played = None
+                continue
+            match = MOVE_NUMBER_LINE.match(line)
+            if match:
+                move_number = int(match.group(1))
+    return searches
+
+
+def parse_value(value):
+    """
+    :return: the given value of a depth line as a number, or None if it is not a number
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_record(file_name):
+    """
+    Parses a game record (see records.py) into searches, in the format of the parse_log method. Since a game record
+    only holds the last completed depth of each search, the 'depths' of each search has a single entry.
+
+    :param file_name: the name of the record file
+    :return: the list of searches of the AI moves of the game
+    """
+    searches = []
+    with open(file_name, 'r') as record_file:
+        lines = [json.loads(line) for line in record_file if line.strip()]
+    for move_number, line in enumerate(lines[1:], 1):
+        if 'depth' in line and line['depth'] is not None:
+            searches.append({'move_number': move_number, 'player': 'White' if move_number % 2 == 1 else 'Black',
+                             'move': line['move'], 'move_time': line['time'],
+                             'depths': [(line['depth'], line['value'], line['time'], line['nodes'])]})
+    return searches
+
+
+def move_table(file_names, time_limit=None):
+    """
+    Builds a columnar table of the searches of the given logs and game records, with one row per search and the
+    columns of COLUMNS:
+    - depth: the deepest completed depth
+    - nodes: the total number of states visited over all depths
+    - search_time: the total elapsed time over all depths (the move time if it is unknown)
+    - nps: the number of states visited per second
+    - ebf: the effective branching factor, i.e. the geometric mean of the growth of the number of states visited from
+      one depth to the next (None if fewer than two depths with states visited were logged)
+    - overrun: True if the move time (or search time) exceeded the given time limit (None without time limit)
+
+    :param file_names: the names of the log files (.txt) and game records (.jsonl)
+    :param time_limit: the time limit for a move, in seconds, or None if unknown
+    :return: the table, as a dictionary of column name to list of values
+    """
+    table = {column: [] for column in COLUMNS}
+    for file_name in file_names:
+        searches = parse_record(file_name) if file_name.endswith('.jsonl') else parse_log(file_name)
+        if not searches:
+            print('Warning: no searches found in {}'.format(file_name), file=sys.stderr)
+        for search in searches:
+            depths = search['depths']
+            nodes = sum(d[3] for d in depths)
+            search_time = sum(d[2] for d in depths)
+            used_time = search['move_time'] if search['move_time'] is not None else search_time
+            counted = [d for d in depths if d[0] > 0 and d[3] > 0]
+            ebf = None
+            if len(counted) > 1 and counted[-1][0] > counted[0][0]:
+                ebf = (float(counted[-1][3]) / counted[0][3]) ** (1.0 / (counted[-1][0] - counted[0][0]))
+            row = {
+                'source': file_name,
+                'move_number': search['move_number'],
+                'player': search['player'],
+                'move': search['move'],
+                'depth': depths[-1][0],
+                'value': depths[-1][1],
+                'nodes': nodes,
+                'search_time': search_time,
+                'move_time': search['move_time'],
+                'nps': nodes / search_time if search_time > 0 else None,
+                'ebf': ebf,
+                'overrun': None if time_limit is None else used_time > time_limit,
+            }
+            for column in COLUMNS:
+                table[column].append(row[column])
+    return table
+
+
+def mean(values):
+    """
+    :return: the mean of the given values, ignoring None values, or None if there are none
+    """
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def print_summary(table, shallow_depth=None):
+    """
+    Prints a summary of the given table per source, and the moves which overran the time limit or did not reach the
+    given depth.
+
+    :param table: the table built by the move_table method
+    :param shallow_depth: the depth below which a move is reported, or None to not report shallow moves
+    """
+    rows = [dict(zip(COLUMNS, values)) for values in zip(*(table[column] for column in COLUMNS))]
+    for source in sorted(set(table['source'])):
+        source_rows = [row for row in rows if row['source'] == source]
+        print('{}: {} searches, average depth: {}, average NPS: {}, average EBF: {}, overruns: {}'.format(
+            source, len(source_rows), format_number(mean(row['depth'] for row in source_rows)),
+            format_number(mean(row['nps'] for row in source_rows)),
+            format_number(mean(row['ebf'] for row in source_rows)), sum(1 for row in source_rows if row['overrun'])))
+    search_numbers = {}
+    for row in rows:
+        search_numbers[row['source']] = search_numbers.get(row['source'], 0) + 1
+        reasons = []
+        if row['overrun']:
+            reasons.append('overran the time limit ({:.3f} s)'.format(
+                row['move_time'] if row['move_time'] is not None else row['search_time']))
+        if shallow_depth is not None and row['depth'] < shallow_depth:
+            reasons.append('only reached depth {}'.format(row['depth']))
+        if reasons:
+            label = 'search {}'.format(search_numbers[row['source']])
+            if row['move_number'] is not None:
+                label = 'move {} ({} {})'.format(row['move_number'], row['player'], row['move'])
+            print('{} {}: {}'.format(row['source'], label, ', '.join(reasons)))
+
+
+def format_number(number):
+    """
+    :return: the given number with two decimals, or 'n/a' if it is None
+    """
+    return 'n/a' if number is None else '{:.2f}'.format(number)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Parses the search logs of the program (.txt) and game records (.jsonl), and '
+                                        'computes the depth reached, NPS, effective branching factor and time limit '
+                                        'overruns of each move.')
+    parser.add_argument('files', nargs='+', help='The log files and game records.')
+    parser.add_argument('-t', '--time_limit', type=float, default=None, help='The time limit for a move, in seconds, '
+                                                                             'to detect overruns.')
+    parser.add_argument('-d', '--shallow_depth', type=int, default=None, help='Report the moves which did not reach '
+                                                                              'this depth.')
+    parser.add_argument('-o', '--output', default=None, help='A CSV file in which to write the table of the moves.')
+    args = parser.parse_args()
+
+    move_data = move_table(args.files, args.time_limit)
+    print_summary(move_data, args.shallow_depth)
+    if args.output is not None:
+        with open(args.output, 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(COLUMNS)
+            writer.writerows(zip(*(move_data[column] for column in COLUMNS)))
+        print('Wrote {} moves to {}'.format(len(move_data['source']), args.output), file=sys.stderr)
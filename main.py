@@ -1,14 +1,28 @@
-import telnetlib
+import asyncio
+import csv
+import json
+import sys
 from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import time
 
-from connect_four import file_to_state, print_state, action_str_to_tuple, actions, result, action_tuple_to_str
+from cache import BestMoveCache
+from client import GameClient, GameOver, search_move, apply_remote_move
+from connect_four import file_to_state, file_to_states, state_files, print_state, action_str_to_tuple, actions, \
+    result, action_tuple_to_str, zobrist_key, perft, str_to_geometry, get_geometry, set_geometry, REPETITION_LIMIT, \
+    WIN_LENGTH
 from heuristics import WIN_HEURISTIC, win_loss_heuristic
-from search import iterative_dfs_negamax
+from mcts import MonteCarloTreeSearch
+from records import GameRecorder
+from search import iterative_dfs_negamax_search, finite_value
 
 DEPTH_LIMIT = 100
 TIME_PER_MOVE = '19'
+ANALYSIS_FIELDS = ('file', 'index', 'side', 'best_move', 'value', 'depth', 'nodes', 'elapsed_time', 'pv')
+MOVE_TIMEOUT_MESSAGE = 'No move received from the remote player within {} s, ending the game (left unfinished in ' \
+                       'the record, if any)'
 
 
 def human_vs_ai(arguments):
@@ -21,6 +35,10 @@ def human_vs_ai(arguments):
     white_player = True
     human_player = arguments.colour == 'white'
     time_limit = float(arguments.time_limit)
+    engine = create_engine(arguments)
+    move_cache = create_move_cache(arguments)
+    recorder = start_record(arguments, state, 'human' if human_player else 'ai', 'ai' if human_player else 'human')
+    history = Counter([zobrist_key(state)])
     move_number = 1
     while True:
         print_state(state)
@@ -29,15 +47,24 @@ def human_vs_ai(arguments):
 
         start_time = time.time()
         if human_player:  # Human player
-            state = human_move(state, white_player)
+            state = human_move(state, white_player, recorder)
         else:
-            state = ai_move(state, white_player, time_limit)
+            state = ai_move(state, white_player, time_limit, recorder, engine, history, move_cache)
         print('Move time: {} s'.format(time.time() - start_time))
 
         if abs(win_loss_heuristic(state)) >= WIN_HEURISTIC:
             print_state(state)
             player = 'White' if white_player else 'Black'
             print(player + ' wins!')
+            finish_record(recorder, white_player)
+            close_ai(arguments, engine, move_cache)
+            return
+
+        if add_to_history(history, state):
+            print_state(state)
+            print('Draw by repetition!')
+            finish_record(recorder, None)
+            close_ai(arguments, engine, move_cache)
             return
 
         white_player = not white_player
@@ -53,6 +80,8 @@ def human_vs_human(arguments):
     """
     state = file_to_state(arguments.state)
     white_player = True
+    recorder = start_record(arguments, state, 'human', 'human')
+    history = Counter([zobrist_key(state)])
     move_number = 1
     while True:
         print_state(state)
@@ -60,11 +89,17 @@ def human_vs_human(arguments):
         player = 'White' if white_player else 'Black'
 
         start_time = time.time()
-        state = human_move(state, white_player)
+        state = human_move(state, white_player, recorder)
         print('Move time: {} s'.format(time.time() - start_time))
 
         if abs(win_loss_heuristic(state)) >= WIN_HEURISTIC:
             print(player + ' wins!')
+            finish_record(recorder, white_player)
+            return
+
+        if add_to_history(history, state):
+            print('Draw by repetition!')
+            finish_record(recorder, None)
             return
 
         white_player = not white_player
@@ -80,19 +115,32 @@ def ai_vs_ai(arguments):
     state = file_to_state(arguments.state)
     white_player = True
     time_limit = float(arguments.time_limit)
+    engine = create_engine(arguments)
+    move_cache = create_move_cache(arguments)
+    recorder = start_record(arguments, state, 'ai', 'ai')
+    history = Counter([zobrist_key(state)])
     move_number = 1
     while True:
         print_state(state)
         print('Move number: {}'.format(move_number))
 
         start_time = time.time()
-        state = ai_move(state, white_player, time_limit)
+        state = ai_move(state, white_player, time_limit, recorder, engine, history, move_cache)
         print('Move time: {} s'.format(time.time() - start_time))
 
         if abs(win_loss_heuristic(state)) >= WIN_HEURISTIC:
             print_state(state)
             player = 'White' if white_player else 'Black'
             print(player + ' wins!')
+            finish_record(recorder, white_player)
+            close_ai(arguments, engine, move_cache)
+            return
+
+        if add_to_history(history, state):
+            print_state(state)
+            print('Draw by repetition!')
+            finish_record(recorder, None)
+            close_ai(arguments, engine, move_cache)
             return
 
         white_player = not white_player
@@ -103,47 +151,93 @@ def ai_vs_remote(arguments):
     """
     Watch an AI vs remote game.
 
+    :param arguments: the command-line arguments
+    """
+    asyncio.run(ai_vs_remote_game(arguments))
+
+
+async def ai_vs_remote_game(arguments):
+    """
+    Play an AI vs remote game. The AI searches in an executor, so that the connection to the server is never blocked,
+    and ponders while waiting for the remote player (unless disabled, or unless the MCTS engine is used, whose tree is
+    reused between moves instead).
+
     :param arguments: the command-line arguments
     """
     state = file_to_state(arguments.state)
     player = arguments.colour
     server_turn = player == 'black'
-    tn = setup_telnet(arguments)
+    client = GameClient(arguments.host, arguments.port, arguments.game_id, arguments.colour)
+    await client.connect()
     white_player = True
     time_limit = float(arguments.time_limit)
+    transposition_table = {}
+    engine = create_engine(arguments)
+    move_cache = create_move_cache(arguments)
+    ponder_time = 0
+    recorder = start_record(arguments, state, 'remote' if server_turn else 'ai', 'ai' if server_turn else 'remote')
+    history = Counter([zobrist_key(state)])
     move_number = 1
-    while True:
-        print_state(state)
-        print('Move number: {}'.format(move_number))
-
-        start_time = time.time()
-        if server_turn:
-            state = remote_move(tn, state, white_player)
-        else:
-            state = ai_move(state, white_player, time_limit, tn)
-        print('Move time: {} s'.format(time.time() - start_time))
-
-        if abs(win_loss_heuristic(state)) >= WIN_HEURISTIC:
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pondering = None if arguments.no_ponder or engine is not None else (DEPTH_LIMIT, executor, transposition_table)
+        while True:
             print_state(state)
-            player = 'White' if white_player else 'Black'
-            print(player + ' wins!')
-            return
-
-        white_player = not white_player
-        server_turn = not server_turn
-        move_number += 1
+            print('Move number: {}'.format(move_number))
+
+            start_time = time.time()
+            try:
+                if server_turn:
+                    state, ponder_time = await apply_remote_move(client, state, white_player, arguments.move_timeout,
+                                                                 pondering, recorder)
+                else:
+                    state = await remote_ai_move(client, state, white_player,
+                                                 max(time_limit - ponder_time, time_limit / 2), executor,
+                                                 transposition_table, recorder, engine, history, move_cache)
+            except (GameOver, asyncio.TimeoutError, ConnectionError) as e:
+                end_remote_game(arguments, recorder, e)
+                close_ai(arguments, engine, move_cache)
+                client.close()
+                return
+            print('Move time: {} s'.format(time.time() - start_time))
+
+            if abs(win_loss_heuristic(state)) >= WIN_HEURISTIC:
+                print_state(state)
+                player = 'White' if white_player else 'Black'
+                print(player + ' wins!')
+                finish_record(recorder, white_player)
+                close_ai(arguments, engine, move_cache)
+                client.close()
+                return
+
+            history[zobrist_key(state)] += 1  # Draws by repetition are left to the server
+            white_player = not white_player
+            server_turn = not server_turn
+            move_number += 1
 
 
 def human_vs_remote(arguments):
     """
     Play a human vs remote game.
 
+    :param arguments: the command-line arguments
+    """
+    asyncio.run(human_vs_remote_game(arguments))
+
+
+async def human_vs_remote_game(arguments):
+    """
+    Play a human vs remote game. The human input is read in an executor, so that the connection to the server is never
+    blocked.
+
     :param arguments: the command-line arguments
     """
     state = file_to_state(arguments.state)
     white_player = True
     local_move = arguments.colour == 'white'
-    tn = setup_telnet(arguments)
+    client = GameClient(arguments.host, arguments.port, arguments.game_id, arguments.colour)
+    await client.connect()
+    loop = asyncio.get_running_loop()
+    recorder = start_record(arguments, state, 'human' if local_move else 'remote', 'remote' if local_move else 'human')
     move_number = 1
     while True:
         print_state(state)
@@ -151,15 +245,27 @@ def human_vs_remote(arguments):
         player = 'White' if white_player else 'Black'
 
         start_time = time.time()
-        if local_move:
-            state = human_move(state, white_player, tn)
-        else:
-            state = remote_move(tn, state, white_player)
+        try:
+            if local_move:
+                action = await loop.run_in_executor(None, human_action, state, white_player)
+                await client.send_move(action)
+                if recorder is not None:
+                    recorder.record(action)
+                state = result(state, action, white_player)
+            else:
+                state, _ = await apply_remote_move(client, state, white_player, arguments.move_timeout,
+                                                   recorder=recorder)
+        except (GameOver, asyncio.TimeoutError, ConnectionError) as e:
+            end_remote_game(arguments, recorder, e)
+            client.close()
+            return
         print('Move time: {} s'.format(time.time() - start_time))
 
         if abs(win_loss_heuristic(state)) >= WIN_HEURISTIC:
             print_state(state)
             print(player + ' wins!')
+            finish_record(recorder, white_player)
+            client.close()
             return
 
         white_player = not white_player
@@ -167,91 +273,298 @@ def human_vs_remote(arguments):
         move_number += 1
 
 
-def setup_telnet(arguments):
+def end_remote_game(arguments, recorder, error):
     """
-    Setup the telnet local client.
+    Report the end of a remote game which was not won on the board: a draw declared by the server (which is recorded
+    as such), a move timeout or a lost connection (which leave the record unfinished).
 
     :param arguments: the command-line arguments
-    :return: the telnet client
+    :param recorder: the GameRecorder of the game, or None
+    :param error: the GameOver, asyncio.TimeoutError or ConnectionError which ended the game
     """
-    host = arguments.host
-    port = arguments.port
-    colour = arguments.colour
-    game_id = arguments.game_id
-
-    print('Establishing connection to host {}, port {}...'.format(host, port))
-    tn = telnetlib.Telnet(host, port)
-
-    print('Sending game information (game ID: {}, colour: {})...'.format(game_id, colour))
-    tn.write('{} {}\n'.format(game_id, colour))
-
-    print('Waiting for opponent to join game with ID {}...'.format(game_id))
-    tn.read_until(game_id)
-
-    print("Starting game with ID '{}'!".format(game_id))
-    return tn
+    if isinstance(error, GameOver):
+        print('Game over: {}'.format(error))
+        finish_record(recorder, None)
+    elif isinstance(error, asyncio.TimeoutError):
+        print(MOVE_TIMEOUT_MESSAGE.format(arguments.move_timeout))
+    else:
+        print('{}, ending the game (left unfinished in the record, if any)'.format(error))
 
 
-def remote_move(tn, state, white_player):
+async def remote_ai_move(client, state, white_player, time_limit, executor, transposition_table, recorder=None,
+                         engine=None, history=None, move_cache=None):
     """
-    Wait for a move from a remote player.
+    Wait for a move from the local AI and send it to the server.
 
-    :param tn: the telnet client
+    :param client: the game client
     :param state: the current state
     :param white_player: True if it is white's turn to make a move, False otherwise
-    :return: the resulting state after applying the remote player's move
-    """
-    string_move = None
-    print('Waiting for move from remote player...')
-    while action_str_to_tuple(string_move) not in actions(state, white_player):
-        string_move = tn.read_until('\n')
-    action = action_str_to_tuple(string_move)
-    print('{} (server) move: {}'.format('White' if white_player else 'Black', string_move))
-    return result(state, action, white_player)
+    :param time_limit: the time limit for a move
+    :param executor: the executor in which to run the search
+    :param transposition_table: the transposition table shared by the searches of the game
+    :param recorder: the GameRecorder of the game, or None
+    :param engine: the MonteCarloTreeSearch of the game, or None to search with iterative deepening negamax
+    :param history: the Zobrist keys of the positions of the game, or None
+    :param move_cache: the BestMoveCache of the negamax search, or None
+    :return: the resulting state after applying the AI's move.
+    """
+    player = 'White' if white_player else 'Black'
+    search_result = await search_move(state, white_player, time_limit, DEPTH_LIMIT, executor, transposition_table,
+                                      engine, history, move_cache)
+    best_action = search_result.best_action
+    print('{} (AI) move: {}'.format(player, action_tuple_to_str(best_action)))
+    await client.send_move(best_action)
+    if recorder is not None:
+        recorder.record(best_action, search_result)
+    return result(state, best_action, white_player)
 
 
-def ai_move(state, white_player, time_limit, tn=None):
+def ai_move(state, white_player, time_limit, recorder=None, engine=None, history=None, move_cache=None):
     """
     Wait for a move from the local AI.
 
     :param state: the current state
     :param white_player: True if it is white's turn to make a move, False otherwise
     :param time_limit: the time limit for a move
-    :param tn: the telnet client. Ignored if None.
+    :param recorder: the GameRecorder of the game, or None
+    :param engine: the MonteCarloTreeSearch of the game, or None to search with iterative deepening negamax
+    :param history: the Zobrist keys of the positions of the game, which the negamax search scores as draws, or None
+    :param move_cache: the BestMoveCache of the negamax search, or None
     :return: the resulting state after applying the AI's move.
     """
     player = 'White' if white_player else 'Black'
-    best_action = iterative_dfs_negamax(state, time_limit, DEPTH_LIMIT, white_player)
+    if engine is not None:
+        search_result = engine.search(state, time_limit, white_player)
+    elif move_cache is not None:
+        search_result = move_cache.search(state, time_limit, DEPTH_LIMIT, white_player, history=history)
+    else:
+        search_result = iterative_dfs_negamax_search(state, time_limit, DEPTH_LIMIT, white_player, history=history)
+    best_action = search_result.best_action
     print('{} (AI) move: {}'.format(player, action_tuple_to_str(best_action)))
-    if tn is not None:
-        tn.write(action_tuple_to_str(best_action) + '\n')
+    if recorder is not None:
+        recorder.record(best_action, search_result)
     return result(state, best_action, white_player)
 
 
-def human_move(state, white_player, tn=None):
+def human_move(state, white_player, recorder=None):
     """
     Wait for a move from the human player.
 
     :param state: the current state
     :param white_player: True if it is white's turn to make a move, False otherwise
-    :param tn: the telnet client. Ignored if None.
+    :param recorder: the GameRecorder of the game, or None
     :return: the resulting state after applying the human's move.
     """
+    action = human_action(state, white_player)
+    if recorder is not None:
+        recorder.record(action)
+    return result(state, action, white_player)
+
+
+def human_action(state, white_player):
+    """
+    Wait for a valid action from the human player.
+
+    :param state: the current state
+    :param white_player: True if it is white's turn to make a move, False otherwise
+    :return: the action of the human player
+    """
     player = 'White' if white_player else 'Black'
-    invalid_move = True
-    while invalid_move:
-        invalid_move = False
-        move = raw_input(player + ', enter your move:\n')
+    while True:
+        move = input(player + ', enter your move:\n')
         action = action_str_to_tuple(move)
         if action not in actions(state, white_player):
             print('Invalid move.')
-            invalid_move = True
         else:
-            if tn is not None:
-                tn.write(action_tuple_to_str(action) + '\n')
             print('{} (human) move: {}'.format(player, action_tuple_to_str(action)))
-            state = result(state, action, white_player)
-    return state
+            return action
+
+
+def create_engine(arguments):
+    """
+    Create the search engine of the local AI.
+
+    :param arguments: the command-line arguments
+    :return: a MonteCarloTreeSearch, kept for the whole game so that its tree is reused between moves, or None for
+    iterative deepening negamax
+    """
+    if arguments.engine == 'mcts':
+        return MonteCarloTreeSearch(arguments.playout, arguments.processes)
+    return None
+
+
+def create_move_cache(arguments):
+    """
+    Create the best move cache of the local AI, with the moves of the cache file if it exists.
+
+    :param arguments: the command-line arguments
+    :return: a BestMoveCache, or None if no cache file was given, if it was written for another geometry or if the MCTS
+    engine is used
+    """
+    if arguments.move_cache is None or arguments.engine == 'mcts':
+        return None
+    move_cache = BestMoveCache()
+    try:
+        move_cache.load(arguments.move_cache)
+    except ValueError as e:
+        print('Best move cache disabled: {}'.format(e))
+        return None
+    print('Loaded {} cached moves from {}'.format(len(move_cache), arguments.move_cache))
+    return move_cache
+
+
+def close_ai(arguments, engine, move_cache):
+    """
+    Shut down the worker processes of the search engine of the local AI, if any, and save its best move cache, if any.
+
+    :param arguments: the command-line arguments
+    :param engine: the MonteCarloTreeSearch of the game, or None
+    :param move_cache: the BestMoveCache of the game, or None
+    """
+    if engine is not None:
+        engine.close()
+    if move_cache is not None:
+        move_cache.save(arguments.move_cache)
+        print('Best move cache: {}'.format(move_cache.stats()))
+
+
+def start_record(arguments, state, white, black):
+    """
+    Start the record of a game, if a record file was given.
+
+    :param arguments: the command-line arguments
+    :param state: the start state of the game
+    :param white: the white player ('ai', 'human' or 'remote')
+    :param black: the black player ('ai', 'human' or 'remote')
+    :return: the GameRecorder of the game, or None if the game is not recorded
+    """
+    if arguments.record is None:
+        return None
+    return GameRecorder(arguments.record, state, white, black)
+
+
+def finish_record(recorder, white_player):
+    """
+    Finish the record of a game, if it is recorded.
+
+    :param recorder: the GameRecorder of the game, or None
+    :param white_player: True if white won the game, False if black won the game, None for a draw
+    """
+    if recorder is not None:
+        recorder.finish(None if white_player is None else 'white' if white_player else 'black')
+
+
+def add_to_history(history, state):
+    """
+    Add a state to the history of a game.
+
+    :param history: the Counter of the Zobrist keys of the positions of the game
+    :param state: the state reached by the last move
+    :return: True if the state has now occurred REPETITION_LIMIT times, i.e. if the game is a draw by repetition
+    """
+    key = zobrist_key(state)
+    history[key] += 1
+    return history[key] >= REPETITION_LIMIT
+
+
+def analyse(arguments):
+    """
+    Analyse the states of the given files across a pool of processes, and stream the results as CSV or JSON lines in
+    the order of the states.
+
+    :param arguments: the command-line arguments
+    """
+    positions = [(file_name, index, state, arguments.colour)
+                 for file_name in state_files(arguments.paths)
+                 for index, state in enumerate(file_to_states(file_name))]
+    time_limit = None if arguments.time_limit is None else float(arguments.time_limit)
+    output = sys.stdout if arguments.output is None else open(arguments.output, 'w', newline='')
+    writer = None
+    if arguments.format == 'csv':
+        writer = csv.DictWriter(output, ANALYSIS_FIELDS)
+        writer.writeheader()
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=arguments.processes, initializer=set_geometry,
+                             initargs=(get_geometry(),)) as executor:
+        for analysis in executor.map(analyse_position, positions, [time_limit] * len(positions),
+                                     [arguments.depth] * len(positions)):
+            if writer is None:
+                output.write(json.dumps(analysis) + '\n')
+            else:
+                writer.writerow(dict(analysis, pv=' '.join(analysis['pv'])))
+            output.flush()
+    if output is not sys.stdout:
+        output.close()
+    print('Analysed {} states in {} s'.format(len(positions), time.time() - start_time), file=sys.stderr)
+
+
+def analyse_position(position, time_limit, depth):
+    """
+    Analyse a single state with iterative deepening negamax. Runs in a worker process.
+
+    :param position: a (file name, index in the file, state, side to move) tuple
+    :param time_limit: the time limit for the analysis, in seconds, or None to search to the given depth
+    :param depth: the last depth to search, like the depth of the bench method
+    :return: a dictionary with the fields of ANALYSIS_FIELDS, where the value is from the point of view of white
+    """
+    file_name, index, state, side = position
+    white_player = side == 'white'
+    search_result = iterative_dfs_negamax_search(state, time_limit, depth + 1, white_player, verbose=False)
+    return {
+        'file': file_name,
+        'index': index,
+        'side': side,
+        'best_move': None if search_result.best_action is None else action_tuple_to_str(search_result.best_action),
+        'value': finite_value(search_result.value),
+        'depth': search_result.depth,
+        'nodes': search_result.nodes,
+        'elapsed_time': search_result.elapsed_time,
+        'pv': [action_tuple_to_str(a) for a in search_result.principal_variation],
+    }
+
+
+def bench(arguments):
+    """
+    Measures the time taken by iterative deepening negamax to reach a fixed depth in the states of the given files, one
+    state after the other in this process. The searches have no time limit, so that no time is checked during the
+    search, and print nothing, so that the measures only depend on the algorithm. Prints the states visited and the
+    time of each depth of each search, and the totals of each depth.
+
+    :param arguments: the command-line arguments
+    """
+    totals = {}
+    for file_name in state_files(arguments.paths):
+        for index, state in enumerate(file_to_states(file_name)):
+            search_result = iterative_dfs_negamax_search(state, None, arguments.depth + 1, arguments.colour == 'white',
+                                                         verbose=False, make_unmake=arguments.make_unmake,
+                                                         mtdf=arguments.mtdf)
+            for depth, nodes, elapsed_time in search_result.iterations:
+                print('{} ({}), depth {}: {} states, {:.4f} s'.format(file_name, index, depth, nodes, elapsed_time))
+                total_nodes, total_time = totals.get(depth, (0, 0))
+                totals[depth] = (total_nodes + nodes, total_time + elapsed_time)
+    for depth, (nodes, elapsed_time) in sorted(totals.items()):
+        print('Depth {}: {} states, {:.4f} s, {:.0f} states/s'.format(depth, nodes, elapsed_time,
+                                                                      nodes / elapsed_time if elapsed_time else 0))
+
+
+def count_positions(arguments):
+    """
+    Counts the states reachable from the given state with each number of moves (see connect_four.perft), and prints the
+    count of each depth and the number of states generated per second.
+
+    :param arguments: the command-line arguments
+    """
+    start_time = time.time()
+    try:
+        counts = perft(file_to_state(arguments.state), arguments.depth, arguments.colour == 'white', arguments.unique)
+    except ValueError as e:
+        print('Cannot count the positions: {}'.format(e))
+        return
+    elapsed_time = time.time() - start_time
+    for depth, count in enumerate(counts):
+        print('Depth {}: {} states'.format(depth, count))
+    print('Generated {} states in {:.3f} s ({:.0f} states/s)'.format(sum(counts), elapsed_time,
+                                                                     sum(counts) / elapsed_time))
 
 
 if __name__ == '__main__':
@@ -266,11 +579,15 @@ if __name__ == '__main__':
         p.add_argument('-H', '--host', default=local_address, help='Server host address.')
         p.add_argument('-p', '--port', type=int, default=12345, help='Port number.')
         p.add_argument('-g', '--game_id', default='game_id', help="Game ID.")
+        p.add_argument('-T', '--move_timeout', type=float, default=None, help='The time to wait for a move from the '
+                                                                               'remote player, in seconds.')
 
 
     def add_state_argument(p):
         p.add_argument('-s', '--state', default=initial_state, help='The name of the file containing the '
                                                                     'initial state of the game.')
+        p.add_argument('-r', '--record', default=None, help='The name of the file in which to write the record of the '
+                                                            'game (see records.py).')
 
     def add_color_argument(p):
         p.add_argument('-c', '--colour', default='white', help='Your colour.')
@@ -278,10 +595,23 @@ if __name__ == '__main__':
 
     def add_local_ai_arguments(p):
         p.add_argument('-t', '--time_limit', default=TIME_PER_MOVE, help='The time limit for a move, in seconds.')
+        p.add_argument('-e', '--engine', choices=('negamax', 'mcts'), default='negamax', help='The search engine: '
+                       'iterative deepening negamax or Monte Carlo tree search.')
+        p.add_argument('-P', '--playout', choices=('guided', 'random'), default='guided', help='The playout policy of '
+                                                                                               'the MCTS engine.')
+        p.add_argument('-j', '--processes', type=int, default=1, help='The number of processes of the MCTS engine '
+                                                                      '(root-parallel search).')
+        p.add_argument('--move_cache', default=None, help='A file of cached best moves, used to answer immediately in '
+                                                          'positions already searched and updated at the end of the '
+                                                          'game.')
 
 
     parser = ArgumentParser(description='Dynamic Connect-4. To play or watch a game, use one of the positional '
                                         'arguments.')
+    parser.add_argument('-b', '--board', default='7x7', help='The size of the board, as ROWSxCOLUMNS (at most 9x9). '
+                                                             'The initial state must have the same size.')
+    parser.add_argument('-w', '--win_length', type=int, default=WIN_LENGTH, help='The number of pieces in a row '
+                                                                                 'needed to win.')
     subparsers = parser.add_subparsers()
 
     parser_hvh = subparsers.add_parser('human_vs_human', help='Play as a human versus another human.')
@@ -304,6 +634,8 @@ if __name__ == '__main__':
     add_state_argument(parser_avs)
     add_color_argument(parser_avs)
     add_local_ai_arguments(parser_avs)
+    parser_avs.add_argument('--no_ponder', action='store_true', help='Do not search while waiting for the remote '
+                                                                     'player.')
     parser_avs.set_defaults(func=ai_vs_remote)
 
     parser_hvs = subparsers.add_parser('human_vs_server', help='Play as a human versus a player on a server.')
@@ -312,10 +644,47 @@ if __name__ == '__main__':
     add_color_argument(parser_hvs)
     parser_hvs.set_defaults(func=human_vs_remote)
 
+    parser_analyse = subparsers.add_parser('analyse', help='Analyse many states in parallel and output the results as '
+                                                           'CSV or JSON lines.')
+    parser_analyse.add_argument('paths', nargs='+', help='State files, directories of state files or glob patterns '
+                                                         '(e.g. states/*.txt). A file may contain several states '
+                                                         'separated by blank lines.')
+    parser_analyse.add_argument('-c', '--colour', default='white', help='The colour to move in the states.')
+    parser_analyse.add_argument('-t', '--time_limit', default=None, help='The time limit for each state, in seconds '
+                                                                         '(none by default).')
+    parser_analyse.add_argument('-d', '--depth', type=int, default=6, help='The last depth to search, i.e. the depth '
+                                                                           'of the results unless the time limit is '
+                                                                           'reached first.')
+    parser_analyse.add_argument('-j', '--processes', type=int, default=None, help='The number of processes (the '
+                                                                                   'number of CPUs by default).')
+    parser_analyse.add_argument('-f', '--format', choices=('csv', 'json'), default='csv', help='The output format.')
+    parser_analyse.add_argument('-o', '--output', default=None, help='The output file (standard output by default).')
+    parser_analyse.set_defaults(func=analyse)
+
+    parser_bench = subparsers.add_parser('bench', help='Measure the time taken to search states to a fixed depth.')
+    parser_bench.add_argument('paths', nargs='*', default=[initial_state], help='State files, directories of state '
+                                                                               'files or glob patterns.')
+    parser_bench.add_argument('-c', '--colour', default='white', help='The colour to move in the states.')
+    parser_bench.add_argument('-d', '--depth', type=int, default=6, help='The last depth to search.')
+    parser_bench.add_argument('-u', '--make_unmake', action='store_true', help='Search mutable boards instead of '
+                                                                               'states.')
+    parser_bench.add_argument('--mtdf', action='store_true', help='Search each depth with MTD(f).')
+    parser_bench.set_defaults(func=bench)
+
+    parser_perft = subparsers.add_parser('perft', help='Count the states reachable with each number of moves.')
+    parser_perft.add_argument('-s', '--state', default=initial_state, help='The name of the file containing the start '
+                                                                           'state.')
+    parser_perft.add_argument('-c', '--colour', default='white', help='The colour to move first.')
+    parser_perft.add_argument('-d', '--depth', type=int, default=5, help='The number of moves.')
+    parser_perft.add_argument('-u', '--unique', action='store_true', help='Count each distinct position once per '
+                                                                          'depth.')
+    parser_perft.set_defaults(func=count_positions)
+
     # args = parser.parse_args('human_vs_human'.split())
     # args = parser.parse_args('human_vs_ai'.split())
     # args = parser.parse_args('ai_vs_ai'.split())
     # args = parser.parse_args('ai_vs_server'.split())
     # args = parser.parse_args('human_vs_server'.split())
     args = parser.parse_args()
+    set_geometry(str_to_geometry(args.board, args.win_length))
     args.func(args)
@@ -0,0 +1,422 @@
+import math
+import random
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from connect_four import actions, result, winning_actions, blocking_actions, str_to_state, state_to_str, \
+    file_to_states, state_files, action_tuple_to_str, zobrist_key, get_geometry, set_geometry, \
+    str_to_geometry, REPETITION_LIMIT, WIN_LENGTH
+from heuristics import win_loss_heuristic, is_winning_state
+from search import SearchResult, iterative_dfs_negamax_search
+
+EXPLORATION = math.sqrt(2)  # UCT exploration constant
+MAX_PLAYOUT_LENGTH = 100  # Number of moves after which a playout is a draw
+PARALLEL_OVERHEAD = 0.05  # Time, in seconds, kept by the worker processes to return their statistics in time
+DEPTH_LIMIT = 100
+
+WHITE_WIN = 1.0
+BLACK_WIN = 0.0
+DRAW = 0.5
+
+RANDOM_PLAYOUT = 'random'
+GUIDED_PLAYOUT = 'guided'
+
+
+def outcome(state, white_player):
+    """
+    Returns the outcome of the given state if the game is over, i.e. if a player has four in a row or if the player to
+    move has no action.
+
+    :param state: the state to consider
+    :param white_player: True if white is to move in the given state, False otherwise
+    :return: WHITE_WIN, BLACK_WIN or DRAW if the game is over, None otherwise
+    """
+    win_value = win_loss_heuristic(state)
+    if win_value > 0:
+        return WHITE_WIN
+    if win_value < 0:
+        return BLACK_WIN
+    if not actions(state, white_player):
+        return DRAW
+    return None
+
+
+def random_playout(state, white_player, rng, max_length=MAX_PLAYOUT_LENGTH):
+    """
+    Plays uniformly random moves from the given state until the game is over.
+
+    :param state: the state to play from, which is not over
+    :param white_player: True if white is to move in the given state, False otherwise
+    :param rng: the random number generator
+    :param max_length: the number of moves after which the playout is a draw
+    :return: the outcome of the playout (WHITE_WIN, BLACK_WIN or DRAW)
+    """
+    for _ in range(max_length):
+        available_actions = actions(state, white_player)
+        if not available_actions:
+            return DRAW
+        state = result(state, rng.choice(available_actions), white_player)
+        if is_winning_state(state):
+            return WHITE_WIN if white_player else BLACK_WIN
+        white_player = not white_player
+    return DRAW
+
+
+def guided_playout(state, white_player, rng, max_length=MAX_PLAYOUT_LENGTH):
+    """
+    Plays moves guided by the threats of the game from the given state until the game is over: a player always
+    completes four in a row when possible, otherwise blocks an immediate win of the opponent when possible, and
+    otherwise plays a random move.
+
+    :param state: the state to play from, which is not over
+    :param white_player: True if white is to move in the given state, False otherwise
+    :param rng: the random number generator
+    :param max_length: the number of moves after which the playout is a draw
+    :return: the outcome of the playout (WHITE_WIN, BLACK_WIN or DRAW)
+    """
+    for _ in range(max_length):
+        if winning_actions(state, white_player):
+            return WHITE_WIN if white_player else BLACK_WIN
+        available_actions = blocking_actions(state, white_player) or actions(state, white_player)
+        if not available_actions:
+            return DRAW
+        state = result(state, rng.choice(available_actions), white_player)
+        white_player = not white_player
+    return DRAW
+
+
+PLAYOUTS = {
+    RANDOM_PLAYOUT: random_playout,
+    GUIDED_PLAYOUT: guided_playout,
+}
+
+
+class Node(object):
+    """
+    A node of the search tree. The wins of a node are counted from the point of view of the player who moved into it,
+    so that a parent selects its children by their win rates for its own player.
+    """
+    __slots__ = ('state', 'white_player', 'action', 'parent', 'children', 'untried_actions', 'outcome', 'visits',
+                 'wins')
+
+    def __init__(self, state, white_player, action=None, parent=None):
+        """
+        :param state: the state of the node
+        :param white_player: True if white is to move in the state, False otherwise
+        :param action: the action leading from the parent to the node, or None for the root
+        :param parent: the parent node, or None for the root
+        """
+        self.state = state
+        self.white_player = white_player
+        self.action = action
+        self.parent = parent
+        self.children = []
+        self.outcome = outcome(state, white_player)
+        self.untried_actions = [] if self.outcome is not None else actions(state, white_player)
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self, exploration):
+        """
+        :return: the child maximizing the UCT (upper confidence bound applied to trees) value
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits +
+                   exploration * math.sqrt(log_visits / child.visits))
+
+    def most_visited_child(self):
+        """
+        :return: the most visited child, or None if the node has no children
+        """
+        return max(self.children, key=lambda child: child.visits) if self.children else None
+
+
+class MonteCarloTreeSearch(object):
+    """
+    Monte Carlo tree search with the UCT selection policy. The tree is kept between searches, so that the subtree of
+    the state reached after the moves of both players is reused by the next search of the game. With more than one
+    process, the search is root-parallel: each worker process searches an independent tree from the root for the same
+    time, and the visits and wins of the root actions of all the trees are summed to pick the best action. Only the tree
+    of the main process is reused between searches.
+    """
+
+    def __init__(self, playout=GUIDED_PLAYOUT, processes=1, exploration=EXPLORATION, seed=None, verbose=True):
+        """
+        :param playout: the playout policy (RANDOM_PLAYOUT or GUIDED_PLAYOUT)
+        :param processes: the number of processes searching in parallel, including the main process
+        :param exploration: the exploration constant of the UCT value
+        :param seed: the seed of the random number generator, or None
+        :param verbose: True to print the progress of the searches, False otherwise
+        """
+        self.playout = playout
+        self.processes = processes
+        self.exploration = exploration
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.root = None
+        self.executor = None
+
+    def search(self, state, time_limit, white_player):
+        """
+        Searches for the best action from the given state.
+
+        :param state: the current state
+        :param time_limit: the time limit for the search
+        :param white_player: True if the current player is white, False otherwise
+        :return: a SearchResult, where the value is the win rate of the best action from the point of view of white
+        (between 0 and 1), the depth is the maximum depth of the tree and the nodes are the number of playouts
+        """
+        start_time = time.time()
+        player = 'White' if white_player else 'Black'
+        root = self.reuse_tree(state, white_player)
+        reused_playouts = root.visits
+        if root.outcome is not None:
+            return SearchResult(None, root.outcome, 0, 0, time.time() - start_time, [])
+        if self.verbose:
+            print('[{} AI] Thinking of a move ({} playouts reused)...'.format(player, reused_playouts))
+        futures = []
+        if self.processes > 1:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.processes - 1, initializer=set_geometry,
+                                                    initargs=(get_geometry(),))
+            futures = [self.executor.submit(root_statistics, state_to_str(state), white_player,
+                                            time_limit - PARALLEL_OVERHEAD, self.playout, self.exploration,
+                                            self.rng.getrandbits(32))
+                       for _ in range(self.processes - 1)]
+        playouts, depth = self.run(root, time_limit, start_time)
+        statistics = {child.action: [child.visits, child.wins] for child in root.children}
+        for future in futures:
+            worker_statistics, worker_playouts, worker_depth = future.result()
+            for action, (visits, wins) in worker_statistics.items():
+                action_statistics = statistics.setdefault(action, [0, 0.0])
+                action_statistics[0] += visits
+                action_statistics[1] += wins
+            playouts += worker_playouts
+            depth = max(depth, worker_depth)
+        self.root = root
+
+        best_action = max(statistics, key=lambda a: statistics[a][0])
+        visits, wins = statistics[best_action]
+        win_rate = wins / visits
+        value = win_rate if white_player else 1 - win_rate
+        variation = [best_action]
+        # The best action may only have been expanded by the workers, in which case the variation stops there
+        node = next((child for child in root.children if child.action == best_action), None)
+        node = None if node is None else node.most_visited_child()
+        while node is not None:
+            variation.append(node.action)
+            node = node.most_visited_child()
+        elapsed_time = time.time() - start_time
+        if self.verbose:
+            print('[{} AI] Playouts: {}, win rate: {:.3f}, best action: {}, depth: {}, elapsed time: {} s'.format(
+                player, playouts, win_rate, action_tuple_to_str(best_action), depth, str(elapsed_time)[:4]))
+        return SearchResult(best_action, value, depth, playouts, elapsed_time, variation)
+
+    def reuse_tree(self, state, white_player):
+        """
+        Finds the node of the given state in the tree of the previous search (its root, a child or a grandchild), which
+        becomes the new root. A new tree is started if the state is not found.
+
+        :return: the root of the tree for the given state
+        """
+        if self.root is not None:
+            candidates = [self.root] + self.root.children + [grandchild for child in self.root.children
+                                                              for grandchild in child.children]
+            for node in candidates:
+                if node.white_player == white_player and node.state == state:
+                    node.parent = None
+                    return node
+        return Node(state, white_player)
+
+    def run(self, root, time_limit, start_time):
+        """
+        Runs the iterations of the search (selection, expansion, playout and backpropagation) until the time limit.
+
+        :param root: the root of the tree
+        :param time_limit: the time limit for the search
+        :param start_time: the start time of the search
+        :return: a (number of playouts, maximum depth reached) tuple
+        """
+        playout = PLAYOUTS[self.playout]
+        rng = self.rng
+        exploration = self.exploration
+        playouts = 0
+        max_depth = 0
+        while playouts == 0 or time.time() - start_time < time_limit:
+            node = root
+            depth = 0
+            while not node.untried_actions and node.children:
+                node = node.select_child(exploration)
+                depth += 1
+            if node.untried_actions:
+                action = node.untried_actions.pop(rng.randrange(len(node.untried_actions)))
+                child = Node(result(node.state, action, node.white_player), not node.white_player, action, node)
+                node.children.append(child)
+                node = child
+                depth += 1
+            game_outcome = node.outcome
+            if game_outcome is None:
+                game_outcome = playout(node.state, node.white_player, rng)
+            while node is not None:
+                node.visits += 1
+                node.wins += 1 - game_outcome if node.white_player else game_outcome
+                node = node.parent
+            playouts += 1
+            max_depth = max(max_depth, depth)
+        return playouts, max_depth
+
+    def close(self):
+        """
+        Shuts down the worker processes, if any.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def root_statistics(string_state, white_player, time_limit, playout, exploration, seed):
+    """
+    Searches an independent tree from the given state, for root-parallel search. Runs in a worker process.
+
+    :return: a (statistics, number of playouts, maximum depth reached) tuple, where statistics is a dictionary of root
+    action to (visits, wins)
+    """
+    tree_search = MonteCarloTreeSearch(playout, exploration=exploration, seed=seed, verbose=False)
+    root = Node(str_to_state(string_state), white_player)
+    playouts, depth = tree_search.run(root, time_limit, time.time())
+    return {child.action: (child.visits, child.wins) for child in root.children}, playouts, depth
+
+
+def compare(states, time_limit, white_player, processes=1, playout=GUIDED_PLAYOUT):
+    """
+    Compares the best actions found by MCTS and by iterative deepening negamax (alpha-beta) with the same time limit
+    for each of the given states.
+
+    :param states: the (name, state) tuples of the states
+    :param time_limit: the time limit for each search, in seconds
+    :param white_player: True if white is to move in the states, False otherwise
+    :param processes: the number of processes of MCTS
+    :param playout: the playout policy of MCTS
+    :return: the number of states for which both searches found the same action
+    """
+    tree_search = MonteCarloTreeSearch(playout, processes, verbose=False)
+    agreements = 0
+    for name, state in states:
+        negamax_result = iterative_dfs_negamax_search(state, time_limit, DEPTH_LIMIT, white_player, verbose=False)
+        tree_search.root = None
+        mcts_result = tree_search.search(state, time_limit, white_player)
+        agreements += negamax_result.best_action == mcts_result.best_action
+        print('{}: negamax {} (value: {}, depth: {}, states visited: {}), MCTS {} (win rate for white: {:.3f}, '
+              'playouts: {})'.format(name, format_action(negamax_result.best_action), negamax_result.value,
+                                     negamax_result.depth, negamax_result.nodes,
+                                     format_action(mcts_result.best_action), mcts_result.value, mcts_result.nodes))
+    tree_search.close()
+    print('Same action for {} / {} states'.format(agreements, len(states)))
+    return agreements
+
+
+def match(start_states, time_limit, max_moves, processes=1, playout=GUIDED_PLAYOUT):
+    """
+    Plays a match between MCTS and iterative deepening negamax (alpha-beta) with the same time limit per move. Each
+    start state is played twice, once with each colour.
+
+    :param start_states: the start states of the games
+    :param time_limit: the time limit for a move, in seconds
+    :param max_moves: the number of moves after which a game is a draw
+    :param processes: the number of processes of MCTS
+    :param playout: the playout policy of MCTS
+    :return: the score of MCTS, i.e. the number of wins plus half the number of draws
+    """
+    score = 0
+    games = 0
+    for state in start_states:
+        for mcts_white in (True, False):
+            tree_search = MonteCarloTreeSearch(playout, processes, verbose=False)
+            game_outcome = play_match_game(state, tree_search, mcts_white, time_limit, max_moves)
+            tree_search.close()
+            mcts_score = game_outcome if mcts_white else 1 - game_outcome
+            score += mcts_score
+            games += 1
+            print('Game {} (MCTS {}): {}'.format(games, 'white' if mcts_white else 'black',
+                                                 {1: 'MCTS wins', 0: 'negamax wins'}.get(mcts_score, 'draw')))
+    print('MCTS score: {} / {}'.format(score, games))
+    return score
+
+
+def play_match_game(state, tree_search, mcts_white, time_limit, max_moves):
+    """
+    Plays a game between MCTS and iterative deepening negamax. The game is a draw once a position occurred
+    REPETITION_LIMIT times.
+
+    :return: the outcome of the game (WHITE_WIN, BLACK_WIN or DRAW)
+    """
+    history = Counter([zobrist_key(state)])
+    white_player = True
+    for _ in range(max_moves):
+        if not actions(state, white_player):
+            return DRAW
+        if white_player == mcts_white:
+            action = tree_search.search(state, time_limit, white_player).best_action
+        else:
+            action = iterative_dfs_negamax_search(state, time_limit, DEPTH_LIMIT, white_player, verbose=False,
+                                                  history=history).best_action
+            action = action or actions(state, white_player)[0]
+        state = result(state, action, white_player)
+        if is_winning_state(state):
+            return WHITE_WIN if white_player else BLACK_WIN
+        history[zobrist_key(state)] += 1
+        if history[zobrist_key(state)] >= REPETITION_LIMIT:
+            return DRAW
+        white_player = not white_player
+    return DRAW
+
+
+def format_action(action):
+    """
+    :return: the string representation of the given action, or 'none' if it is None
+    """
+    return 'none' if action is None else action_tuple_to_str(action)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Compares Monte Carlo tree search with iterative deepening negamax '
+                                        '(alpha-beta) for the same time limit on a suite of states.')
+    parser.add_argument('-b', '--board', default='7x7', help='The size of the board, as ROWSxCOLUMNS (at most 9x9).')
+    parser.add_argument('-w', '--win_length', type=int, default=WIN_LENGTH, help='The number of pieces in a row '
+                                                                                 'needed to win.')
+    subparsers = parser.add_subparsers()
+
+    def compare_command(arguments):
+        named_states = [('{} #{}'.format(file_name, index), state) for file_name in state_files(arguments.states)
+                        for index, state in enumerate(file_to_states(file_name))]
+        compare(named_states, arguments.time_limit, arguments.colour == 'white', arguments.processes,
+                arguments.playout)
+
+    def match_command(arguments):
+        start_states = [state for file_name in state_files(arguments.states) for state in file_to_states(file_name)]
+        match(start_states, arguments.time_limit, arguments.max_moves, arguments.processes, arguments.playout)
+
+    def add_engine_arguments(p):
+        p.add_argument('-s', '--states', nargs='+', default=['states'], help='State files, directories of state files '
+                                                                              'or glob patterns.')
+        p.add_argument('-t', '--time_limit', type=float, default=1, help='The time limit for a move, in seconds.')
+        p.add_argument('-j', '--processes', type=int, default=1, help='The number of processes of MCTS.')
+        p.add_argument('-P', '--playout', choices=(GUIDED_PLAYOUT, RANDOM_PLAYOUT), default=GUIDED_PLAYOUT,
+                       help='The playout policy of MCTS.')
+
+    parser_compare = subparsers.add_parser('compare', help='Compare the best actions of both searches for each state.')
+    add_engine_arguments(parser_compare)
+    parser_compare.add_argument('-c', '--colour', default='white', help='The colour to move in the states.')
+    parser_compare.set_defaults(func=compare_command)
+
+    parser_match = subparsers.add_parser('match', help='Play a match between both searches from each state.')
+    add_engine_arguments(parser_match)
+    parser_match.add_argument('-m', '--max_moves', type=int, default=100, help='The number of moves after which a '
+                                                                               'game is a draw.')
+    parser_match.set_defaults(func=match_command)
+
+    args = parser.parse_args()
+    set_geometry(str_to_geometry(args.board, args.win_length))
+    args.func(args)
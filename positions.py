@@ -0,0 +1,235 @@
+import mmap
+import os
+import struct
+from argparse import ArgumentParser
+
+from connect_four import get_geometry, file_to_states, state_files, state_to_str, state_to_masks, \
+    masks_to_state
+
+MAGIC = b'DC4P'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBB')  # Magic, version, number of rows, number of columns, flags
+RECORD = struct.Struct('<QQ')  # White mask (with the side bit), black mask
+LABELLED_RECORD = struct.Struct('<QQd')  # White mask (with the side bit), black mask, label
+LABELLED = 1  # Flag of the files whose records have a label
+SIDE_BIT = 1 << 63  # Bit of the white mask which is set if white is to move
+MAX_SQUARES = 63  # Number of squares whose bits fit in the white word with the side bit
+
+
+def pack_position(state, white_player):
+    """
+    Packs the given position into the two words of a record.
+
+    :param state: the state
+    :param white_player: True if white is to move, False otherwise
+    :return: a (white mask with the side bit, black mask) tuple
+    """
+    white_mask, black_mask = state_to_masks(state)
+    return (white_mask | SIDE_BIT if white_player else white_mask), black_mask
+
+
+def unpack_position(white_word, black_word):
+    """
+    Unpacks the two words of a record into a position.
+
+    :param white_word: the white mask with the side bit
+    :param black_word: the black mask
+    :return: a (state, white player) tuple
+    """
+    return masks_to_state(white_word & ~SIDE_BIT, black_word), bool(white_word & SIDE_BIT)
+
+
+class PositionWriter(object):
+    """
+    Writes positions to a binary position file, one fixed-size record at a time, so that any number of positions can be
+    written with bounded memory. A position file starts with a header (see HEADER) followed by one record per position,
+    holding the occupancy masks of the white and black pieces (see the connect_four.state_to_masks method), the side to
+    move and optionally a label (e.g. a search value).
+    """
+
+    def __init__(self, file_name, labelled=False):
+        """
+        :param file_name: the name of the position file to create
+        :param labelled: True if the positions have a label, False otherwise
+        """
+        geometry = get_geometry()
+        if geometry.num_rows * geometry.num_cols > MAX_SQUARES:
+            raise ValueError('Position files only hold boards of at most {} squares'.format(MAX_SQUARES))
+        self.labelled = labelled
+        self.record = LABELLED_RECORD if labelled else RECORD
+        self.file = open(file_name, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, geometry.num_rows, geometry.num_cols,
+                                    LABELLED if labelled else 0))
+        self.count = 0
+
+    def write(self, state, white_player, label=None):
+        """
+        Writes a position.
+
+        :param state: the state
+        :param white_player: True if white is to move, False otherwise
+        :param label: the label of the position, if the file is labelled
+        """
+        if self.labelled:
+            self.file.write(self.record.pack(*(pack_position(state, white_player) + (label,))))
+        else:
+            self.file.write(self.record.pack(*pack_position(state, white_player)))
+        self.count += 1
+
+    def write_record(self, white_word, black_word, label=None):
+        """
+        Writes a position which is already packed (see the pack_position method), e.g. a raw record of another file.
+
+        :param white_word: the white mask with the side bit
+        :param black_word: the black mask
+        :param label: the label of the position, if the file is labelled
+        """
+        if self.labelled:
+            self.file.write(self.record.pack(white_word, black_word, label))
+        else:
+            self.file.write(self.record.pack(white_word, black_word))
+        self.count += 1
+
+    def close(self):
+        """
+        Closes the position file.
+        """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PositionFile(object):
+    """
+    Reads a binary position file (see PositionWriter) through a memory map, so that positions are only unpacked when
+    they are accessed. Positions are (state, white player) tuples, or (state, white player, label) tuples if the file
+    is labelled.
+    """
+
+    def __init__(self, file_name):
+        """
+        :param file_name: the name of the position file
+        """
+        self.file = open(file_name, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(file_name) else b''
+        if len(self.data) < HEADER.size:
+            raise ValueError('{} is not a position file'.format(file_name))
+        magic, version, rows, cols, flags = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a position file of version {}'.format(file_name, VERSION))
+        geometry = get_geometry()
+        if (rows, cols) != (geometry.num_rows, geometry.num_cols):
+            raise ValueError('{} holds positions of a {}x{} board'.format(file_name, rows, cols))
+        self.labelled = bool(flags & LABELLED)
+        self.record = LABELLED_RECORD if self.labelled else RECORD
+
+    def __len__(self):
+        return (len(self.data) - HEADER.size) // self.record.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError('Position index out of range')
+        return self.unpack(self.record.unpack_from(self.data, HEADER.size + index * self.record.size))
+
+    def __iter__(self):
+        for words in self.records():
+            yield self.unpack(words)
+
+    def unpack(self, words):
+        """
+        :param words: the unpacked words of a record
+        :return: the position of the record
+        """
+        position = unpack_position(words[0], words[1])
+        return position + (words[2],) if self.labelled else position
+
+    def records(self):
+        """
+        :return: an iterator over the raw records, i.e. (white word, black word) or (white word, black word, label)
+        tuples, which is much faster than unpacking the positions
+        """
+        end = HEADER.size + len(self) * self.record.size
+        return self.record.iter_unpack(memoryview(self.data)[HEADER.size:end])
+
+    def to_numpy(self):
+        """
+        Returns the records as a memory-mapped NumPy structured array with the fields 'white' (with the side bit),
+        'black' and, if the file is labelled, 'label'. Requires NumPy.
+
+        :return: the NumPy array of the records
+        """
+        import numpy as np
+        fields = [('white', '<u8'), ('black', '<u8')] + ([('label', '<f8')] if self.labelled else [])
+        return np.frombuffer(self.data, dtype=np.dtype(fields), count=len(self), offset=HEADER.size)
+
+    def close(self):
+        """
+        Closes the position file.
+        """
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def text_to_positions(paths, file_name, white_player=True):
+    """
+    Converts the states of the given text files (in the format of the connect_four.file_to_states method) to a binary
+    position file.
+
+    :param paths: the state files, directories of state files or glob patterns (see the connect_four.state_files method)
+    :param file_name: the name of the position file to create
+    :param white_player: True if white is to move in the states, False otherwise
+    :return: the number of positions written
+    """
+    with PositionWriter(file_name) as writer:
+        for state_file in state_files(paths):
+            for state in file_to_states(state_file):
+                writer.write(state, white_player)
+        return writer.count
+
+
+def positions_to_text(file_name, text_file_name):
+    """
+    Converts a binary position file to a text file holding its states separated by blank lines (see the
+    connect_four.file_to_states method). The side to move and the labels are not kept.
+
+    :param file_name: the name of the position file
+    :param text_file_name: the name of the text file to create
+    :return: the number of states written
+    """
+    with PositionFile(file_name) as positions, open(text_file_name, 'w') as text_file:
+        text_file.write('\n\n'.join(state_to_str(position[0]) for position in positions))
+        text_file.write('\n')
+        return len(positions)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Converts Dynamic Connect-4 states between the text format and the binary '
+                                        'position format.')
+    subparsers = parser.add_subparsers()
+
+    parser_pack = subparsers.add_parser('pack', help='Convert text state files to a binary position file.')
+    parser_pack.add_argument('paths', nargs='+', help='State files, directories of state files or glob patterns.')
+    parser_pack.add_argument('-o', '--output', required=True, help='The position file to create.')
+    parser_pack.add_argument('-c', '--colour', default='white', help='The colour to move in the states.')
+    parser_pack.set_defaults(func=lambda a: print('Wrote {} positions to {}'.format(
+        text_to_positions(a.paths, a.output, a.colour == 'white'), a.output)))
+
+    parser_unpack = subparsers.add_parser('unpack', help='Convert a binary position file to a text state file.')
+    parser_unpack.add_argument('file', help='The position file.')
+    parser_unpack.add_argument('-o', '--output', required=True, help='The text file to create.')
+    parser_unpack.set_defaults(func=lambda a: print('Wrote {} states to {}'.format(
+        positions_to_text(a.file, a.output), a.output)))
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,163 @@
+import json
+import time
+from argparse import ArgumentParser
+from collections import namedtuple
+
+from connect_four import Geometry, get_geometry, set_geometry, str_to_state, state_to_str, action_str_to_tuple, \
+    action_tuple_to_str, actions, result, print_state
+from positions import PositionWriter
+from search import finite_value
+
+GameRecord = namedtuple('GameRecord', ('players', 'states', 'moves', 'winner'))
+
+
+class GameRecorder(object):
+    """
+    Writes the record of a game as JSON lines: a header with the start state, the players and the geometry of the board
+    (number of rows and columns, and win length), one line per move (the
+    move, its time and, for AI moves, the depth, value and number of states visited of the search) and a line with the
+    winner once the game is over. Each line is written as soon as it is known, so the record of an interrupted game can
+    still be replayed.
+    """
+
+    def __init__(self, file_name, state, white='ai', black='ai'):
+        """
+        :param file_name: the name of the record file to create
+        :param state: the start state of the game
+        :param white: the white player ('ai', 'human' or 'remote')
+        :param black: the black player ('ai', 'human' or 'remote')
+        """
+        geometry = get_geometry()
+        self.file = open(file_name, 'w')
+        self.write({'start': state_to_str(state), 'white': white, 'black': black,
+                    'geometry': [geometry.num_rows, geometry.num_cols, geometry.win_length]})
+        self.last_move_time = time.time()
+
+    def write(self, line):
+        """
+        Writes the given line of the record.
+
+        :param line: the line, as a dictionary
+        """
+        self.file.write(json.dumps(line) + '\n')
+        self.file.flush()
+
+    def record(self, action, search_result=None):
+        """
+        Records a move, whose time is the time elapsed since the previous move (or the start of the game).
+
+        :param action: the action of the move
+        :param search_result: the SearchResult of the search which found the move, or None if it was not searched
+        """
+        move_time = time.time() - self.last_move_time
+        line = {'move': action_tuple_to_str(action), 'time': move_time}
+        if search_result is not None:
+            line.update(depth=search_result.depth, value=finite_value(search_result.value), nodes=search_result.nodes)
+        self.write(line)
+        self.last_move_time = time.time()
+
+    def finish(self, winner):
+        """
+        Records the winner and closes the record.
+
+        :param winner: the colour of the winner ('white' or 'black'), or None for a draw
+        """
+        self.write({'winner': winner})
+        self.file.close()
+
+
+def record_geometry(file_name):
+    """
+    Returns the geometry of the board of a game record, i.e. the default geometry for the records written before the
+    geometry was recorded.
+
+    :param file_name: the name of the record file
+    :return: the geometry
+    """
+    with open(file_name, 'r') as record_file:
+        header = json.loads(record_file.readline())
+    return Geometry(*header['geometry']) if 'geometry' in header else Geometry()
+
+
+def replay(file_name):
+    """
+    Reads a game record and reconstructs all the states of the game by applying its moves, without searching.
+
+    :param file_name: the name of the record file
+    :return: a GameRecord, holding the players, the states of the game (from the start state to the last state), the
+    moves (the dictionaries of the record, with the actions as tuples) and the winner (None if the game was a draw or
+    was interrupted)
+    :raises ValueError: if the game was played on another geometry than the one in use (see record_geometry)
+    """
+    geometry = get_geometry()
+    file_geometry = record_geometry(file_name)
+    if (file_geometry.num_rows, file_geometry.num_cols, file_geometry.win_length) != \
+            (geometry.num_rows, geometry.num_cols, geometry.win_length):
+        raise ValueError('{} is the record of a game on a {}x{} board with a win length of {}'.format(
+            file_name, file_geometry.num_rows, file_geometry.num_cols, file_geometry.win_length))
+    with open(file_name, 'r') as record_file:
+        lines = [json.loads(line) for line in record_file if line.strip()]
+    header = lines[0]
+    states = [str_to_state(header['start'])]
+    moves = []
+    winner = None
+    white_player = True
+    for line in lines[1:]:
+        if 'winner' in line:
+            winner = line['winner']
+            break
+        action = action_str_to_tuple(line['move'])
+        if action not in actions(states[-1], white_player):
+            raise ValueError('Invalid move {} in {}'.format(line['move'], file_name))
+        moves.append(dict(line, move=action))
+        states.append(result(states[-1], action, white_player))
+        white_player = not white_player
+    return GameRecord((header['white'], header['black']), states, moves, winner)
+
+
+def print_record(game_record, show_states=False):
+    """
+    Prints the moves of the given game record and a summary of the move times of each player.
+
+    :param game_record: the GameRecord to print
+    :param show_states: True to print the state after each move, False otherwise
+    """
+    if show_states:
+        print_state(game_record.states[0])
+    for i, move in enumerate(game_record.moves):
+        colour = 'White' if i % 2 == 0 else 'Black'
+        details = ''
+        if 'depth' in move:
+            details = ', depth: {}, value: {}, states visited: {}'.format(move['depth'], move['value'], move['nodes'])
+        print('{}. {} ({}) move: {}, time: {:.3f} s{}'.format(
+            i + 1, colour, game_record.players[i % 2], action_tuple_to_str(move['move']), move['time'], details))
+        if show_states:
+            print_state(game_record.states[i + 1])
+    for i, colour in enumerate(('White', 'Black')):
+        times = [move['time'] for move in game_record.moves[i::2]]
+        if times:
+            print('{} ({}): {} moves, average move time: {:.3f} s, maximum move time: {:.3f} s'.format(
+                colour, game_record.players[i], len(times), sum(times) / len(times), max(times)))
+    print('Winner: {}'.format(game_record.winner or 'none'))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Replays Dynamic Connect-4 game records.')
+    parser.add_argument('records', nargs='+', help='The game record files.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print the state after each move.')
+    parser.add_argument('-o', '--output', default=None, help='A binary position file in which to write all the states '
+                                                             'of the games (see positions.py).')
+    args = parser.parse_args()
+    set_geometry(record_geometry(args.records[0]))  # The records must all be of the same geometry
+
+    writer = None if args.output is None else PositionWriter(args.output)
+    for record_file_name in args.records:
+        print('Game record: {}'.format(record_file_name))
+        record = replay(record_file_name)
+        print_record(record, args.verbose)
+        if writer is not None:
+            for move_number, record_state in enumerate(record.states):
+                writer.write(record_state, move_number % 2 == 0)
+    if writer is not None:
+        writer.close()
+        print('Wrote {} positions to {}'.format(writer.count, args.output))
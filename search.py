@@ -1,8 +1,11 @@
 import random
 import time
+from collections import namedtuple
 
-from connect_four import actions_and_successors, action_tuple_to_str
-from heuristics import default_heuristic, is_winning_heuristic, WIN_HEURISTIC, win_loss_heuristic
+from connect_four import State, Board, actions, actions_and_successors, action_tuple_to_str, winning_actions, \
+    blocking_actions, result, zobrist_key
+from heuristics import default_heuristic, is_winning_heuristic, WIN_HEURISTIC, win_loss_heuristic, \
+    is_threatening_state
 
 INF = float("inf")
 
@@ -14,6 +17,111 @@ EXACT = 0
 LOWER_BOUND = -1
 UPPER_BOUND = 1
 
+LMR_FULL_DEPTH_MOVES = 3  # Number of moves searched to full depth before late move reductions apply
+LMR_MIN_DEPTH = 3  # Minimum remaining depth at which late move reductions apply
+LMR_REDUCTION = 1  # Depth reduction for late moves
+
+NULL_MOVE_MIN_DEPTH = 3  # Minimum remaining depth at which null move pruning applies
+NULL_MOVE_REDUCTION = 2  # Depth reduction for the null move search
+NULL_MOVE = 'null_move'  # Paired with the states searched below null moves in the keys of the transposition table
+NULL_MOVE_KEY = 0x9e3779b97f4a7c15  # XORed with the Zobrist keys of the boards searched below null moves
+DRAW_VALUE = 0  # Value of a repeated position
+
+# Result of an iterative deepening search, where value is given from the point of view of white (None if no depth was
+# completed), principal_variation is the list of actions expected to be played from the root, iterations holds the
+# (depth, nodes, elapsed time) tuples of the completed depths and path_dependent is True if the value of the last
+# completed depth depends on the history of the game (see the SearchHistory class)
+SearchResult = namedtuple('SearchResult', ('best_action', 'value', 'depth', 'nodes', 'elapsed_time',
+                                           'principal_variation', 'iterations', 'path_dependent'),
+                          defaults=((), False))
+
+
+def finite_value(value):
+    """
+    Returns the given search value with the infinite values (of the searches which reach a state where the player to
+    move has no action) replaced by wins or losses, e.g. to write it as JSON, which has no infinity.
+
+    :param value: the value, or None
+    :return: the value clamped to [-WIN_HEURISTIC, WIN_HEURISTIC] if it is infinite, the value otherwise
+    """
+    if value in (INF, -INF):
+        return WIN_HEURISTIC if value > 0 else -WIN_HEURISTIC
+    return value
+
+
+class NodeCounter(object):
+    """
+    Counter of the states explored by a single search, which can be passed as the count argument of the negamax and
+    board_negamax methods instead of True. Contrary to the counter attribute of these methods, which is shared by all
+    the searches of the process, it is only incremented by the search it is passed to, so that concurrent searches
+    (e.g. in the worker threads of service.py) count their own states.
+    """
+    __slots__ = ('nodes',)
+
+    def __init__(self):
+        self.nodes = 0
+
+
+class SearchHistory(set):
+    """
+    Set of the Zobrist keys of the positions reached before the current node, in the game and on the current search
+    path, which counts the repetition cutoffs of the searches it is passed to (see the negamax method). The value of a
+    repeated position is a draw only because of the path that led to it, so a value computed while a cutoff happened
+    below a node depends on the path too, and is not stored in the transposition table as a usable value: the node is
+    stored with a depth of 0, which keeps its best action for move ordering and the principal variation but never
+    causes a cutoff. Otherwise the draw would be replayed under another history, or by another search sharing the
+    table (e.g. the pondering of client.py, which searches without history).
+    """
+
+    def __init__(self, keys=()):
+        """
+        :param keys: the initial keys
+        """
+        super(SearchHistory, self).__init__(keys)
+        self.cutoffs = 0
+
+
+class NullMoveTable(object):
+    """
+    View of a transposition table used by the searches below null moves, which stores the states under
+    (state, NULL_MOVE) keys, since passing flips the side to move of every state below. The entries are kept in the
+    transposition table itself, so that its size counts them (the board_negamax method XORs NULL_MOVE_KEY with the keys
+    of the boards instead).
+    """
+    __slots__ = ('table',)
+
+    def __init__(self, table):
+        """
+        :param table: the transposition table
+        """
+        self.table = table
+
+    def __contains__(self, state):
+        return (state, NULL_MOVE) in self.table
+
+    def __getitem__(self, state):
+        return self.table[(state, NULL_MOVE)]
+
+    def __setitem__(self, state, entry):
+        self.table[(state, NULL_MOVE)] = entry
+
+
+def evaluate(state, heuristic):
+    """
+    Returns the heuristic value of the given state, reusing the value cached on the state if it was already computed
+    with the same heuristic (e.g. when sorting successors, and again when the successor is searched at depth 0).
+
+    :param state: the state to evaluate
+    :param heuristic: the heuristic to apply
+    :return: the heuristic value of the given state
+    """
+    if isinstance(state, State):
+        if state.heuristic is not heuristic:
+            state.heuristic_value = heuristic(state)
+            state.heuristic = heuristic
+        return state.heuristic_value
+    return heuristic(state)
+
 
 def minimax(state, depth, transposition_table, white_player, count=False):
     """
@@ -112,7 +220,8 @@ def alphabeta(state, depth, transposition_table, time_limit, start_time, alpha,
 
 
 def negamax(state, depth, alpha, beta, transposition_table, time_limit, start_time, color, count=False,
-            order=SORTED_BY_HEURISTIC_ORDER, heuristic=default_heuristic):
+            order=SORTED_BY_HEURISTIC_ORDER, heuristic=default_heuristic, lmr=False, null_move=False,
+            quiescence_depth=0, history=None):
     """
     Implementation of the negamax search algorithm, which is a flavour of alpha-beta search. Inspired from
     https://en.wikipedia.org/wiki/Negamax. This is the final alpha-beta algorithm used by the program.
@@ -121,67 +230,127 @@ def negamax(state, depth, alpha, beta, transposition_table, time_limit, start_ti
     :param depth: the depth cut-off
     :param alpha: the alpha value
     :param beta: the beta value
-    :param transposition_table: the transposition table
-    :param time_limit: the time limit for the search
+    :param transposition_table: the transposition table, mapping states to (value, flag, depth, best action) tuples
+    :param time_limit: the time limit for the search, or None to search to the depth cut-off without checking the time
     :param start_time: the time at which the search was started
     :param color: 1 if the current player is white, -1 otherwise
     :param count: True to keep count of the number of times it is called (i.e. the number of states explored), False
-    otherwise. If this is set, the "counter" method reference should be set to zero before calling this method.
+    otherwise. If this is set, the "counter" method reference should be set to zero before calling this method. A
+    NodeCounter can be passed instead, to count the states of this search only.
     :param order: the order in which successors should be sorted before being explored. If set to SORTED_ORDER,
-    successors will be sorted by the best heuristic value for the current player. If set to RANDOM_ORDER, the
-    successors will be arranged randomly. Otherwise, no ordering is imposed.
+    successors will be sorted by the best heuristic value for the current player, after the best action stored in the
+    transposition table by a previous search of the state (so that iterative deepening searches the principal
+    variation of the previous depth first). If set to RANDOM_ORDER, the successors will be arranged randomly.
+    Otherwise, no ordering is imposed.
     :param heuristic: the heuristic to apply
+    :param lmr: True to apply late move reductions, i.e. to search the moves ordered after the first
+    LMR_FULL_DEPTH_MOVES with a reduced depth and a null window, re-searching them at full depth if they fail high
+    :param null_move: True to apply null move pruning, i.e. to let the opponent move twice with a reduced depth and
+    prune the node if the current player is still above beta (and a reduced search of the node confirms it)
+    :param quiescence_depth: the maximum depth of the quiescence search applied at the depth cut-off (0 to disable it)
+    :param history: the SearchHistory of the positions reached before the current state, in the game and on the
+    current search path, or None to ignore repetitions. A repeated position is a draw and is not searched further.
+    The keys of the states being searched are added to the set and removed once they are searched. Nodes whose value
+    depends on a repetition are stored in the transposition table with a depth of 0 (see the SearchHistory class).
+    Repetitions are ignored below null moves, since passing changes the player to move in the repeated positions.
     :return: an (action, value) tuple, where action is the best action available to the current player and value is the
     best value
     """
-    if count:
+    if count is True:
         negamax.counter += 1
+    elif count:
+        count.nodes += 1
 
     # Win condition
     win_h = win_loss_heuristic(state)
     if is_winning_heuristic(win_h):
         return None, color * win_h
 
+    # Repetition
+    key = None
+    if history is not None:
+        key = zobrist_key(state)
+        if key in history:
+            history.cutoffs += 1
+            return None, DRAW_VALUE
+
     if depth == 0:
-        return None, color * heuristic(state)
+        if quiescence_depth:
+            return None, quiescence(state, quiescence_depth, alpha, beta, color, count, heuristic)
+        return None, color * evaluate(state, heuristic)
 
     # Time limit check
-    if time.time() - start_time >= time_limit:
+    if time_limit is not None and time.time() - start_time >= time_limit:
         return None, None
 
     alpha_orig = alpha
 
     # Check transposition table
+    tt_action = None
     if state in transposition_table:
         tt_entry = transposition_table[state]
+        tt_action = tt_entry[3]
         if tt_entry[2] >= depth:
             val = tt_entry[0]
             flag = tt_entry[1]
             if flag == EXACT:
-                return None, val
+                return tt_entry[3], val
             elif flag == LOWER_BOUND:
                 alpha = max(alpha, val)
             elif flag == UPPER_BOUND:
                 beta = min(beta, val)
             if alpha >= beta:
-                return None, val
+                return tt_entry[3], val
+
+    # Null move pruning. Passing flips the side to move of every state below, so their keys are paired with NULL_MOVE.
+    if null_move and depth >= NULL_MOVE_MIN_DEPTH and not is_winning_heuristic(beta) and \
+            not is_threatening_state(state):
+        _, v = negamax(state, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, NullMoveTable(transposition_table),
+                       time_limit, start_time, -color, count, order, heuristic, lmr, False, quiescence_depth)
+        if v is not None and -v >= beta:
+            # Verify with a reduced search of the actual moves, since passing is better than any move in zugzwang
+            # positions (e.g. when every piece of the current player is blocking a line of the opponent)
+            _, v = negamax(state, depth - NULL_MOVE_REDUCTION, alpha, beta, transposition_table, time_limit,
+                           start_time, color, count, order, heuristic, lmr, False, quiescence_depth, history)
+            if v is not None and v >= beta:
+                return None, v
+        if v is None:
+            return None, None
 
     # Ordering
     white_player = color == 1
     actions_successors = actions_and_successors(state, white_player)
     if order == SORTED_BY_HEURISTIC_ORDER:
-        actions_successors.sort(key=lambda act_succ: heuristic(act_succ[1]), reverse=white_player)
+        actions_successors.sort(key=lambda act_succ: evaluate(act_succ[1], heuristic), reverse=white_player)
+        if tt_action is not None:
+            # The best action of a previous search (e.g. the principal variation of the previous depth) goes first
+            for i, (action, _) in enumerate(actions_successors):
+                if action == tt_action:
+                    actions_successors.insert(0, actions_successors.pop(i))
+                    break
     elif order == RANDOM_ORDER:
         random.shuffle(actions_successors)
 
     # Visit children
     best_value = -INF
     best_action = None
-    for action, child in actions_successors:
-        _, v = negamax(child, depth - 1, -beta, -alpha, transposition_table, time_limit, start_time, -color, count,
-                       order, heuristic)
+    cutoffs = 0
+    if key is not None:
+        cutoffs = history.cutoffs
+        history.add(key)
+    for i, (action, child) in enumerate(actions_successors):
+        full_search = True
+        if lmr and i >= LMR_FULL_DEPTH_MOVES and depth >= LMR_MIN_DEPTH and is_safe_to_reduce(child, alpha, beta):
+            _, v = negamax(child, depth - 1 - LMR_REDUCTION, -alpha - 1, -alpha, transposition_table, time_limit,
+                           start_time, -color, count, order, heuristic, lmr, null_move, quiescence_depth, history)
+            full_search = v is not None and -v > alpha  # Re-search on fail high
+        if full_search:
+            _, v = negamax(child, depth - 1, -beta, -alpha, transposition_table, time_limit, start_time, -color, count,
+                           order, heuristic, lmr, null_move, quiescence_depth, history)
         if v is None:
             # Time limit reached at lower level
+            if key is not None:
+                history.discard(key)
             return None, None
         v = -v
         if v > best_value:
@@ -190,6 +359,8 @@ def negamax(state, depth, alpha, beta, transposition_table, time_limit, start_ti
         alpha = max(alpha, v)
         if alpha >= beta:
             break
+    if key is not None:
+        history.discard(key)
 
     # Save to transposition table
     flag = EXACT
@@ -197,49 +368,432 @@ def negamax(state, depth, alpha, beta, transposition_table, time_limit, start_ti
         flag = UPPER_BOUND
     elif best_value >= beta:
         flag = LOWER_BOUND
-    transposition_table[state] = (best_value, flag, depth)
+    path_dependent = key is not None and history.cutoffs > cutoffs
+    transposition_table[state] = (best_value, flag, 0 if path_dependent else depth, best_action)
 
     return best_action, best_value
 
 
-def iterative_dfs_negamax(state, time_limit, depth_limit, white_player, heuristic=default_heuristic):
+def quiescence(state, depth, alpha, beta, color, count=False, heuristic=default_heuristic):
+    """
+    Quiescence search applied at the depth cut-off of negamax, which avoids evaluating states where a player is about to
+    complete four in a row. Only moves completing four in a row or blocking the opponent from completing four in a row
+    are extended, so that horizon blunders are avoided while quiet states are evaluated with the heuristic directly.
+
+    :param state: the current state
+    :param depth: the maximum depth of the quiescence search
+    :param alpha: the alpha value
+    :param beta: the beta value
+    :param color: 1 if the current player is white, -1 otherwise
+    :param count: True to add the states explored to the counter of the negamax method, a NodeCounter to add them to
+    this counter, False otherwise
+    :param heuristic: the heuristic to apply
+    :return: the best value for the current player
+    """
+    win_h = win_loss_heuristic(state)
+    if is_winning_heuristic(win_h):
+        return color * win_h
+
+    white_player = color == 1
+    if winning_actions(state, white_player):
+        return WIN_HEURISTIC  # The current player completes four in a row with its next move
+
+    if depth == 0 or not winning_actions(state, not white_player):
+        return color * evaluate(state, heuristic)  # Quiet state, or maximum quiescence depth reached
+
+    # The current player must block all the winning moves of the opponent
+    best_value = -WIN_HEURISTIC
+    for action in blocking_actions(state, white_player):
+        child = result(state, action, white_player)
+        if winning_actions(child, not white_player):
+            continue
+        if count is True:
+            negamax.counter += 1
+        elif count:
+            count.nodes += 1
+        v = -quiescence(child, depth - 1, -beta, -alpha, -color, count, heuristic)
+        best_value = max(best_value, v)
+        alpha = max(alpha, v)
+        if alpha >= beta:
+            break
+    return best_value
+
+
+def board_negamax(board, depth, alpha, beta, transposition_table, time_limit, start_time, color, count=False,
+                  order=SORTED_BY_HEURISTIC_ORDER, heuristic=default_heuristic, lmr=False, null_move=False,
+                  quiescence_depth=0, history=None):
+    """
+    Implementation of the negamax search algorithm on a mutable board, equivalent to the negamax method. Successors are
+    never constructed: actions are applied to the board with Board.make and reverted with Board.unmake, and the
+    transposition table is keyed by the Zobrist key of the board.
+
+    :param board: the current board, which is left unchanged when the search returns
+    :param depth: the depth cut-off
+    :param alpha: the alpha value
+    :param beta: the beta value
+    :param transposition_table: the transposition table
+    :param time_limit: the time limit for the search, or None for no time limit
+    :param start_time: the time at which the search was started
+    :param color: 1 if the current player is white, -1 otherwise
+    :param count: True to keep count of the number of times it is called (i.e. the number of states explored), False
+    otherwise. If this is set, the "counter" method reference should be set to zero before calling this method. A
+    NodeCounter can be passed instead (see the negamax method).
+    :param order: the order in which successors should be explored (see the negamax method)
+    :param heuristic: the heuristic to apply
+    :param lmr: True to apply late move reductions
+    :param null_move: True to apply null move pruning
+    :param quiescence_depth: the maximum depth of the quiescence search applied at the depth cut-off (0 to disable it)
+    :param history: the SearchHistory of the positions reached before the current board, or None to ignore
+    repetitions (see the negamax method)
+    :return: an (action, value) tuple, where action is the best action available to the current player and value is the
+    best value
+    """
+    if count is True:
+        board_negamax.counter += 1
+    elif count:
+        count.nodes += 1
+
+    # Win condition
+    win_h = win_loss_heuristic(board)
+    if is_winning_heuristic(win_h):
+        return None, color * win_h
+
+    # Repetition
+    key = board.key if history is not None else None
+    if key is not None and key in history:
+        history.cutoffs += 1
+        return None, DRAW_VALUE
+
+    if depth == 0:
+        if quiescence_depth:
+            return None, board_quiescence(board, quiescence_depth, alpha, beta, color, count, heuristic)
+        return None, color * heuristic(board)
+
+    # Time limit check
+    if time_limit is not None and time.time() - start_time >= time_limit:
+        return None, None
+
+    alpha_orig = alpha
+
+    # Check transposition table
+    tt_entry = transposition_table.get(board.key)
+    tt_action = None if tt_entry is None else tt_entry[3]
+    if tt_entry is not None and tt_entry[2] >= depth:
+        val = tt_entry[0]
+        flag = tt_entry[1]
+        if flag == EXACT:
+            return tt_entry[3], val
+        elif flag == LOWER_BOUND:
+            alpha = max(alpha, val)
+        elif flag == UPPER_BOUND:
+            beta = min(beta, val)
+        if alpha >= beta:
+            return tt_entry[3], val
+
+    # Null move pruning. Passing flips the side to move of every board below, so their keys are offset.
+    if null_move and depth >= NULL_MOVE_MIN_DEPTH and not is_winning_heuristic(beta) and \
+            not is_threatening_state(board):
+        board.key ^= NULL_MOVE_KEY
+        _, v = board_negamax(board, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, transposition_table, time_limit,
+                             start_time, -color, count, order, heuristic, lmr, False, quiescence_depth)
+        board.key ^= NULL_MOVE_KEY
+        if v is not None and -v >= beta:
+            _, v = board_negamax(board, depth - NULL_MOVE_REDUCTION, alpha, beta, transposition_table, time_limit,
+                                 start_time, color, count, order, heuristic, lmr, False, quiescence_depth, history)
+            if v is not None and v >= beta:
+                return None, v
+        if v is None:
+            return None, None
+
+    # Ordering
+    white_player = color == 1
+    board_actions = actions(board, white_player)
+    if order == SORTED_BY_HEURISTIC_ORDER:
+        values = []
+        for action in board_actions:
+            board.make(action, white_player)
+            values.append(heuristic(board))
+            board.unmake(action, white_player)
+        board_actions = [action for _, action in sorted(zip(values, board_actions),
+                                                        key=lambda value_action: value_action[0], reverse=white_player)]
+        if tt_action in board_actions:
+            board_actions.remove(tt_action)
+            board_actions.insert(0, tt_action)
+    elif order == RANDOM_ORDER:
+        random.shuffle(board_actions)
+
+    # Visit children
+    best_value = -INF
+    best_action = None
+    cutoffs = 0
+    if key is not None:
+        cutoffs = history.cutoffs
+        history.add(key)
+    for i, action in enumerate(board_actions):
+        board.make(action, white_player)
+        full_search = True
+        if lmr and i >= LMR_FULL_DEPTH_MOVES and depth >= LMR_MIN_DEPTH and is_safe_to_reduce(board, alpha, beta):
+            _, v = board_negamax(board, depth - 1 - LMR_REDUCTION, -alpha - 1, -alpha, transposition_table, time_limit,
+                                 start_time, -color, count, order, heuristic, lmr, null_move, quiescence_depth,
+                                 history)
+            full_search = v is not None and -v > alpha  # Re-search on fail high
+        if full_search:
+            _, v = board_negamax(board, depth - 1, -beta, -alpha, transposition_table, time_limit, start_time, -color,
+                                 count, order, heuristic, lmr, null_move, quiescence_depth, history)
+        board.unmake(action, white_player)
+        if v is None:
+            # Time limit reached at lower level
+            if key is not None:
+                history.discard(key)
+            return None, None
+        v = -v
+        if v > best_value:
+            best_value = v
+            best_action = action
+        alpha = max(alpha, v)
+        if alpha >= beta:
+            break
+    if key is not None:
+        history.discard(key)
+
+    # Save to transposition table
+    flag = EXACT
+    if best_value <= alpha_orig:
+        flag = UPPER_BOUND
+    elif best_value >= beta:
+        flag = LOWER_BOUND
+    path_dependent = key is not None and history.cutoffs > cutoffs
+    transposition_table[board.key] = (best_value, flag, 0 if path_dependent else depth, best_action)
+
+    return best_action, best_value
+
+
+def board_quiescence(board, depth, alpha, beta, color, count=False, heuristic=default_heuristic):
+    """
+    Quiescence search on a mutable board, equivalent to the quiescence method.
+
+    :param board: the current board, which is left unchanged when the search returns
+    :param depth: the maximum depth of the quiescence search
+    :param alpha: the alpha value
+    :param beta: the beta value
+    :param color: 1 if the current player is white, -1 otherwise
+    :param count: True to add the states explored to the counter of the board_negamax method, a NodeCounter to add
+    them to this counter, False otherwise
+    :param heuristic: the heuristic to apply
+    :return: the best value for the current player
+    """
+    win_h = win_loss_heuristic(board)
+    if is_winning_heuristic(win_h):
+        return color * win_h
+
+    white_player = color == 1
+    if winning_actions(board, white_player):
+        return WIN_HEURISTIC
+
+    if depth == 0 or not winning_actions(board, not white_player):
+        return color * heuristic(board)
+
+    best_value = -WIN_HEURISTIC
+    for action in blocking_actions(board, white_player):
+        board.make(action, white_player)
+        if not winning_actions(board, not white_player):
+            if count is True:
+                board_negamax.counter += 1
+            elif count:
+                count.nodes += 1
+            v = -board_quiescence(board, depth - 1, -beta, -alpha, -color, count, heuristic)
+            best_value = max(best_value, v)
+            alpha = max(alpha, v)
+        board.unmake(action, white_player)
+        if alpha >= beta:
+            break
+    return best_value
+
+
+def is_safe_to_reduce(child, alpha, beta):
+    """
+    Returns True if the search of the given child can be reduced, i.e. if neither the search window nor the child are
+    close to a win for any player.
+
+    :param child: the child state to search
+    :param alpha: the alpha value of the parent
+    :param beta: the beta value of the parent
+    :return: True if the search of the given child can be reduced, False otherwise
+    """
+    return not is_winning_heuristic(alpha) and not is_winning_heuristic(beta) and \
+        not is_winning_heuristic(win_loss_heuristic(child)) and not is_threatening_state(child)
+
+
+def iterative_dfs_negamax(state, time_limit, depth_limit, white_player, heuristic=default_heuristic, lmr=False,
+                          null_move=False, quiescence_depth=0, make_unmake=False, transposition_table=None,
+                          verbose=True, mtdf=False, history=None):
     """
     Applies iterative deepening search with the negamax search algorithm.
 
     :param state: the current state
-    :param time_limit: the time limit for the search
+    :param time_limit: the time limit for the search, or None to search every depth up to depth_limit - 1 whatever the
+    time it takes, without any time check in the search (e.g. to benchmark the time taken to reach a depth)
     :param depth_limit: the maximum depth to search to
     :param white_player: True if the current player is white, False otherwise
     :param heuristic: the heuristic to apply
+    :param lmr: True to apply late move reductions
+    :param null_move: True to apply null move pruning
+    :param quiescence_depth: the maximum depth of the quiescence search (0 to disable it)
+    :param make_unmake: True to search a mutable board with the board_negamax method, False to search states with the
+    negamax method
+    :param transposition_table: the transposition table to use, e.g. to reuse the results of previous searches of the
+    same game. A new table is used if None.
+    :param verbose: True to print the progress of the search, False otherwise
+    :param mtdf: True to search each depth with the MTD(f) driver (see the mtdf_search method), starting from the value
+    of the previous depth, False to search each depth with a full window
+    :param history: the Zobrist keys of the positions reached earlier in the game (any iterable, e.g. a set or a
+    Counter), which are scored as draws when the search reaches them again, or None to ignore repetitions. The key of
+    the current state is ignored, but the search still scores a return to the current state as a draw. Note that a
+    position always repeats with the same player to move (each piece of a player must make an even number of moves to
+    return to the same squares), so the keys do not include the player to move.
     :return: the best action for the current player
     """
+    return iterative_dfs_negamax_search(state, time_limit, depth_limit, white_player, heuristic, lmr, null_move,
+                                        quiescence_depth, make_unmake, transposition_table, verbose,
+                                        mtdf, history).best_action
+
+
+def iterative_dfs_negamax_search(state, time_limit, depth_limit, white_player, heuristic=default_heuristic, lmr=False,
+                                 null_move=False, quiescence_depth=0, make_unmake=False, transposition_table=None,
+                                 verbose=True, mtdf=False, history=None):
+    """
+    Applies iterative deepening search with the negamax search algorithm (see the iterative_dfs_negamax method), and
+    returns the details of the search.
+
+    :return: a SearchResult of the last completed depth
+    """
     start_time = time.time()
-    transposition_table = {}
+    if transposition_table is None:
+        transposition_table = {}
     last_best_action = None
-    last_time = 0
+    last_value = None
+    last_depth = None
+    last_principal_variation = []
+    iterations = []
+    total_nodes = 0
     player = 'White' if white_player else 'Black'
-    print('[{} AI] Thinking of a move...'.format(player))
+    search = board_negamax if make_unmake else negamax
+    root = Board(state) if make_unmake else state
+    path_dependent = False
+    if history is not None:
+        history = SearchHistory(history)
+        history.discard(zobrist_key(state))
+    if verbose:
+        print('[{} AI] Thinking of a move...'.format(player))
     for d in range(depth_limit):
         t = time.time()
-        negamax.counter = 0
-        best_action, v = negamax(state, d, -INF, INF, transposition_table, time_limit, start_time,
-                                 1 if white_player else -1, count=True,
-                                 heuristic=heuristic)
+        counter = NodeCounter()
+        cutoffs = 0 if history is None else history.cutoffs
+        if mtdf:
+            first_guess = None if last_value is None else last_value if white_player else -last_value
+            best_action, v = mtdf_search(search, root, d, first_guess, transposition_table, time_limit, start_time,
+                                         1 if white_player else -1, counter, heuristic=heuristic, lmr=lmr,
+                                         null_move=null_move, quiescence_depth=quiescence_depth, history=history)
+        else:
+            best_action, v = search(root, d, -INF, INF, transposition_table, time_limit, start_time,
+                                    1 if white_player else -1, count=counter,
+                                    heuristic=heuristic, lmr=lmr, null_move=null_move,
+                                    quiescence_depth=quiescence_depth, history=history)
+        total_nodes += counter.nodes
         if v is None:  # Incomplete search
-            return last_best_action
+            break
         root_value = v if white_player else -v
         elapsed_time = time.time() - t
-        print('[{} AI] Depth {}, value: {}, best action: {}, elapsed time: {} s, states visited: {}'
-              .format(player, d, root_value, action_tuple_to_str(best_action), str(elapsed_time)[:4], negamax.counter))
+        iterations.append((d, counter.nodes, elapsed_time))
+        last_principal_variation = principal_variation(state, white_player, transposition_table, d, make_unmake)
+        if verbose:
+            print('[{} AI] Depth {}, value: {}, best action: {}, elapsed time: {} s, states visited: {}, '
+                  'principal variation: {}'
+                  .format(player, d, root_value, action_tuple_to_str(best_action), str(elapsed_time)[:4],
+                          counter.nodes, ' '.join(action_tuple_to_str(a) for a in last_principal_variation)))
 
-        if elapsed_time > last_time:
+        if best_action is not None:
             last_best_action = best_action
-        last_time = elapsed_time
+        last_value = root_value
+        last_depth = d
+        path_dependent = history is not None and history.cutoffs > cutoffs
         if white_player and root_value >= WIN_HEURISTIC or not white_player and root_value <= -WIN_HEURISTIC:
-            print('[AI] Win found for {} player with move {}'.format(
-                player,
-                action_tuple_to_str(best_action)))
-            return best_action
-        if time.time() - start_time >= time_limit:
-            return last_best_action
-    return last_best_action
+            if verbose:
+                print('[AI] Win found for {} player with move {}'.format(
+                    player,
+                    action_tuple_to_str(best_action)))
+            break
+        if time_limit is not None and time.time() - start_time >= time_limit:
+            break
+    return SearchResult(last_best_action, last_value, last_depth, total_nodes, time.time() - start_time,
+                        last_principal_variation, iterations, path_dependent)
+
+
+def mtdf_search(search, state, depth, first_guess, transposition_table, time_limit, start_time, color, count=True,
+                **options):
+    """
+    MTD(f) driver, which converges on the negamax value of the given state with a sequence of zero-window searches,
+    each of which only tells whether the value is above or below its window. The bounds found by the previous searches
+    are kept in the transposition table, so that the later searches mostly follow the same lines. Note that the windows
+    have a width of 1, i.e. the heuristic values are assumed to be integers (searches with fractional values still
+    converge, with more re-searches).
+
+    :param search: the search method (negamax or board_negamax)
+    :param state: the current state (or board, for the board_negamax method)
+    :param depth: the depth cut-off
+    :param first_guess: the expected value, from the point of view of the current player (e.g. the value of the
+    previous depth of iterative deepening), or None to start from 0
+    :param transposition_table: the transposition table
+    :param time_limit: the time limit for the search, or None for no time limit
+    :param start_time: the time at which the search was started
+    :param color: 1 if the current player is white, -1 otherwise
+    :param count: the count argument of the searches (see the negamax method)
+    :param options: the other keyword arguments of the search method (e.g. heuristic, lmr or quiescence_depth)
+    :return: an (action, value) tuple as returned by the search method, where both are None if the time limit was
+    reached
+    """
+    guess = 0 if first_guess is None or first_guess in (INF, -INF) else first_guess
+    lower_bound = -INF
+    upper_bound = INF
+    action = None
+    fail_high_action = None
+    while lower_bound < upper_bound:
+        beta = guess + 1 if guess == lower_bound else guess
+        action, guess = search(state, depth, beta - 1, beta, transposition_table, time_limit, start_time, color,
+                               count=count, **options)
+        if guess is None:
+            return None, None
+        if guess < beta:
+            upper_bound = guess
+        else:
+            lower_bound = guess
+            fail_high_action = action  # Proven to reach the lower bound, unlike the best action of a fail low
+    return fail_high_action or action, guess
+
+
+def principal_variation(state, white_player, transposition_table, max_length, make_unmake=False):
+    """
+    Returns the principal variation from the given state, by following the best actions stored in the transposition
+    table.
+
+    :param state: the root state of the search
+    :param white_player: True if the player to move at the root is white, False otherwise
+    :param transposition_table: the transposition table filled by the search
+    :param max_length: the maximum number of actions of the principal variation
+    :param make_unmake: True if the transposition table is keyed by Zobrist keys (see the board_negamax method), False
+    if it is keyed by states
+    :return: the list of actions of the principal variation
+    """
+    variation = []
+    seen = set()
+    while len(variation) < max_length and state not in seen:
+        seen.add(state)
+        tt_entry = transposition_table.get(zobrist_key(state) if make_unmake else state)
+        if tt_entry is None or tt_entry[3] not in actions(state, white_player):
+            break
+        variation.append(tt_entry[3])
+        state = result(state, tt_entry[3], white_player)
+        if is_winning_heuristic(win_loss_heuristic(state)):
+            break
+        white_player = not white_player
+    return variation
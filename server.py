@@ -0,0 +1,290 @@
+import asyncio
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from collections import Counter
+
+from connect_four import file_to_state, action_str_to_tuple, action_tuple_to_str, actions, result, zobrist_key, \
+    str_to_geometry, get_geometry, set_geometry, REPETITION_LIMIT, WIN_LENGTH
+from client import DRAW_LINE
+from heuristics import is_winning_state
+
+COLOURS = ('white', 'black')
+
+
+class Game(object):
+    """
+    A game hosted by the server, which keeps track of the state of the game to validate the moves it relays and to
+    detect the end of the game (a win, or a draw once a position occurred REPETITION_LIMIT times or after the maximum
+    number of moves), and which logs the time taken by each move.
+    """
+
+    def __init__(self, game_id, state, log_dir=None, max_moves=None):
+        """
+        :param game_id: the game ID
+        :param state: the initial state of the game
+        :param log_dir: the directory in which to write the timing log of the game, or None to disable it
+        :param max_moves: the number of moves after which the game is a draw, or None for no limit
+        """
+        self.game_id = game_id
+        self.max_moves = max_moves
+        self.state = state
+        self.history = Counter([zobrist_key(state)])
+        self.white_player = True
+        self.players = {}
+        self.started = False
+        self.finished = False
+        self.move_number = 1
+        self.last_move_time = None
+        self.move_times = []
+        self.log_file = None
+        if log_dir is not None:
+            self.log_file = open(os.path.join(log_dir, '{}.csv'.format(game_id)), 'w')
+            self.log_file.write('move_number,colour,move,move_time\n')
+
+    def join(self, colour, writer):
+        """
+        Adds a player to the game. Once both players have joined, the game ID is sent to both of them, which starts the
+        game. A player who joins again after losing its connection only receives the game ID.
+
+        :param colour: the colour of the player
+        :param writer: the stream writer of the player
+        """
+        self.players[colour] = writer
+        if self.started:
+            writer.write((self.game_id + '\n').encode())
+        elif len(self.players) == len(COLOURS):
+            self.started = True
+            self.last_move_time = time.time()
+            for player_writer in self.players.values():
+                player_writer.write((self.game_id + '\n').encode())
+
+    def play(self, colour, line):
+        """
+        Relays the move of the given player to the opponent, if it is a valid move.
+
+        :param colour: the colour of the player who sent the move
+        :param line: the line sent by the player
+        :return: True if the move was relayed, False otherwise
+        """
+        action = action_str_to_tuple(line.strip())
+        player_colour = COLOURS[0] if self.white_player else COLOURS[1]
+        if not self.started or colour != player_colour or action not in actions(self.state, self.white_player):
+            print('[{}] Ignored line from {}: {!r}'.format(self.game_id, colour, line))
+            return False
+
+        move_time = time.time() - self.last_move_time
+        self.move_times.append(move_time)
+        if self.log_file is not None:
+            self.log_file.write('{},{},{},{}\n'.format(self.move_number, colour, action_tuple_to_str(action),
+                                                       move_time))
+            self.log_file.flush()
+
+        self.state = result(self.state, action, self.white_player)
+        key = zobrist_key(self.state)
+        self.history[key] += 1
+        opponent = self.players.get(COLOURS[1] if self.white_player else COLOURS[0])
+        if opponent is not None:
+            opponent.write((action_tuple_to_str(action) + '\n').encode())
+        self.last_move_time = time.time()
+        self.white_player = not self.white_player
+        self.move_number += 1
+
+        if is_winning_state(self.state):
+            self.finish('{} wins'.format(colour))
+        elif self.history[key] >= REPETITION_LIMIT or self.max_moves is not None and \
+                len(self.move_times) >= self.max_moves:
+            self.finish('draw by repetition' if self.history[key] >= REPETITION_LIMIT else 'draw')
+            for player_writer in self.players.values():
+                player_writer.write((DRAW_LINE + '\n').encode())
+                player_writer.close()
+        return True
+
+    def finish(self, reason):
+        """
+        Ends the game and prints a summary of its move times.
+
+        :param reason: the reason why the game ended
+        """
+        self.finished = True
+        if self.log_file is not None:
+            self.log_file.close()
+        if self.move_times:
+            print('[{}] Game over ({}) after {} moves, average move time: {:.3f} s, maximum move time: {:.3f} s'.format(
+                self.game_id, reason, len(self.move_times), sum(self.move_times) / len(self.move_times),
+                max(self.move_times)))
+        else:
+            print('[{}] Game over ({}) before any move'.format(self.game_id, reason))
+
+
+class GameServer(object):
+    """
+    Local stand-in for the game server, which hosts any number of concurrent games. Clients join a game by sending a
+    line with the game ID and their colour, and the server sends the game ID back to both clients once both colours have
+    joined. Moves such as '13E' are then relayed from one client to the other, until a player wins or the server
+    declares a draw, which it sends to both clients as DRAW_LINE before closing their connections.
+    """
+
+    def __init__(self, initial_state, log_dir=None, max_moves=None):
+        """
+        :param initial_state: the initial state of the games
+        :param log_dir: the directory in which to write the timing logs of the games, or None to disable them
+        :param max_moves: the number of moves after which a game is a draw, or None for no limit
+        """
+        self.initial_state = initial_state
+        self.log_dir = log_dir
+        self.max_moves = max_moves
+        self.games = {}
+        self.finished_games = set()
+        if log_dir is not None and not os.path.isdir(log_dir):
+            os.makedirs(log_dir)
+
+    async def handle_client(self, reader, writer):
+        """
+        Handles the connection of a client, from the game information it sends to the end of the game.
+
+        :param reader: the stream reader of the client
+        :param writer: the stream writer of the client
+        """
+        game_information = (await reader.readline()).decode().split()
+        if len(game_information) != 2 or game_information[1] not in COLOURS:
+            print('Invalid game information: {}'.format(game_information))
+            writer.close()
+            return
+        game_id, colour = game_information
+        if game_id in self.finished_games:
+            print('[{}] Game already finished'.format(game_id))
+            writer.close()
+            return
+
+        game = self.games.get(game_id)
+        if game is None:
+            game = Game(game_id, self.initial_state, self.log_dir, self.max_moves)
+            self.games[game_id] = game
+        if colour in game.players and not game.players[colour].is_closing():
+            print('[{}] Colour {} already taken'.format(game_id, colour))
+            writer.close()
+            return
+        game.join(colour, writer)
+
+        while not game.finished:
+            try:
+                line = await reader.readline()
+                if line:
+                    game.play(colour, line.decode())
+                    await writer.drain()
+            except ConnectionError:
+                line = None
+            if not line:  # Disconnected, the player can join again
+                if not game.finished:
+                    print('[{}] {} disconnected'.format(game_id, colour))
+                break
+
+        if game.finished and self.games.get(game_id) is game:
+            del self.games[game_id]
+            self.finished_games.add(game_id)
+        writer.close()
+
+    async def serve(self, host, port):
+        """
+        Serves games forever on the given host and port.
+
+        :param host: the host address
+        :param port: the port number
+        """
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print('Serving games on host {}, port {}...'.format(host, port))
+        async with server:
+            await server.serve_forever()
+
+
+def default_state_file(geometry):
+    """
+    :return: the name of the file containing the initial state of the given geometry: states/initial_state.txt for 7x7
+    boards, and states/ROWSxCOLUMNS/initial_state.txt otherwise (e.g. states/9x9/initial_state.txt)
+    """
+    if (geometry.num_rows, geometry.num_cols) == (7, 7):
+        return 'states/initial_state.txt'
+    return 'states/{}x{}/initial_state.txt'.format(geometry.num_rows, geometry.num_cols)
+
+
+async def load_test(game_server, host, port, num_games, time_limit, state_file, log_dir=None):
+    """
+    Plays the given number of concurrent AI vs AI games through the server, each AI being a separate main.py process
+    playing on the geometry in use. The processes of a game are stopped once the server has finished the game, if they
+    have not ended by themselves.
+
+    :param game_server: the game server
+    :param host: the server host address
+    :param port: the server port number
+    :param num_games: the number of games to play
+    :param time_limit: the time limit for a move, in seconds
+    :param state_file: the name of the file containing the initial state of the games
+    :param log_dir: the directory in which to write the output of the AI processes, or None to discard it
+    """
+    main_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    geometry = get_geometry()
+    geometry_arguments = ['-b', '{}x{}'.format(geometry.num_rows, geometry.num_cols), '-w', str(geometry.win_length)]
+    processes = {}
+    output_files = []
+    for i in range(num_games):
+        game_id = 'load_test_{}'.format(i)
+        processes[game_id] = []
+        for colour in COLOURS:
+            output = asyncio.subprocess.DEVNULL
+            if log_dir is not None:
+                output = open(os.path.join(log_dir, '{}_{}.txt'.format(game_id, colour)), 'w')
+                output_files.append(output)
+            processes[game_id].append(await asyncio.create_subprocess_exec(
+                sys.executable, main_file, *geometry_arguments, 'ai_vs_server', '-H', host, '-p', str(port), '-g',
+                game_id, '-c', colour, '-t', str(time_limit), '-s', state_file, stdout=output, stderr=output))
+    start_time = time.time()
+    while processes:
+        await asyncio.sleep(1)
+        for game_id in list(processes):
+            if game_id in game_server.finished_games:
+                for process in processes.pop(game_id):
+                    if process.returncode is None:
+                        process.terminate()
+                    await process.wait()
+    for output in output_files:
+        output.close()
+    print('Played {} games in {} s'.format(num_games, time.time() - start_time))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Local Dynamic Connect-4 game server.')
+    parser.add_argument('-H', '--host', default='localhost', help='Server host address.')
+    parser.add_argument('-p', '--port', type=int, default=12345, help='Port number.')
+    parser.add_argument('-s', '--state', default=None, help='The name of the file containing the initial state of the '
+                                                            'games (states/initial_state.txt, or '
+                                                            'states/ROWSxCOLUMNS/initial_state.txt for other boards, '
+                                                            'by default).')
+    parser.add_argument('-l', '--log_dir', default=None, help='The directory in which to write the logs.')
+    parser.add_argument('-n', '--load_test', type=int, default=0, help='The number of concurrent AI vs AI games to '
+                                                                       'play through the server.')
+    parser.add_argument('-m', '--max_moves', type=int, default=None, help='The number of moves after which a game '
+                                                                          'is a draw.')
+    parser.add_argument('-t', '--time_limit', default='1', help='The time limit for a move of the load test AIs, in '
+                                                                'seconds.')
+    parser.add_argument('-b', '--board', default='7x7', help='The size of the board, as ROWSxCOLUMNS (at most 9x9).')
+    parser.add_argument('-w', '--win_length', type=int, default=WIN_LENGTH, help='The number of pieces in a row '
+                                                                                 'needed to win.')
+    args = parser.parse_args()
+    set_geometry(str_to_geometry(args.board, args.win_length))
+    if args.state is None:
+        args.state = default_state_file(get_geometry())
+
+    async def run(arguments):
+        game_server = GameServer(file_to_state(arguments.state), arguments.log_dir, arguments.max_moves)
+        serving = asyncio.ensure_future(game_server.serve(arguments.host, arguments.port))
+        if arguments.load_test:
+            await asyncio.sleep(0.1)
+            await load_test(game_server, arguments.host, arguments.port, arguments.load_test, arguments.time_limit,
+                            arguments.state, arguments.log_dir)
+            serving.cancel()
+        else:
+            await serving
+
+    asyncio.run(run(args))
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import threading
+from argparse import ArgumentParser
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import BestMoveCache, MOVE_CACHE_SIZE, POLICIES
+from connect_four import str_to_state, action_tuple_to_str, actions, side_parity
+from search import iterative_dfs_negamax_search, finite_value
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIME_LIMIT = 5
+DEFAULT_DEPTH_LIMIT = 100
+MAX_TABLE_SIZE = 2000000  # Number of entries after which a transposition table is cleared
+
+
+class AnalysisService(object):
+    """
+    Long-running analysis service, which answers requests to analyse a state with iterative deepening negamax. Requests
+    are scheduled on a pool of workers with fair queuing, i.e. the pending requests of the clients are served in a
+    round-robin fashion, so that a client sending many requests does not delay the others. All the requests share warm
+    transposition tables (one per side parity, see connect_four.side_parity), so that concurrent and successive requests
+    reuse each other's work. The results of the searches are also kept in a best move cache, which answers the
+    requests for positions already analysed at least as deeply without searching.
+
+    Note that the workers are threads, which share the transposition tables but not the CPU: concurrent requests take
+    turns rather than running in parallel.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_table_size=MAX_TABLE_SIZE, move_cache_size=MOVE_CACHE_SIZE,
+                 move_cache_policy='lru'):
+        """
+        :param workers: the number of requests analysed at the same time
+        :param max_table_size: the number of entries after which a transposition table is cleared
+        :param move_cache_size: the number of positions of the best move cache
+        :param move_cache_policy: the eviction policy of the best move cache ('lru' or 'lfu')
+        """
+        self.workers = workers
+        self.max_table_size = max_table_size
+        self.move_cache = BestMoveCache(move_cache_size, move_cache_policy)
+        self.move_cache_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.transposition_tables = [{}, {}]
+        self.queues = OrderedDict()
+        self.request_available = None
+        self.free_workers = None
+
+    async def submit(self, client, request):
+        """
+        Queues the given request and waits for its response.
+
+        :param client: the client the request belongs to, used for fair queuing
+        :param request: the request, as a dictionary
+        :return: the response, as a dictionary
+        """
+        response = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(client, deque()).append((request, response))
+        self.request_available.set()
+        return await response
+
+    async def schedule(self):
+        """
+        Dispatches the queued requests to the workers forever, taking one request per client in turn.
+        """
+        self.request_available = asyncio.Event()
+        self.free_workers = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.request_available.wait()
+            while self.queues:
+                await self.free_workers.acquire()
+                client, queue = self.queues.popitem(last=False)
+                request, response = queue.popleft()
+                if queue:
+                    self.queues[client] = queue  # Back of the round-robin
+                analysis = loop.run_in_executor(self.executor, self.analyse, request)
+                analysis.add_done_callback(lambda future, response=response: self.complete(future, response))
+            self.request_available.clear()
+
+    def complete(self, analysis, response):
+        """
+        Sets the response of a request once its analysis is done, and frees its worker.
+
+        :param analysis: the future of the analysis
+        :param response: the future of the response
+        """
+        self.free_workers.release()
+        if not response.cancelled():
+            if analysis.exception() is not None:
+                response.set_result({'error': str(analysis.exception())})
+            else:
+                response.set_result(analysis.result())
+
+    def analyse(self, request):
+        """
+        Analyses the state of the given request. Runs in a worker thread.
+
+        :param request: a dictionary with the string representation of the state ('state'), the side to move
+        ('side', 'white' or 'black'), and optionally the time limit ('time_limit', in seconds) and the depth limit
+        ('depth_limit')
+        :return: a dictionary with the best move, the value (from the point of view of white), the depth reached, the
+        principal variation, the number of states visited, the elapsed time and whether the result was cached
+        """
+        state = str_to_state(request['state'])
+        white_player = request.get('side', 'white') == 'white'
+        if not actions(state, white_player):
+            raise ValueError('No actions available to {}'.format('white' if white_player else 'black'))
+        time_limit = float(request.get('time_limit', DEFAULT_TIME_LIMIT))
+        depth_limit = int(request.get('depth_limit', DEFAULT_DEPTH_LIMIT))
+        with self.move_cache_lock:
+            search_result = self.move_cache.lookup(state, white_player, time_limit, depth_limit)
+        cached = search_result is not None
+        if not cached:
+            parity = side_parity(state, white_player)
+            if len(self.transposition_tables[parity]) > self.max_table_size:
+                self.transposition_tables[parity] = {}
+            search_result = iterative_dfs_negamax_search(state, time_limit, depth_limit, white_player,
+                                                         transposition_table=self.transposition_tables[parity],
+                                                         verbose=False)
+            with self.move_cache_lock:
+                self.move_cache.store(state, white_player, time_limit, search_result)
+        return {
+            'best_move': action_tuple_to_str(search_result.best_action),
+            'value': finite_value(search_result.value),
+            'depth': search_result.depth,
+            'pv': [action_tuple_to_str(a) for a in search_result.principal_variation],
+            'nodes': 0 if cached else search_result.nodes,
+            'elapsed_time': search_result.elapsed_time,
+            'cached': cached,
+        }
+
+    async def handle_client(self, reader, writer):
+        """
+        Handles a client connection, where each line is a JSON request and each response is sent back as a JSON line
+        with the 'id' of its request. Requests of the same connection are queued together, unless they specify a
+        'client'. A request with '"stats": true' is answered immediately with the statistics of the best move cache.
+
+        :param reader: the stream reader of the client
+        :param writer: the stream writer of the client
+        """
+        connection = writer.get_extra_info('peername')
+        tasks = []
+
+        async def answer(line):
+            request = {}
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    request = {}
+                    raise ValueError('A request must be a JSON object')
+                if request.get('stats'):
+                    with self.move_cache_lock:
+                        response = self.move_cache.stats()
+                else:
+                    response = await self.submit(request.get('client', connection), request)
+            except (ValueError, TypeError) as e:  # Invalid JSON, not an object, or e.g. an unhashable client
+                response = {'error': str(e)}
+            response['id'] = request.get('id')
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            tasks.append(asyncio.ensure_future(answer(line.decode())))
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+    async def serve(self, host, port):
+        """
+        Serves requests forever on the given host and port.
+
+        :param host: the host address
+        :param port: the port number
+        """
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print('Serving analysis requests on host {}, port {} with {} workers...'.format(host, port, self.workers))
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.schedule())
+
+
+async def request_analysis(host, port, string_state, side='white', time_limit=DEFAULT_TIME_LIMIT):
+    """
+    Sends an analysis request to the service and waits for the response.
+
+    :param host: the service host address
+    :param port: the service port number
+    :param string_state: the string representation of the state (see connect_four.str_to_state)
+    :param side: the side to move ('white' or 'black')
+    :param time_limit: the time limit for the analysis, in seconds
+    :return: the response of the service, as a dictionary
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write((json.dumps({'id': 0, 'state': string_state, 'side': side, 'time_limit': time_limit}) + '\n').encode())
+    await writer.drain()
+    response = json.loads((await reader.readline()).decode())
+    writer.close()
+    return response
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Dynamic Connect-4 analysis service. Each line sent to the service is a JSON '
+                                        'request such as {"id": 1, "state": "...", "side": "white", "time_limit": 5}.')
+    parser.add_argument('-H', '--host', default='localhost', help='Service host address.')
+    parser.add_argument('-p', '--port', type=int, default=12346, help='Port number.')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS, help='Number of worker threads.')
+    parser.add_argument('-m', '--move_cache_size', type=int, default=MOVE_CACHE_SIZE, help='Number of positions of the '
+                                                                                          'best move cache.')
+    parser.add_argument('-e', '--eviction', choices=POLICIES, default='lru', help='Eviction policy of the best move '
+                                                                                  'cache.')
+    args = parser.parse_args()
+    asyncio.run(AnalysisService(args.workers, move_cache_size=args.move_cache_size,
+                                move_cache_policy=args.eviction).serve(args.host, args.port))
@@ -0,0 +1,54 @@
+import numpy as np
+
+from connect_four import state_files, file_to_states, actions, result, state_to_masks, expand_frontier, frontier_wins, \
+    perft
+from heuristics import is_winning_state
+
+PERFT_DEPTH = 3
+
+
+def recursive_perft(state, depth, white_player, counts, ply=0):
+    """
+    Counts the states reachable from the given state with each number of moves with the actions and result methods, like
+    connect_four.perft does a whole ply at a time (states where a player has won are counted but not expanded).
+
+    :param state: the current state
+    :param depth: the number of moves left
+    :param white_player: True if white moves, False otherwise
+    :param counts: the list of the counts of each ply, which is updated
+    :param ply: the number of moves played from the start state
+    """
+    counts[ply] += 1
+    if depth == 0 or is_winning_state(state):
+        return
+    for action in actions(state, white_player):
+        recursive_perft(result(state, action, white_player), depth - 1, not white_player, counts, ply + 1)
+
+
+if __name__ == '__main__':
+    failures = 0
+    for file_name in state_files(['states']):
+        for state in file_to_states(file_name):
+            for white_player in (True, False):
+                side = 'white' if white_player else 'black'
+                successors, parents = expand_frontier(np.array([state_to_masks(state)], dtype=np.uint64), white_player)
+                expected = [state_to_masks(result(state, action, white_player))
+                            for action in actions(state, white_player)]
+                if sorted(map(tuple, successors.tolist())) != sorted(expected) or \
+                        parents.tolist() != [0] * len(expected):
+                    failures += 1
+                    print('{} ({}): expand_frontier returned {} successors instead of {}'.format(
+                        file_name, side, len(successors), len(expected)))
+                if frontier_wins(np.array([state_to_masks(state)], dtype=np.uint64))[0] != is_winning_state(state):
+                    failures += 1
+                    print('{} ({}): frontier_wins disagrees with is_winning_state'.format(file_name, side))
+                counts = [0] * (PERFT_DEPTH + 1)
+                recursive_perft(state, PERFT_DEPTH, white_player, counts)
+                frontier_counts = perft(state, PERFT_DEPTH, white_player)
+                if frontier_counts != counts:
+                    failures += 1
+                    print('{} ({}): perft counted {} states instead of {}'.format(file_name, side, frontier_counts,
+                                                                                 counts))
+                else:
+                    print('{} ({}): {}'.format(file_name, side, counts))
+    print('{} failures'.format(failures))
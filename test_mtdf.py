@@ -0,0 +1,20 @@
+from connect_four import state_files, file_to_states
+from search import iterative_dfs_negamax_search, INF
+
+DEPTH_LIMIT = 7
+
+if __name__ == '__main__':
+    total_nodes = 0
+    total_mtdf_nodes = 0
+    for file_name in state_files(['states']):
+        for state in file_to_states(file_name):
+            for white_player in (True, False):
+                full_window = iterative_dfs_negamax_search(state, INF, DEPTH_LIMIT, white_player, verbose=False)
+                mtdf = iterative_dfs_negamax_search(state, INF, DEPTH_LIMIT, white_player, verbose=False, mtdf=True)
+                total_nodes += full_window.nodes
+                total_mtdf_nodes += mtdf.nodes
+                print('{} ({}): full window: {} states, value: {}, MTD(f): {} states, value: {}{}'.format(
+                    file_name, 'white' if white_player else 'black', full_window.nodes, full_window.value, mtdf.nodes,
+                    mtdf.value, '' if full_window.value == mtdf.value else ' (different values)'))
+    print('Total states visited: full window: {}, MTD(f): {} ({:.1f}%)'.format(
+        total_nodes, total_mtdf_nodes, 100.0 * total_mtdf_nodes / total_nodes))
@@ -0,0 +1,268 @@
+import json
+import os
+import random
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from connect_four import file_to_states, state_files, state_to_str, str_to_state, actions, result, zobrist_key, \
+    get_geometry, set_geometry, str_to_geometry, REPETITION_LIMIT, WIN_LENGTH
+from heuristics import DEFAULT_HEURISTIC_FEATURES, DEFAULT_HEURISTIC_WEIGHTS, default_heuristic_features, \
+    weighted_default_heuristic, is_winning_state
+from positions import PositionFile
+from records import GameRecorder, replay
+from search import iterative_dfs_negamax_search
+
+DEPTH_LIMIT = 100
+ITERATIONS = 2000
+LEARNING_RATE = 1.0
+SCALES = np.logspace(-6, 0, 601)  # Candidate scales of the sigmoid mapping heuristic values to expected results
+
+
+def labelled_positions(file_names):
+    """
+    Collects the positions of the given game records (.jsonl) and labelled position files (.bin) with their labels,
+    i.e. the result of the game from the point of view of white (1 for a white win, 0 for a black win and 0.5 for a
+    game without winner). The labels of position files are used as is, and must be expected results between 0 and 1
+    (e.g. generated by dataset.py with --scale, rather than search values). Positions which are already won are
+    skipped, since the heuristic is not used for them.
+
+    :param file_names: the names of the game records and position files
+    :return: a (list of states, list of labels) tuple
+    :raises ValueError: if a position file has no labels, or labels outside [0, 1]
+    """
+    states = []
+    labels = []
+    for file_name in file_names:
+        if file_name.endswith('.bin'):
+            with PositionFile(file_name) as positions:
+                if not positions.labelled:
+                    raise ValueError('{} has no labels'.format(file_name))
+                labelled = [(position[0], position[2]) for position in positions]
+            if not all(0 <= label <= 1 for _, label in labelled):
+                raise ValueError('{} has labels outside [0, 1], which are not expected results (see the --scale '
+                                 'option of dataset.py)'.format(file_name))
+        else:
+            game_record = replay(file_name)
+            label = {'white': 1.0, 'black': 0.0}.get(game_record.winner, 0.5)
+            labelled = [(state, label) for state in game_record.states]
+        for state, label in labelled:
+            if not is_winning_state(state):
+                states.append(state)
+                labels.append(label)
+    return states, labels
+
+
+def feature_matrix(states):
+    """
+    :return: the matrix of the features of the default heuristic (see heuristics.default_heuristic_features) of the
+    given states, with one row per state
+    """
+    return np.array([default_heuristic_features(state) for state in states], dtype=np.float64)
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-np.clip(x, -500, 500)))
+
+
+def mean_squared_error(features, labels, weights, scale):
+    """
+    :return: the mean squared error between the labels and the expected results predicted by the weighted heuristic,
+    i.e. sigmoid(scale * heuristic value)
+    """
+    return float(np.mean((sigmoid(scale * features.dot(weights)) - labels) ** 2))
+
+
+def fit_scale(features, labels, weights):
+    """
+    Finds the scale of the sigmoid which best maps the heuristic values of the given weights to the labels.
+
+    :return: the scale, among SCALES, with the smallest mean squared error
+    """
+    errors = [mean_squared_error(features, labels, weights, scale) for scale in SCALES]
+    return float(SCALES[int(np.argmin(errors))])
+
+
+def texel_tune(features, labels, weights=DEFAULT_HEURISTIC_WEIGHTS, iterations=ITERATIONS,
+               learning_rate=LEARNING_RATE, verbose=True):
+    """
+    Tunes the weights of the default heuristic with the Texel method: the scale of the sigmoid mapping heuristic values
+    to expected results is first fitted for the given weights, and the weights are then fitted by gradient descent on
+    the mean squared error between the expected results and the labels. The whole data set is evaluated at once as a
+    matrix product, on standardized features so that a single learning rate suits all the weights.
+
+    :param features: the feature matrix of the positions (see the feature_matrix method)
+    :param labels: the labels of the positions
+    :param weights: the initial weights
+    :param iterations: the number of gradient descent iterations
+    :param learning_rate: the learning rate of the gradient descent
+    :param verbose: True to print the progress of the fit, False otherwise
+    :return: a (weights, scale, error) tuple, where error is the mean squared error of the tuned weights
+    """
+    labels = np.asarray(labels, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    scale = fit_scale(features, labels, weights)
+    if verbose:
+        print('Scale: {}, initial error: {}'.format(scale, mean_squared_error(features, labels, weights, scale)))
+    deviations = features.std(axis=0)
+    deviations[deviations == 0] = 1
+    standardized = features / deviations
+    scaled_weights = weights * deviations * scale  # Weights of the standardized features, including the scale
+    for i in range(iterations):
+        expected = sigmoid(standardized.dot(scaled_weights))
+        gradient = standardized.T.dot(2 * (expected - labels) * expected * (1 - expected)) / len(labels)
+        scaled_weights -= learning_rate * gradient
+        if verbose and (i + 1) % (iterations // 10 or 1) == 0:
+            print('Iteration {}, error: {}'.format(i + 1, float(np.mean((expected - labels) ** 2))))
+    weights = scaled_weights / deviations / scale
+    return weights, scale, mean_squared_error(features, labels, weights, scale)
+
+
+def play_game(game):
+    """
+    Plays a self-play game between two weightings of the default heuristic. Runs in a worker process.
+
+    :param game: a (start state string, white weights, black weights, time limit, maximum number of moves, number of
+    random opening moves, random seed, record file name or None) tuple
+    :return: the colour of the winner ('white' or 'black'), or None if the game was a draw (by repetition or after the
+    maximum number of moves)
+    """
+    string_state, white_weights, black_weights, time_limit, max_moves, random_moves, seed, record_file = game
+    state = str_to_state(string_state)
+    heuristics = (weighted_default_heuristic(white_weights), weighted_default_heuristic(black_weights))
+    rng = random.Random(seed)
+    recorder = None if record_file is None else GameRecorder(record_file, state)
+    history = Counter([zobrist_key(state)])
+    white_player = True
+    for move_number in range(max_moves):
+        search_result = None
+        if not actions(state, white_player):  # No move available, the game is a draw
+            break
+        if move_number < random_moves:
+            action = rng.choice(actions(state, white_player))
+        else:
+            search_result = iterative_dfs_negamax_search(state, time_limit, DEPTH_LIMIT, white_player,
+                                                         heuristic=heuristics[0 if white_player else 1],
+                                                         verbose=False, history=history)
+            action = search_result.best_action or actions(state, white_player)[0]
+        if recorder is not None:
+            recorder.record(action, search_result)
+        state = result(state, action, white_player)
+        if is_winning_state(state):
+            winner = 'white' if white_player else 'black'
+            if recorder is not None:
+                recorder.finish(winner)
+            return winner
+        history[zobrist_key(state)] += 1
+        if history[zobrist_key(state)] >= REPETITION_LIMIT:
+            break
+        white_player = not white_player
+    if recorder is not None:
+        recorder.finish(None)
+    return None
+
+
+def self_play_match(weights, opponent_weights, start_states, time_limit, max_moves, random_moves=2, processes=None,
+                    record_dir=None):
+    """
+    Plays a self-play match between two weightings of the default heuristic across a pool of processes. Each start
+    state is played twice, once with each colour, after the same random opening moves.
+
+    :param weights: the weights of the first player
+    :param opponent_weights: the weights of the second player
+    :param start_states: the start states of the games
+    :param time_limit: the time limit for a move, in seconds
+    :param max_moves: the number of moves after which a game is a draw
+    :param random_moves: the number of random moves played at the start of each game, to vary the games
+    :param processes: the number of processes, or None for the number of CPUs
+    :param record_dir: the directory in which to write the records of the games (see records.py), or None
+    :return: the score of the first player, i.e. the number of wins plus half the number of draws
+    """
+    if record_dir is not None and not os.path.isdir(record_dir):
+        os.makedirs(record_dir)
+    games = []
+    colours = []
+    for i, state in enumerate(start_states):
+        for swap in (False, True):
+            players = (opponent_weights, weights) if swap else (weights, opponent_weights)
+            record_file = None if record_dir is None else os.path.join(record_dir, 'game_{}_{}.jsonl'.format(
+                i, 'black' if swap else 'white'))
+            games.append((state_to_str(state), tuple(players[0]), tuple(players[1]), time_limit, max_moves,
+                          random_moves, i, record_file))
+            colours.append('black' if swap else 'white')
+    score = 0
+    with ProcessPoolExecutor(max_workers=processes, initializer=set_geometry,
+                             initargs=(get_geometry(),)) as executor:
+        for colour, winner in zip(colours, executor.map(play_game, games)):
+            score += 0.5 if winner is None else 1 if winner == colour else 0
+    print('Score: {} / {}'.format(score, len(games)))
+    return score
+
+
+def load_weights(file_name):
+    """
+    :return: the weights of the default heuristic stored in the given JSON file
+    """
+    with open(file_name, 'r') as weights_file:
+        return json.load(weights_file)['weights']
+
+
+def save_weights(file_name, weights):
+    """
+    Stores the given weights of the default heuristic in a JSON file.
+    """
+    with open(file_name, 'w') as weights_file:
+        json.dump({'features': DEFAULT_HEURISTIC_FEATURES, 'weights': [float(w) for w in weights]}, weights_file)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Tunes the weights of the default heuristic.')
+    parser.add_argument('-b', '--board', default='7x7', help='The size of the board, as ROWSxCOLUMNS (at most 9x9).')
+    parser.add_argument('-w', '--win_length', type=int, default=WIN_LENGTH, help='The number of pieces in a row '
+                                                                                 'needed to win.')
+    subparsers = parser.add_subparsers()
+
+    def fit(arguments):
+        start_time = time.time()
+        positions, position_labels = labelled_positions(arguments.files)
+        print('{} labelled positions'.format(len(positions)))
+        tuned_weights, _, error = texel_tune(feature_matrix(positions), position_labels,
+                                             iterations=arguments.iterations)
+        print('Tuned weights ({}): {}, error: {}, elapsed time: {} s'.format(
+            ', '.join(DEFAULT_HEURISTIC_FEATURES), [float(w) for w in tuned_weights], error, time.time() - start_time))
+        if arguments.output is not None:
+            save_weights(arguments.output, tuned_weights)
+
+    def match(arguments):
+        start_states = [state for file_name in state_files(arguments.states) for state in file_to_states(file_name)]
+        opponent = DEFAULT_HEURISTIC_WEIGHTS if arguments.opponent is None else load_weights(arguments.opponent)
+        self_play_match(load_weights(arguments.weights), opponent, start_states, arguments.time_limit,
+                        arguments.max_moves, arguments.random_moves, arguments.processes, arguments.record_dir)
+
+    parser_fit = subparsers.add_parser('fit', help='Fit the weights to labelled positions (Texel method).')
+    parser_fit.add_argument('files', nargs='+', help='Game records (.jsonl) or labelled position files (.bin).')
+    parser_fit.add_argument('-i', '--iterations', type=int, default=ITERATIONS, help='The number of iterations.')
+    parser_fit.add_argument('-o', '--output', default=None, help='The JSON file in which to write the weights.')
+    parser_fit.set_defaults(func=fit)
+
+    parser_match = subparsers.add_parser('match', help='Play a self-play match between two weightings.')
+    parser_match.add_argument('weights', help='The JSON file of the weights to test.')
+    parser_match.add_argument('-b', '--opponent', default=None, help='The JSON file of the weights of the opponent '
+                                                                     '(the default weights by default).')
+    parser_match.add_argument('-s', '--states', nargs='+', default=['states/initial_state.txt'], help='The start '
+                                                                                                     'states.')
+    parser_match.add_argument('-t', '--time_limit', type=float, default=1, help='The time limit for a move.')
+    parser_match.add_argument('-m', '--max_moves', type=int, default=100, help='The number of moves after which a '
+                                                                               'game is a draw.')
+    parser_match.add_argument('-n', '--random_moves', type=int, default=2, help='The number of random opening moves.')
+    parser_match.add_argument('-j', '--processes', type=int, default=None, help='The number of processes.')
+    parser_match.add_argument('-r', '--record_dir', default=None, help='The directory in which to write the records '
+                                                                      'of the games, which can be used to fit weights.')
+    parser_match.set_defaults(func=match)
+
+    args = parser.parse_args()
+    set_geometry(str_to_geometry(args.board, args.win_length))
+    args.func(args)